@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    key TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_analyses_last_access ON analyses (last_access);
+"""
+
+
+class AnalysisCache:
+    # Persistent cache of LLM resume analyses. Entries expire after ttl_seconds
+    # and the least recently used ones are evicted beyond max_entries. A small
+    # in-process LRU sits in front of SQLite so repeat hits skip the disk.
+
+    def __init__(self, db_path: str, ttl_seconds: float = 30 * 24 * 3600, max_entries: int = 5000,
+                 memory_entries: int = 256):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+
+        folder = os.path.dirname(db_path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+        self._local = threading.local()
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+        self._connect().executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(resume_text: str, job_description: Dict[str, Any], model_name: str, prompt_version: Any) -> str:
+        normalized_resume = re.sub(r'\s+', ' ', resume_text or '').strip()
+        parts = [
+            normalized_resume,
+            job_description.get('job_title', ''),
+            job_description.get('job_description', ''),
+            job_description.get('required_skills', ''),
+            job_description.get('experience_required', ''),
+            model_name or '',
+            str(prompt_version),
+        ]
+        return hashlib.sha256(json.dumps(parts).encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[0] <= self.ttl_seconds:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return json.loads(entry[1])
+
+        conn = self._connect()
+        row = conn.execute("SELECT created_at, data FROM analyses WHERE key = ?", (key,)).fetchone()
+        if row is None or now - row[0] > self.ttl_seconds:
+            with self._lock:
+                self._memory.pop(key, None)
+                self.misses += 1
+            return None
+
+        with conn:
+            conn.execute("UPDATE analyses SET last_access = ? WHERE key = ?", (now, key))
+        self._remember(key, row[0], row[1])
+        with self._lock:
+            self.hits += 1
+        return json.loads(row[1])
+
+    def put(self, key: str, analysis: Dict[str, Any]):
+        now = time.time()
+        data = json.dumps(analysis, default=str)
+
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT INTO analyses (key, created_at, last_access, data) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET created_at = excluded.created_at, "
+                "last_access = excluded.last_access, data = excluded.data",
+                (key, now, now, data)
+            )
+            conn.execute("DELETE FROM analyses WHERE created_at < ?", (now - self.ttl_seconds,))
+            conn.execute(
+                "DELETE FROM analyses WHERE key IN ("
+                "SELECT key FROM analyses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+        self._remember(key, now, data)
+
+    def _remember(self, key: str, created_at: float, data: str):
+        with self._lock:
+            self._memory[key] = (created_at, data)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def invalidate(self, key: str):
+        with self._lock:
+            self._memory.pop(key, None)
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM analyses WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM analyses")
+
+    def stats(self) -> Dict[str, float]:
+        entries = self._connect().execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
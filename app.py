@@ -1,5 +1,6 @@
 from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_file
 import os
+import socket
 import uuid
 from werkzeug.utils import secure_filename
 from datetime import datetime
@@ -11,14 +12,18 @@ from document_processor import DocumentProcessor
 from rag_system import ResumeRAGSystem
 from email_system import EmailSystem
 from csv_exporter import CSVExporter
-from database import SimpleDatabase
+from database import get_database
+from llm_client import LLMUnavailableError, CircuitOpenError
 
 app = Flask(__name__)
 app.config.from_object(Config)
 
-db = SimpleDatabase()
+db = get_database()
 doc_processor = DocumentProcessor()
-rag_system = ResumeRAGSystem()
+rag_system = ResumeRAGSystem(database=db)
+if os.environ.get('WARMUP_ON_START', 'off').lower() in ('1', 'on', 'true'):
+    # serve.py warms up before forking; this is for running app.py/run.py directly.
+    threading.Thread(target=rag_system.warmup, daemon=True).start()
 email_system = EmailSystem()
 csv_exporter = CSVExporter()
 
@@ -27,6 +32,54 @@ os.makedirs(app.config['RESULTS_FOLDER'], exist_ok=True)
 
 processing_lock = threading.Lock()
 
+CLAIM_BATCH_SIZE = int(os.environ.get('CLAIM_BATCH_SIZE', 100))
+CLAIM_TTL_SECONDS = float(os.environ.get('CLAIM_TTL_SECONDS', 1800))
+LLM_RETRY_SECONDS = float(os.environ.get('LLM_RETRY_SECONDS', 30))
+
+def worker_id():
+    # Evaluated per call: gunicorn forks workers after this module is imported.
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+def requeue_applications(application_ids, error):
+    # The LLM is unavailable: put the applications back in the queue and try
+    # again once the circuit breaker lets calls through, rather than sending
+    # rejections that reflect an outage.
+    db.update_application_statuses({application_id: 'pending' for application_id in application_ids})
+    retry_after = error.retry_after if isinstance(error, CircuitOpenError) else rag_system.gemini_model.breaker.retry_after()
+    retry_after = max(retry_after, LLM_RETRY_SECONDS)
+    print(f"LLM unavailable ({error}); requeued {len(application_ids)} application(s), retrying in {retry_after:.0f}s")
+    schedule_queue_retry(retry_after)
+
+retry_lock = threading.Lock()
+retry_timer = None
+
+def schedule_queue_retry(delay):
+    # One pending re-drain of the queue however many applications were
+    # requeued, so a half-open breaker sees a single batch, not a stampede.
+    global retry_timer
+    with retry_lock:
+        if retry_timer is not None:
+            return
+        retry_timer = threading.Timer(delay, retry_pending_applications)
+        retry_timer.daemon = True
+        retry_timer.start()
+
+def retry_pending_applications():
+    global retry_timer
+    with retry_lock:
+        retry_timer = None
+    if processing_lock.locked():
+        # The running batch may still requeue more; try again after it.
+        schedule_queue_retry(LLM_RETRY_SECONDS)
+        return
+    process_applications_async()
+
+def fail_application(application_id, reason):
+    # Ends the claim with a terminal status. Leaving the lease to expire would
+    # only have the application picked up again and fail the same way.
+    print(f"{reason}; marking application {application_id} as error")
+    db.update_application_status(application_id, 'error')
+
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ['pdf', 'doc', 'docx']
@@ -35,37 +88,49 @@ def process_single_application(application_id):
     try:
         print(f"=== Processing application {application_id} ===")
         
-        applications = db.get_all_applications()
-        application = None
-        for app in applications:
-            if app.get('id') == application_id:
-                application = app
-                break
+        claimed = db.claim_pending_applications(worker_id(), 1, CLAIM_TTL_SECONDS, application_ids=[application_id])
+        application = claimed[0] if claimed else None
         
         if not application:
-            print(f"Application {application_id} not found")
+            print(f"Application {application_id} not found or already claimed by another worker")
             return
         
         print(f"Processing resume for {application['full_name']}...")
 
         job_description = db.get_job_description_by_title(application['position_applied'])
         if not job_description:
-            print(f"No job description found for {application['position_applied']}")
+            fail_application(application_id, f"No job description found for {application['position_applied']}")
             return
         
         resume_path = application.get('resume_path')
         if not resume_path or not os.path.exists(resume_path):
-            print(f"Resume file not found: {resume_path}")
+            fail_application(application_id, f"Resume file not found: {resume_path}")
             return
         
         resume_text = doc_processor.extract_text(resume_path)
         if not resume_text:
-            print("Could not extract text from resume")
+            fail_application(application_id, "Could not extract text from resume")
             return
         
-        analysis_result = rag_system.analyze_resume_against_job(resume_text, job_description)
+        try:
+            rag_system.add_resumes([resume_text], [application_id], [application['position_applied']])
+        except Exception as e:
+            print(f"Error indexing resume: {e}")
+        
+        def on_decision(decision):
+            # With LLM_STREAM on this fires before the written feedback has
+            # finished generating, so the status page updates early.
+            early_status = 'selected' if str(decision['recommendation']).upper() == 'SELECTED' else 'rejected'
+            db.update_application_status(application_id, early_status)
+            print(f"Early decision for {application['full_name']}: {early_status} ({decision['overall_score']})")
+        
+        try:
+            analysis_result = rag_system.analyze_resume_against_job(resume_text, job_description, on_decision=on_decision)
+        except LLMUnavailableError as e:
+            requeue_applications([application_id], e)
+            return
         if not analysis_result:
-            print("Analysis failed")
+            fail_application(application_id, "Analysis failed")
             return
         
         analysis_result.update({
@@ -85,11 +150,7 @@ def process_single_application(application_id):
 
         try:
             all_applications = db.get_all_applications()
-            all_analysis_results = []
-            
-            all_batches = db.get_all_analysis_results()
-            for batch in all_batches:
-                all_analysis_results.extend(batch.get('results', []))
+            all_analysis_results = list(db.iter_latest_results())
             
             export_job_description = {
                 'job_title': 'Multiple Positions',
@@ -123,88 +184,125 @@ def process_applications_async():
         return
     
     try:
-        pending_applications = db.get_pending_applications()
-        if not pending_applications:
-            print("No pending applications to process")
-            processing_lock.release()
-            return
-        
-        print(f"Processing {len(pending_applications)} applications...")
-        
-        resumes_by_position = {}
-        for app in pending_applications:
-            resume_path = app.get('resume_path')
-            if resume_path and os.path.exists(resume_path):
-                resume_text = doc_processor.extract_text(resume_path)
-                if resume_text:
-                    position = app['position_applied']
-                    if position not in resumes_by_position:
-                        resumes_by_position[position] = []
-                    
-                    resumes_by_position[position].append({
-                        'applicant_id': app['id'],
-                        'full_name': app['full_name'],
-                        'email': app['email'],
-                        'position_applied': app['position_applied'],
-                        'resume_text': resume_text
-                    })
-                    print(f"Processed resume for {app['full_name']} - {position}")
+        # Claims batches until the queue is empty, or until the LLM is
+        # unavailable and the rest has been handed back to the queue.
+        claimed = 0
+        while True:
+            pending_applications = db.claim_pending_applications(worker_id(), CLAIM_BATCH_SIZE, CLAIM_TTL_SECONDS)
+            if not pending_applications:
+                break
+            claimed += len(pending_applications)
+            if not process_application_batch(pending_applications):
+                break
         
-        if not resumes_by_position:
-            print("No valid resumes found to process")
-            processing_lock.release()
-            return
-
-        print("Starting AI analysis...")
-        all_analysis_results = []
+        if not claimed:
+            print("No pending applications to process")
         
-        for position, resumes_data in resumes_by_position.items():
-            print(f"Analyzing {len(resumes_data)} applications for {position}...")
+    except Exception as e:
+        print(f"Error in background processing: {str(e)}")
+    finally:
+        processing_lock.release()
 
-            job_description = db.get_job_description_by_title(position)
-            if not job_description:
-                print(f"No job description found for {position}, skipping...")
+def process_application_batch(pending_applications):
+    # Returns False when applications were requeued because the LLM is
+    # unavailable; claiming the next batch would only requeue that too.
+    print(f"Processing {len(pending_applications)} applications...")
+    
+    resumes_by_position = {}
+    for app in pending_applications:
+        resume_path = app.get('resume_path')
+        if resume_path and os.path.exists(resume_path):
+            resume_text = doc_processor.extract_text(resume_path)
+            if resume_text:
+                position = app['position_applied']
+                if position not in resumes_by_position:
+                    resumes_by_position[position] = []
+                
+                resumes_by_position[position].append({
+                    'applicant_id': app['id'],
+                    'full_name': app['full_name'],
+                    'email': app['email'],
+                    'position_applied': app['position_applied'],
+                    'resume_text': resume_text
+                })
+                print(f"Processed resume for {app['full_name']} - {position}")
                 continue
+        fail_application(app['id'], f"No readable resume for {app['full_name']}: {resume_path}")
+    
+    if not resumes_by_position:
+        print("No valid resumes found to process")
+        return True
+
+    try:
+        indexed_resumes = [r for resumes_data in resumes_by_position.values() for r in resumes_data]
+        rag_system.add_resumes([r['resume_text'] for r in indexed_resumes],
+                               [r['applicant_id'] for r in indexed_resumes],
+                               [r['position_applied'] for r in indexed_resumes])
+    except Exception as e:
+        print(f"Error indexing resumes: {e}")
+    
+    print("Starting AI analysis...")
+    all_analysis_results = []
+    failed = set()
+    requeued = False
+    
+    for position, resumes_data in resumes_by_position.items():
+        print(f"Analyzing {len(resumes_data)} applications for {position}...")
 
+        job_description = db.get_job_description_by_title(position)
+        if not job_description:
+            print(f"No job description found for {position}, skipping...")
+            failed.update(r['applicant_id'] for r in resumes_data)
+            db.update_application_statuses({r['applicant_id']: 'error' for r in resumes_data})
+            continue
+
+        try:
             position_results = rag_system.batch_analyze_resumes(resumes_data, job_description)
-            all_analysis_results.extend(position_results)
-            print(f"Completed analysis for {position}: {len(position_results)} results")
-        
-        analysis_results = all_analysis_results
-        batch_id = db.save_analysis_results(analysis_results)
-        print(f"Analysis results saved with batch ID: {batch_id}")
+        except LLMUnavailableError as e:
+            # Keep what finished and hand everything else back to the queue.
+            done = failed | {r['applicant_id'] for r in all_analysis_results}
+            remaining = [r['applicant_id'] for resumes in resumes_by_position.values() for r in resumes
+                         if r['applicant_id'] not in done]
+            requeue_applications(remaining, e)
+            requeued = True
+            break
+        all_analysis_results.extend(position_results)
+        print(f"Completed analysis for {position}: {len(position_results)} results")
+    
+    if not all_analysis_results:
+        return not requeued
+    analysis_results = all_analysis_results
+    batch_id = db.save_analysis_results(analysis_results)
+    print(f"Analysis results saved with batch ID: {batch_id}")
 
-        for result in analysis_results:
-            status = 'selected' if result.get('recommendation', '').upper() == 'SELECTED' else 'rejected'
-            db.update_application_status(result['applicant_id'], status)
-        
-        selected_candidates = [r for r in analysis_results if r.get('recommendation', '').upper() == 'SELECTED']
-        rejected_candidates = [r for r in analysis_results if r.get('recommendation', '').upper() != 'SELECTED']
-        
-        print(f"Selected: {len(selected_candidates)}, Rejected: {len(rejected_candidates)}")
-        print("Sending emails...")
-        email_results = email_system.send_batch_emails(selected_candidates, rejected_candidates)
-        print(f"Email results: {email_results}")
-        print("Exporting to CSV...")
-        all_applications = db.get_all_applications()
-        export_job_description = {
-            'job_title': 'Multiple Positions',
-            'job_description': 'Various positions processed',
-            'required_skills': 'Position-specific skills',
-            'experience_required': 'Varies by position'
-        }
-        csv_file = csv_exporter.export_all_candidates_csv(all_applications, analysis_results, export_job_description)
-        if csv_file:
-            print(f"All candidates exported to CSV: {csv_file}")
-        else:
-            print("Error exporting to CSV")
-        
-        print("Application processing completed successfully!")
-        
-    except Exception as e:
-        print(f"Error in background processing: {str(e)}")
-    finally:
-        processing_lock.release()
+    statuses = {}
+    for result in analysis_results:
+        statuses[result['applicant_id']] = 'selected' if result.get('recommendation', '').upper() == 'SELECTED' else 'rejected'
+    db.update_application_statuses(statuses)
+    
+    selected_candidates = [r for r in analysis_results if r.get('recommendation', '').upper() == 'SELECTED']
+    rejected_candidates = [r for r in analysis_results if r.get('recommendation', '').upper() != 'SELECTED']
+    
+    print(f"Selected: {len(selected_candidates)}, Rejected: {len(rejected_candidates)}")
+    print("Sending emails...")
+    email_results = email_system.send_batch_emails(selected_candidates, rejected_candidates)
+    print(f"Email results: {email_results}")
+    print("Exporting to CSV...")
+    all_applications = db.get_all_applications()
+    export_job_description = {
+        'job_title': 'Multiple Positions',
+        'job_description': 'Various positions processed',
+        'required_skills': 'Position-specific skills',
+        'experience_required': 'Varies by position'
+    }
+    csv_file = csv_exporter.export_all_candidates_csv(all_applications, analysis_results, export_job_description)
+    if csv_file:
+        print(f"All candidates exported to CSV: {csv_file}")
+    else:
+        print("Error exporting to CSV")
+    
+    print("Application processing completed successfully!")
+    return not requeued
 
 @app.route('/', methods=['GET', 'POST'])
 def index():
@@ -0,0 +1,811 @@
+import argparse
+import json
+import os
+import re
+import sys
+import zlib
+import numpy as np
+import tempfile
+import time
+from langchain_core.embeddings import DeterministicFakeEmbedding, Embeddings
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+
+os.environ.setdefault('GEMINI_MODEL', 'offline-benchmark')
+
+from rag_system import ResumeRAGSystem
+from analysis_cache import AnalysisCache
+from llm_backends import StubBackend
+from llm_client import ResilientLLMClient, CircuitBreaker, LLMUnavailableError, estimate_tokens
+from match_matrix import MatchMatrix
+from near_duplicates import NearDuplicateIndex, shingles
+from vector_index import INDEX_TYPES, build_index, evaluate_index_types, publish_store
+
+SAMPLE_JOB = {
+    'job_title': 'AI Engineer',
+    'job_description': 'Build and deploy machine learning systems.',
+    'required_skills': 'Python, Machine Learning, Docker',
+    'experience_required': 'mid'
+}
+
+
+class HashingEmbedding(Embeddings):
+    # Bag-of-words vectors with hashed word buckets. Unlike
+    # DeterministicFakeEmbedding, texts that share words end up close, which
+    # is enough to exercise relevance ranking without downloading a model.
+    # Unit length, like the sentence-transformers model in production.
+
+    def __init__(self, size: int = 384):
+        self.size = size
+
+    def _embed(self, text: str) -> list:
+        vector = [0.0] * self.size
+        for word in re.findall(r'[a-z0-9]+', text.lower()):
+            vector[zlib.crc32(word.encode('utf-8')) % self.size] += 1.0
+        norm = sum(value * value for value in vector) ** 0.5 or 1.0
+        return [value / norm for value in vector]
+
+    def embed_documents(self, texts: list) -> list:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list:
+        return self._embed(text)
+
+
+def make_rag_system(model, workdir: str, **kwargs) -> ResumeRAGSystem:
+    kwargs.setdefault('analysis_cache', AnalysisCache(os.path.join(workdir, 'analysis_cache.db')))
+    kwargs.setdefault('embeddings', DeterministicFakeEmbedding(size=384))
+    return ResumeRAGSystem(
+        index_folder=os.path.join(workdir, 'vector_index'),
+        embedding_cache_folder=os.path.join(workdir, 'embedding_cache'),
+        gemini_model=model,
+        **kwargs
+    )
+
+
+def make_resumes(count: int) -> list:
+    return [{
+        'applicant_id': f'applicant-{i}',
+        'full_name': f'Candidate {i}',
+        'email': f'candidate{i}@example.com',
+        'position_applied': SAMPLE_JOB['job_title'],
+        'resume_text': f'Candidate {i}. Python developer with machine learning experience. ' * 20
+    } for i in range(count)]
+
+
+def bench_throughput(args):
+    resumes = make_resumes(args.resumes)
+    with tempfile.TemporaryDirectory() as workdir:
+        for max_in_flight in args.max_in_flight:
+            rag_system = make_rag_system(
+                StubBackend(args.latency), workdir,
+                max_in_flight=max_in_flight,
+                requests_per_minute=args.rpm,
+                tokens_per_minute=args.tpm
+            )
+            start = time.perf_counter()
+            results = rag_system.batch_analyze_resumes(resumes, SAMPLE_JOB, use_cache=False)
+            elapsed = time.perf_counter() - start
+
+            in_order = [r['applicant_id'] for r in results] == [r['applicant_id'] for r in resumes]
+            print(f"max_in_flight={max_in_flight:>3}  {len(results)} resumes in {elapsed:.2f}s  "
+                  f"({len(results) / elapsed:.1f}/s)  rate-limit wait={rag_system.rate_limiter.total_wait:.2f}s  "
+                  f"in_order={in_order}")
+
+
+def bench_cache(args):
+    resumes = make_resumes(args.resumes)
+    with tempfile.TemporaryDirectory() as workdir:
+        rag_system = make_rag_system(StubBackend(args.latency), workdir)
+        for label in ('cold', 'warm'):
+            start = time.perf_counter()
+            for resume in resumes:
+                rag_system.analyze_resume_against_job(resume['resume_text'], SAMPLE_JOB)
+            elapsed = time.perf_counter() - start
+            print(f"{label}: {elapsed / len(resumes) * 1e6:,.0f} us per analysis")
+
+        # A new instance starts with an empty in-memory LRU, so this measures
+        # hits served from SQLite, e.g. after a restart.
+        rag_system = make_rag_system(StubBackend(args.latency), workdir)
+        start = time.perf_counter()
+        for resume in resumes:
+            rag_system.analyze_resume_against_job(resume['resume_text'], SAMPLE_JOB)
+        elapsed = time.perf_counter() - start
+        print(f"restart: {elapsed / len(resumes) * 1e6:,.0f} us per analysis")
+        print(f"stats: {rag_system.analysis_cache_stats()}")
+
+
+def bench_pack(args):
+    resumes = make_resumes(args.resumes)
+    with tempfile.TemporaryDirectory() as workdir:
+        for pack_size in args.pack_size:
+            model = StubBackend(args.latency)
+            rag_system = make_rag_system(model, workdir, pack_size=pack_size)
+            start = time.perf_counter()
+            results = rag_system.batch_analyze_resumes(resumes, SAMPLE_JOB, use_cache=False)
+            elapsed = time.perf_counter() - start
+
+            in_order = [r['applicant_id'] for r in results] == [r['applicant_id'] for r in resumes]
+            print(f"pack_size={pack_size:>3}  {len(results)} resumes in {elapsed:.2f}s  "
+                  f"requests={model.requests}  prompt tokens/resume={model.prompt_tokens / len(results):.0f}  "
+                  f"in_order={in_order}")
+
+
+SKILL_POOL = ['Python', 'Machine Learning', 'Docker', 'Kubernetes', 'SQL', 'Java', 'React', 'AWS']
+
+
+def write_resume_files(folder: str, count: int, seed: int = 0) -> list:
+    from docx import Document
+
+    rng = np.random.default_rng(seed)
+    paths = []
+    for i in range(count):
+        skills = rng.choice(SKILL_POOL, size=int(rng.integers(1, 6)), replace=False)
+        document = Document()
+        document.add_heading(f'Candidate {i}', 0)
+        document.add_paragraph(f'candidate{i}@example.com | +1 555 {i:04d}')
+        document.add_paragraph('Experience: ' + ' '.join(
+            f'Delivered production projects using {skill}.' for skill in skills) * 3)
+        document.add_paragraph('Skills: ' + ', '.join(skills))
+        path = os.path.join(folder, f'resume_{i}.docx')
+        document.save(path)
+        paths.append(path)
+    return paths
+
+
+def bench_pipeline(args):
+    # Runs submission -> extraction -> storage -> indexing -> analysis ->
+    # emails -> CSV export entirely offline against StubBackend, timing each
+    # stage. Emails are rendered but not sent.
+    from database import get_database
+    from document_processor import DocumentProcessor
+    from email_system import EmailSystem
+    from csv_exporter import CSVExporter
+
+    class OutboxEmailSystem(EmailSystem):
+        def __init__(self):
+            super().__init__()
+            self.outbox = []
+
+        def _send_email(self, to_email, subject, html_body):
+            self.outbox.append((to_email, subject, len(html_body)))
+            return True
+
+    workdir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        timings = {}
+
+        def stage(name):
+            timings[name] = time.perf_counter()
+
+        paths = write_resume_files(workdir, args.resumes, args.seed)
+        db = get_database(args.database, db_folder=os.path.join(workdir, 'data'))
+        db.save_job_description(dict(SAMPLE_JOB, is_active=True))
+        model = StubBackend(args.latency, latency_distribution=args.latency_distribution,
+                            error_rate=args.error_rate, seed=args.seed)
+        rag_system = make_rag_system(model, workdir, max_in_flight=args.max_in_flight,
+                                     embeddings=HashingEmbedding())
+        doc_processor = DocumentProcessor()
+        email_system = OutboxEmailSystem()
+        csv_exporter = CSVExporter()
+
+        start = time.perf_counter()
+        stage('submit')
+        for i, path in enumerate(paths):
+            db.save_application({
+                'full_name': f'Candidate {i}',
+                'email': f'candidate{i}@example.com',
+                'position_applied': SAMPLE_JOB['job_title'],
+                'resume_filename': os.path.basename(path),
+                'resume_path': path
+            })
+
+        stage('claim+extract')
+        claimed = db.claim_pending_applications('benchmark', args.resumes, 600)
+        resumes = [{
+            'applicant_id': app['id'],
+            'full_name': app['full_name'],
+            'email': app['email'],
+            'position_applied': app['position_applied'],
+            'resume_text': doc_processor.extract_text(app['resume_path'])
+        } for app in claimed]
+
+        stage('index')
+        rag_system.add_resumes([r['resume_text'] for r in resumes], [r['applicant_id'] for r in resumes],
+                               [r['position_applied'] for r in resumes])
+
+        stage('analyze')
+        results = rag_system.batch_analyze_resumes(resumes, SAMPLE_JOB)
+
+        stage('store results')
+        db.save_analysis_results(results)
+        db.update_application_statuses({
+            r['applicant_id']: 'selected' if r['recommendation'] == 'SELECTED' else 'rejected' for r in results
+        })
+
+        stage('emails')
+        selected = [r for r in results if r['recommendation'] == 'SELECTED']
+        rejected = [r for r in results if r['recommendation'] != 'SELECTED']
+        email_system.send_batch_emails(selected, rejected)
+
+        stage('export')
+        csv_exporter.export_all_candidates_csv(db.get_all_applications(), list(db.iter_latest_results()), SAMPLE_JOB)
+        stage('end')
+    finally:
+        os.chdir(cwd)
+
+    names = list(timings)
+    for name, following in zip(names, names[1:]):
+        elapsed = timings[following] - timings[name]
+        print(f"{name:<14} {elapsed * 1e3:9.1f} ms  ({elapsed / args.resumes * 1e3:.2f} ms/resume)")
+    total = timings['end'] - start
+    print(f"{'total':<14} {total * 1e3:9.1f} ms  ({args.resumes / total:.1f} resumes/s)  "
+          f"selected={len(selected)} rejected={len(rejected)} emails={len(email_system.outbox)} "
+          f"llm requests={model.requests}")
+
+
+def bench_resilience(args):
+    resumes = make_resumes(args.resumes)
+    with tempfile.TemporaryDirectory() as workdir:
+        model = StubBackend(args.latency, error_rate=args.error_rate, hang_rate=args.hang_rate,
+                            hang_seconds=args.attempt_timeout * 2)
+        client = ResilientLLMClient(model, deadline=args.deadline, attempt_timeout=args.attempt_timeout,
+                                    max_attempts=args.max_attempts,
+                                    backoff_base=args.backoff, backoff_max=args.backoff * 8,
+                                    breaker=CircuitBreaker(args.breaker_threshold, reset_timeout=args.breaker_reset))
+        rag_system = make_rag_system(client, workdir, max_in_flight=args.max_in_flight)
+
+        start = time.perf_counter()
+        results = rag_system.batch_analyze_resumes(resumes, SAMPLE_JOB, use_cache=False)
+        elapsed = time.perf_counter() - start
+        fallbacks = sum(1 for r in results if 'failed' in str(r.get('reasoning', '')))
+        print(f"transient faults: {len(results)} resumes in {elapsed:.2f}s, fallback rejections={fallbacks}")
+        print(f"  client: {client.stats()}")
+
+        model.outage = True
+        model.requests = 0
+        start = time.perf_counter()
+        try:
+            rag_system.batch_analyze_resumes(resumes, SAMPLE_JOB, use_cache=False)
+            print("outage: batch unexpectedly completed")
+        except LLMUnavailableError as e:
+            print(f"outage: paused after {time.perf_counter() - start:.2f}s and {model.requests} provider calls "
+                  f"for {len(resumes)} resumes ({e})")
+        print(f"  breaker: state={client.breaker.state} retry_after={client.breaker.retry_after():.1f}s")
+
+
+def bench_stream(args):
+    resumes = make_resumes(args.resumes)
+    with tempfile.TemporaryDirectory() as workdir:
+        rag_system = make_rag_system(StubBackend(args.latency, chunk_delay=args.chunk_delay), workdir,
+                                     stream_responses=True)
+        for resume in resumes:
+            rag_system.analyze_resume_against_job(resume['resume_text'], SAMPLE_JOB, use_cache=False)
+
+    for name, summary in rag_system.llm_latency_stats().items():
+        print(f"{name:<24} n={summary['count']}  mean={summary['mean'] * 1e3:.0f} ms  "
+              f"p50<={summary['p50'] * 1e3:.0f} ms  p95<={summary['p95'] * 1e3:.0f} ms")
+
+
+STARTUP_SCRIPT = '''
+import json, os, sys, time
+start = time.perf_counter()
+import rag_system
+imported = time.perf_counter() - start
+start = time.perf_counter()
+kwargs = {}
+if %(fake)r:
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from embedding_cache import LazyEmbeddings
+    kwargs['embeddings'] = LazyEmbeddings(lambda: DeterministicFakeEmbedding(size=384))
+system = rag_system.ResumeRAGSystem(index_folder=%(index)r, embedding_cache_folder=%(cache)r, **kwargs)
+constructed = time.perf_counter() - start
+try:
+    warmup = system.warmup()
+except Exception as e:
+    warmup = {'error': str(e)}
+print(json.dumps({'import': imported, 'construct': constructed, 'warmup': warmup}))
+'''
+
+
+def bench_startup(args):
+    # Each run is a fresh interpreter, so import costs are measured cold.
+    import subprocess
+
+    with tempfile.TemporaryDirectory() as workdir:
+        script = STARTUP_SCRIPT % {
+            'fake': args.fake_embeddings,
+            'index': os.path.join(workdir, 'vector_index'),
+            'cache': os.path.join(workdir, 'embedding_cache'),
+        }
+        env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+        for run in range(args.runs):
+            output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, env=env)
+            if output.returncode != 0:
+                print(output.stderr.strip().splitlines()[-1])
+                return
+            timings = json.loads(output.stdout.strip().splitlines()[-1])
+            warmup = ', '.join(f"{name}={value:.2f}s" if isinstance(value, float) else f"{name}={value}"
+                               for name, value in timings['warmup'].items())
+            print(f"run {run + 1}: import rag_system {timings['import']:.2f}s, "
+                  f"ResumeRAGSystem() {timings['construct'] * 1e3:.0f} ms, warmup: {warmup}")
+
+
+def bench_prompt(args):
+    # Long resumes with filler up front and the relevant experience near the
+    # end, which is exactly what a fixed character cut-off drops.
+    filler = "Volunteer coordinator for community events and local fundraising drives. " * 15
+    relevant = "Built Python machine learning pipelines and deployed them with Docker. " * 5
+    resumes = [f"Candidate {i}\n\n" + (filler + "\n\n") * args.sections + relevant for i in range(args.resumes)]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        rag_system = make_rag_system(StubBackend(), workdir, resume_token_budget=args.budget,
+                                     embeddings=HashingEmbedding())
+        truncated_tokens = condensed_tokens = truncated_hits = condensed_hits = 0
+        start = time.perf_counter()
+        for resume in resumes:
+            truncated = resume[:4000]
+            condensed = rag_system.condense_resume(resume, SAMPLE_JOB)
+            truncated_tokens += estimate_tokens(truncated)
+            condensed_tokens += estimate_tokens(condensed)
+            truncated_hits += 'Docker' in truncated
+            condensed_hits += 'Docker' in condensed
+        elapsed = time.perf_counter() - start
+
+    print(f"truncate[:4000]: {truncated_tokens / len(resumes):.0f} tokens/resume, "
+          f"relevant section kept in {truncated_hits}/{len(resumes)}")
+    print(f"condensed (budget={args.budget}): {condensed_tokens / len(resumes):.0f} tokens/resume, "
+          f"relevant section kept in {condensed_hits}/{len(resumes)}, {elapsed / len(resumes) * 1e3:.1f} ms/resume")
+
+
+def bench_prescreen(args):
+    # Replays stored full analyses: for each floor, how many LLM calls the gate
+    # would have saved and how many SELECTED candidates it would have dropped.
+    from database import get_database
+    from document_processor import DocumentProcessor
+
+    db = get_database(db_folder=args.data)
+    doc_processor = DocumentProcessor()
+    by_position = {}
+    for result in db.iter_latest_results():
+        if result.get('prescreened'):
+            continue
+        application = db.get_application(result['applicant_id'])
+        resume_path = application and application.get('resume_path')
+        if not resume_path or not os.path.exists(resume_path):
+            continue
+        resume_text = doc_processor.extract_text(resume_path)
+        if resume_text:
+            selected = result.get('recommendation', '').upper() == 'SELECTED'
+            by_position.setdefault(result['position_applied'], []).append((resume_text, selected))
+
+    if not by_position:
+        print(f"No analysed applications with readable resumes in {args.data}")
+        return
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # embeddings=None makes ResumeRAGSystem load the configured model.
+        rag_system = make_rag_system(StubBackend(), workdir,
+                                     embeddings=HashingEmbedding() if args.hashing_embeddings else None)
+
+        similarities = []
+        selected = []
+        start = time.perf_counter()
+        for position, rows in by_position.items():
+            job_description = db.get_job_description_by_title(position)
+            if not job_description:
+                continue
+            similarities.extend(rag_system.prescreen_scores([text for text, _ in rows], job_description))
+            selected.extend(flag for _, flag in rows)
+        elapsed = time.perf_counter() - start
+
+    similarities = np.asarray(similarities)
+    selected = np.asarray(selected, dtype=bool)
+    print(f"{len(similarities)} analysed resumes, {selected.sum()} selected by full analysis, "
+          f"scored in {elapsed * 1e3:.0f} ms")
+    for floor in args.floors:
+        gated = similarities < floor
+        agreement = np.mean(gated != selected) if len(gated) else 0.0
+        print(f"floor={floor:.2f}  gated={gated.sum():>4} ({gated.mean():.0%} fewer LLM calls)  "
+              f"selected-but-gated={np.sum(gated & selected):>3}  "
+              f"gated-and-rejected={np.sum(gated & ~selected):>4}  agreement={agreement:.0%}")
+
+
+def clustered_vectors(centers: np.ndarray, count: int, rng) -> np.ndarray:
+    # Unit vectors scattered around topic centers, roughly how resume chunk
+    # embeddings spread out; uniform random vectors make ANN look worse.
+    vectors = centers[rng.integers(0, len(centers), count)]
+    vectors = vectors + 0.5 * rng.standard_normal(vectors.shape).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def bench_ann(args):
+    rng = np.random.default_rng(args.seed)
+    centers = rng.standard_normal((args.clusters, args.dimension)).astype(np.float32)
+    vectors = clustered_vectors(centers, args.vectors, rng)
+    queries = clustered_vectors(centers, args.queries, rng)
+
+    report = evaluate_index_types(vectors, queries, k=args.k, index_types=args.types, nprobe=args.nprobe,
+                                  ef_search=args.ef_search, nlist=args.nlist or None, pq_m=args.pq_m or None)
+    print(f"{args.vectors} vectors x {args.dimension} dims, {args.queries} queries, recall@{args.k} vs exact")
+    for index_type, stats in report.items():
+        print(f"{index_type:<9} build={stats['build_seconds']:6.2f}s  memory={stats['memory_bytes'] / 2**20:7.1f} MiB  "
+              f"query={stats['query_ms']:7.3f} ms  recall={stats['recall']:.3f}")
+
+
+SEARCH_TOOLS = ['PySpark', 'Kubernetes', 'Terraform', 'Airflow', 'Kafka', 'Snowflake', 'Flink', 'Helm', 'Istio',
+                'C++', 'Rust', 'GraphQL', 'Redis', 'Elasticsearch', 'Prometheus', 'Ansible']
+SEARCH_FILLER = [
+    "Led a team of engineers delivering customer facing features on a tight schedule.",
+    "Improved reliability of production services and reduced on-call incidents.",
+    "Worked closely with product managers to define requirements and milestones.",
+    "Mentored junior developers and ran weekly code review sessions.",
+    "Designed data pipelines and reporting for the analytics department.",
+    "Migrated legacy systems to the cloud with zero downtime.",
+    "Wrote technical documentation and onboarding guides for new hires.",
+    "Built internal tools that automated repetitive operational work.",
+]
+
+
+def make_search_corpus(count: int, tools_per_resume: int, rng) -> list:
+    # Long generic resumes, each mentioning a few specific tools once, which
+    # is the case where a single exact term is easy to lose in an embedding.
+    resumes = []
+    for i in range(count):
+        sentences = list(rng.choice(SEARCH_FILLER, size=24))
+        tools = list(rng.choice(SEARCH_TOOLS, size=tools_per_resume, replace=False))
+        for tool in tools:
+            sentences.insert(int(rng.integers(0, len(sentences))), f"Hands-on experience with {tool} in production.")
+        resumes.append({'applicant_id': f'applicant-{i}', 'position_applied': f'Position {i % 4}',
+                        'resume_text': ' '.join(sentences), 'tools': set(tools)})
+    return resumes
+
+
+def bench_search(args):
+    # Recall@k of each search mode for single-tool queries, where the
+    # relevant applicants are exactly those whose resume names the tool.
+    rng = np.random.default_rng(args.seed)
+    resumes = make_search_corpus(args.resumes, args.tools_per_resume, rng)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # embeddings=None makes ResumeRAGSystem load the configured model.
+        rag_system = make_rag_system(StubBackend(), workdir,
+                                     embeddings=HashingEmbedding() if args.hashing_embeddings else None)
+        start = time.perf_counter()
+        rag_system.add_resumes([r['resume_text'] for r in resumes], [r['applicant_id'] for r in resumes],
+                               [r['position_applied'] for r in resumes])
+        print(f"indexed {len(resumes)} resumes in {time.perf_counter() - start:.1f}s, "
+              f"{rag_system.keyword_index.stats()['chunks']} chunks")
+
+        def similar_resumes(tool):
+            # Pure vector baseline: top chunks, deduplicated to applicants.
+            chunks = rag_system.get_similar_resumes(tool, k=args.k * 4)
+            return list(dict.fromkeys(c['metadata']['applicant_id'] for c in chunks))[:args.k]
+
+        searches = {'get_similar_resumes': similar_resumes}
+        for mode in ('vector', 'keyword', 'hybrid'):
+            searches[mode] = lambda tool, mode=mode: [
+                c['applicant_id'] for c in rag_system.search_candidates(tool, k=args.k, mode=mode)
+            ]
+
+        for name, search in searches.items():
+            recalls = []
+            latencies = []
+            for tool in SEARCH_TOOLS:
+                relevant = {r['applicant_id'] for r in resumes if tool in r['tools']}
+                start = time.perf_counter()
+                found = search(tool)
+                latencies.append(time.perf_counter() - start)
+                recalls.append(len(relevant.intersection(found)) / min(args.k, len(relevant)) if relevant else 1.0)
+            print(f"{name:<20} recall@{args.k}={np.mean(recalls):.3f}  "
+                  f"p50={np.percentile(latencies, 50) * 1e3:6.2f} ms  p95={np.percentile(latencies, 95) * 1e3:6.2f} ms")
+
+
+def bench_match(args):
+    rng = np.random.default_rng(args.seed)
+    centers = rng.standard_normal((args.clusters, args.dimension)).astype(np.float32)
+    chunk_counts = rng.integers(1, 2 * args.chunks_per_resume, args.resumes)
+    chunks = clustered_vectors(centers, int(chunk_counts.sum()), rng)
+    candidates = {}
+    start = 0
+    for i, count in enumerate(chunk_counts):
+        candidates[f"applicant-{i}"] = (chunks[start:start + count], None)
+        start += count
+    jobs = clustered_vectors(centers, args.jobs + 1, rng)
+
+    def build():
+        matrix = MatchMatrix(args.dimension)
+        for j in range(args.jobs):
+            matrix.set_job(f"job-{j}", jobs[j], f"Job {j}")
+        matrix.set_candidates(candidates)
+        return matrix
+
+    started = time.perf_counter()
+    matrix = build()
+    full_seconds = time.perf_counter() - started
+    print(f"{args.resumes} candidates ({len(chunks)} chunks) x {args.jobs} jobs x {args.dimension} dims")
+    print(f"full build:       {full_seconds * 1000:9.2f} ms")
+
+    resume = clustered_vectors(centers, args.chunks_per_resume, rng)
+    started = time.perf_counter()
+    matrix.set_candidate('new-applicant', resume)
+    print(f"add one resume:   {(time.perf_counter() - started) * 1000:9.3f} ms")
+
+    started = time.perf_counter()
+    matrix.set_job('new-job', jobs[-1], "New job")
+    print(f"add one job:      {(time.perf_counter() - started) * 1000:9.3f} ms")
+
+    # The incremental rows and column must match a recompute from scratch.
+    candidates['new-applicant'] = (resume, None)
+    jobs_by_id = {f"job-{j}": j for j in range(args.jobs)}
+    jobs_by_id['new-job'] = args.jobs
+    expected = np.stack([
+        (chunk_vectors @ jobs[[jobs_by_id[job_id] for job_id in matrix.job_ids]].T).max(axis=0)
+        for chunk_vectors, _ in (candidates[applicant_id] for applicant_id in matrix.candidate_ids)
+    ])
+    print(f"max error vs recompute: {np.abs(matrix.scores - expected).max():.2e}")
+
+    started = time.perf_counter()
+    for applicant_id in matrix.candidate_ids[:args.queries]:
+        matrix.top_positions(applicant_id, args.top_n)
+    print(f"top-{args.top_n} positions:  {(time.perf_counter() - started) * 1000 / args.queries:9.3f} ms per candidate")
+
+    started = time.perf_counter()
+    matrix.top_candidates_by_job(args.top_n)
+    print(f"top-{args.top_n} candidates: {(time.perf_counter() - started) * 1000 / len(matrix.job_ids):9.3f} ms per job")
+
+
+def make_dedup_corpus(count: int, variants: int, rng) -> tuple:
+    # Resumes of random sentences over a Zipf-distributed vocabulary, plus
+    # edited copies (a few sentences rewritten, added or dropped) of some of
+    # them, as when a candidate reapplies with an updated resume.
+    def sentence():
+        return ' '.join(f"w{word}" for word in rng.zipf(1.3, int(rng.integers(6, 14))) % 5000) + '.'
+
+    resumes = {f"applicant-{i}": [sentence() for _ in range(int(rng.integers(20, 40)))] for i in range(count)}
+    edited = {}
+    for i in range(variants):
+        lines = list(resumes[f"applicant-{int(rng.integers(0, count))}"])
+        for _ in range(int(rng.integers(0, 8))):
+            edit = rng.integers(0, 3)
+            at = int(rng.integers(0, len(lines)))
+            if edit == 0:
+                lines[at] = sentence()
+            elif edit == 1:
+                lines.insert(at, sentence())
+            elif len(lines) > 1:
+                del lines[at]
+        edited[f"resubmission-{i}"] = lines
+    return ({key: '\n'.join(lines) for key, lines in resumes.items()},
+            {key: '\n'.join(lines) for key, lines in edited.items()})
+
+
+def bench_dedup(args):
+    # Precision/recall of the LSH lookup against exact shingle Jaccard over
+    # the whole corpus, and its latency against that brute-force scan.
+    rng = np.random.default_rng(args.seed)
+    resumes, resubmissions = make_dedup_corpus(args.resumes, args.resubmissions, rng)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        index = NearDuplicateIndex(os.path.join(workdir, 'near_duplicates.sqlite'), threshold=args.threshold,
+                                   num_perm=args.num_perm)
+        start = time.perf_counter()
+        index.add_many((applicant_id, text, None) for applicant_id, text in resumes.items())
+        print(f"indexed {len(resumes)} resumes in {time.perf_counter() - start:.2f}s, "
+              f"{index.bands} bands x {index.rows} rows, threshold {args.threshold}")
+
+        corpus_shingles = {applicant_id: shingles(text) for applicant_id, text in resumes.items()}
+        true_positives = false_positives = false_negatives = 0
+        lsh_latencies = []
+        scan_latencies = []
+        for text in resubmissions.values():
+            start = time.perf_counter()
+            found = {match['doc_id'] for match in index.query(text, limit=len(resumes))}
+            lsh_latencies.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            query = shingles(text)
+            relevant = {applicant_id for applicant_id, grams in corpus_shingles.items()
+                        if len(query & grams) / len(query | grams) >= args.threshold}
+            scan_latencies.append(time.perf_counter() - start)
+
+            true_positives += len(found & relevant)
+            false_positives += len(found - relevant)
+            false_negatives += len(relevant - found)
+
+    precision = true_positives / (true_positives + false_positives) if true_positives + false_positives else 1.0
+    recall = true_positives / (true_positives + false_negatives) if true_positives + false_negatives else 1.0
+    print(f"{len(resubmissions)} resubmissions, {true_positives + false_negatives} true near-duplicates")
+    print(f"precision={precision:.3f}  recall={recall:.3f}")
+    print(f"lsh lookup   p50={np.percentile(lsh_latencies, 50) * 1e3:7.2f} ms  "
+          f"p95={np.percentile(lsh_latencies, 95) * 1e3:7.2f} ms")
+    print(f"exact scan   p50={np.percentile(scan_latencies, 50) * 1e3:7.2f} ms  "
+          f"p95={np.percentile(scan_latencies, 95) * 1e3:7.2f} ms")
+
+
+MMAP_WORKER_SCRIPT = '''
+import sys
+import numpy as np
+from langchain_core.embeddings import DeterministicFakeEmbedding
+import rag_system
+system = rag_system.ResumeRAGSystem(index_folder=%(index)r, embedding_cache_folder=%(cache)r,
+                                    embeddings=DeterministicFakeEmbedding(size=%(dimension)d), mmap_index=%(mmap)r)
+if %(load)r:
+    index = system.vector_store.index
+    # Touch every vector, as a stream of queries eventually does.
+    index.search(np.random.default_rng(0).standard_normal((20, index.d)).astype(np.float32), 10)
+memory = {}
+for line in open('/proc/self/smaps_rollup'):
+    name, _, value = line.partition(':')
+    if name in ('Rss', 'Pss', 'Anonymous'):
+        memory[name] = int(value.split()[0]) / 1024
+print(memory, flush=True)
+sys.stdin.read()
+'''
+
+
+def bench_mmap(args):
+    # Starts N worker processes on one published index, with and without
+    # mmap_index, and reports per-worker private (anonymous) memory and
+    # proportional set size while they are all alive.
+    import ast
+    import subprocess
+    from langchain_core.documents import Document
+
+    with tempfile.TemporaryDirectory() as workdir:
+        rng = np.random.default_rng(0)
+        centers = rng.standard_normal((200, args.dimension)).astype(np.float32)
+        index = build_index(clustered_vectors(centers, args.vectors, rng), args.index_type)
+        docstore_ids = [f"a{i // 2}:{i % 2}" for i in range(args.vectors)]
+        docstore = InMemoryDocstore({i: Document(page_content=f"chunk {i}", metadata={'applicant_id': i.split(':')[0]})
+                                     for i in docstore_ids})
+        index_folder = os.path.join(workdir, 'vector_index')
+        publish_store(FAISS(HashingEmbedding(args.dimension), index, docstore, dict(enumerate(docstore_ids))),
+                      index_folder)
+        print(f"{args.vectors} vectors x {args.dimension} dims ({args.index_type}), "
+              f"{args.vectors * args.dimension * 4 / 2**20:.0f} MiB of vectors")
+
+        env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+        for label, load, mmap in (('no index', False, False), ('private', True, False), ('mmap', True, True)):
+            script = MMAP_WORKER_SCRIPT % {'index': index_folder, 'cache': os.path.join(workdir, 'embedding_cache'),
+                                           'dimension': args.dimension, 'mmap': mmap, 'load': load}
+            for workers in args.workers:
+                processes = [subprocess.Popen([sys.executable, '-c', script], stdin=subprocess.PIPE,
+                                              stdout=subprocess.PIPE, text=True, env=env) for _ in range(workers)]
+                memory = [ast.literal_eval(p.stdout.readline()) for p in processes]
+                for process in processes:
+                    process.communicate('')
+                print(f"{label:<9} workers={workers:<2}  anonymous/worker={np.mean([m['Anonymous'] for m in memory]):7.1f} MiB  "
+                      f"pss total={sum(m['Pss'] for m in memory):7.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the screening pipeline")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    throughput = subparsers.add_parser('throughput', help="batch_analyze_resumes against a fake LLM")
+    throughput.add_argument('--resumes', type=int, default=40)
+    throughput.add_argument('--latency', type=float, default=0.2)
+    throughput.add_argument('--max-in-flight', type=int, nargs='+', default=[1, 4, 16])
+    throughput.add_argument('--rpm', type=float, default=0)
+    throughput.add_argument('--tpm', type=float, default=0)
+    throughput.set_defaults(func=bench_throughput)
+
+    cache = subparsers.add_parser('cache', help="analysis cache hit latency vs a fake LLM call")
+    cache.add_argument('--resumes', type=int, default=20)
+    cache.add_argument('--latency', type=float, default=0.2)
+    cache.set_defaults(func=bench_cache)
+
+    pack = subparsers.add_parser('pack', help="requests and prompt tokens with multi-resume packing")
+    pack.add_argument('--resumes', type=int, default=40)
+    pack.add_argument('--latency', type=float, default=0.2)
+    pack.add_argument('--pack-size', type=int, nargs='+', default=[1, 4, 8])
+    pack.set_defaults(func=bench_pack)
+
+    pipeline = subparsers.add_parser('pipeline', help="end-to-end offline run with per-stage timings")
+    pipeline.add_argument('--resumes', type=int, default=50)
+    pipeline.add_argument('--database', default='json', choices=['json', 'sqlite', 'partitioned', 'journal'])
+    pipeline.add_argument('--latency', type=float, default=0.05)
+    pipeline.add_argument('--latency-distribution', default='lognormal',
+                          choices=['fixed', 'uniform', 'exponential', 'lognormal'])
+    pipeline.add_argument('--error-rate', type=float, default=0.0)
+    pipeline.add_argument('--max-in-flight', type=int, default=8)
+    pipeline.add_argument('--seed', type=int, default=0)
+    pipeline.set_defaults(func=bench_pipeline)
+
+    resilience = subparsers.add_parser('resilience', help="retries, deadlines and circuit breaker under injected faults")
+    resilience.add_argument('--resumes', type=int, default=30)
+    resilience.add_argument('--latency', type=float, default=0.02)
+    resilience.add_argument('--error-rate', type=float, default=0.2)
+    resilience.add_argument('--hang-rate', type=float, default=0.05)
+    resilience.add_argument('--deadline', type=float, default=3.0)
+    resilience.add_argument('--attempt-timeout', type=float, default=0.5)
+    resilience.add_argument('--max-attempts', type=int, default=4)
+    resilience.add_argument('--backoff', type=float, default=0.05)
+    resilience.add_argument('--breaker-threshold', type=int, default=5)
+    resilience.add_argument('--breaker-reset', type=float, default=30.0)
+    resilience.add_argument('--max-in-flight', type=int, default=4)
+    resilience.set_defaults(func=bench_resilience)
+
+    stream = subparsers.add_parser('stream', help="time-to-first-decision vs total latency when streaming")
+    stream.add_argument('--resumes', type=int, default=10)
+    stream.add_argument('--latency', type=float, default=0.3)
+    stream.add_argument('--chunk-delay', type=float, default=0.01)
+    stream.set_defaults(func=bench_stream)
+
+    startup = subparsers.add_parser('startup', help="import, construction and warmup time in a fresh process")
+    startup.add_argument('--runs', type=int, default=3)
+    startup.add_argument('--fake-embeddings', action='store_true',
+                         help="warm up a fake embeddings model instead of downloading the real one")
+    startup.set_defaults(func=bench_startup)
+
+    prompt = subparsers.add_parser('prompt', help="prompt size and coverage of condense_resume vs truncation")
+    prompt.add_argument('--resumes', type=int, default=20)
+    prompt.add_argument('--sections', type=int, default=6)
+    prompt.add_argument('--budget', type=int, default=600)
+    prompt.set_defaults(func=bench_prompt)
+
+    prescreen = subparsers.add_parser('prescreen', help="agreement of the similarity gate with stored analyses")
+    prescreen.add_argument('--data', default='data')
+    prescreen.add_argument('--floors', type=float, nargs='+', default=[0.1, 0.2, 0.3, 0.4, 0.5])
+    prescreen.add_argument('--hashing-embeddings', action='store_true',
+                           help="bag-of-words embeddings instead of the configured model (no download)")
+    prescreen.set_defaults(func=bench_prescreen)
+
+    ann = subparsers.add_parser('ann', help="build time, memory, latency and recall@k of each vector index type")
+    ann.add_argument('--vectors', type=int, default=50000)
+    ann.add_argument('--dimension', type=int, default=384)
+    ann.add_argument('--clusters', type=int, default=200)
+    ann.add_argument('--queries', type=int, default=200)
+    ann.add_argument('--k', type=int, default=10)
+    ann.add_argument('--types', nargs='+', default=list(INDEX_TYPES), choices=INDEX_TYPES)
+    ann.add_argument('--nlist', type=int, default=0, help="IVF lists (default: derived from --vectors)")
+    ann.add_argument('--nprobe', type=int, default=8)
+    ann.add_argument('--pq-m', type=int, default=0, help="PQ sub-quantizers (default: dimension / 4)")
+    ann.add_argument('--ef-search', type=int, default=64)
+    ann.add_argument('--seed', type=int, default=0)
+    ann.set_defaults(func=bench_ann)
+
+    search = subparsers.add_parser('search', help="recall@k and latency of vector, BM25 and hybrid candidate search")
+    search.add_argument('--resumes', type=int, default=1000)
+    search.add_argument('--tools-per-resume', type=int, default=3)
+    search.add_argument('--k', type=int, default=10)
+    search.add_argument('--seed', type=int, default=0)
+    search.add_argument('--hashing-embeddings', action='store_true',
+                        help="bag-of-words embeddings instead of the configured model (no download)")
+    search.set_defaults(func=bench_search)
+
+    match = subparsers.add_parser('match', help="candidates x positions matrix: full build vs incremental updates")
+    match.add_argument('--resumes', type=int, default=10000)
+    match.add_argument('--chunks-per-resume', type=int, default=4)
+    match.add_argument('--jobs', type=int, default=50)
+    match.add_argument('--dimension', type=int, default=384)
+    match.add_argument('--clusters', type=int, default=200)
+    match.add_argument('--top-n', type=int, default=3)
+    match.add_argument('--queries', type=int, default=1000)
+    match.add_argument('--seed', type=int, default=0)
+    match.set_defaults(func=bench_match)
+
+    dedup = subparsers.add_parser('dedup', help="precision/recall and latency of near-duplicate resume lookup")
+    dedup.add_argument('--resumes', type=int, default=5000)
+    dedup.add_argument('--resubmissions', type=int, default=200)
+    dedup.add_argument('--threshold', type=float, default=0.9)
+    dedup.add_argument('--num-perm', type=int, default=128)
+    dedup.add_argument('--seed', type=int, default=0)
+    dedup.set_defaults(func=bench_dedup)
+
+    mmap = subparsers.add_parser('mmap', help="per-worker memory with a private vs memory-mapped vector index")
+    mmap.add_argument('--vectors', type=int, default=100000)
+    mmap.add_argument('--dimension', type=int, default=384)
+    mmap.add_argument('--index-type', default='flat', choices=INDEX_TYPES)
+    mmap.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    mmap.set_defaults(func=bench_mmap)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
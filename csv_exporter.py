@@ -2,6 +2,10 @@ import os
 import csv
 from datetime import datetime
 from typing import List, Dict, Any
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.styles import Font, PatternFill, Alignment
+from openpyxl.utils.dataframe import dataframe_to_rows
 from config import Config
 
 class CSVExporter:
@@ -189,6 +193,9 @@ class CSVExporter:
         ws['A4'] = "Total Applications:"
         ws['B4'] = len(results)
         
+        selected_count = len([r for r in results if r.get('recommendation') == 'SELECTED'])
+        rejected_count = len([r for r in results if r.get('recommendation') == 'REJECTED'])
+        
         ws['A5'] = "Selected:"
         ws['B5'] = selected_count
         ws['A6'] = "Rejected:"
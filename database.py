@@ -1,18 +1,81 @@
+import atexit
+import contextlib
+import gzip
+import itertools
 import json
 import os
-from datetime import datetime
-from typing import Dict, Any, List, Optional
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Iterator
 import uuid
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# The latest-results log is folded into its snapshot once it outgrows both the
+# snapshot and this floor, so a save appends its batch and only occasionally
+# pays for rewriting the whole index.
+LATEST_LOG_MIN_BYTES = 1 << 20
+
+def _index_by_id(records: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    index = {}
+    for record in records:
+        index.setdefault(record.get('id'), record)
+    return index
+
+
+def _index_active_jobs_by_title(jobs: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    index = {}
+    for job in jobs:
+        if job.get('is_active', False):
+            index.setdefault(job.get('job_title', '').lower(), job)
+    return index
+
+
+def _copy_record(record: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    # What the public getters hand out. Readers share the cached records, so
+    # callers get their own copy to edit; an analysis batch's results are
+    # copied too, nested values below that are shared.
+    if record is None:
+        return None
+    copied = dict(record)
+    if isinstance(copied.get('results'), list):
+        copied['results'] = [dict(result) for result in copied['results']]
+    return copied
+
+
+def _is_leased_to_other(app: Dict[str, Any], worker_id: str, now: datetime) -> bool:
+    claimed_by = app.get('claimed_by')
+    if claimed_by is None or claimed_by == worker_id:
+        return False
+    return app.get('lease_expires_at', '') > now.isoformat()
+
+
 class SimpleDatabase:
     
-    def __init__(self, db_folder: str = "data"):
+    def __init__(self, db_folder: str = "data", cache: bool = True):
         self.db_folder = db_folder
         os.makedirs(db_folder, exist_ok=True)
         
+        self.cache_enabled = cache
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        
+        self.lock_file = os.path.join(db_folder, ".lock")
+        self._thread_lock = threading.RLock()
+        self._lock_depth = 0
+        self._lock_handle = None
+        
         self.applications_file = os.path.join(db_folder, "applications.json")
         self.job_descriptions_file = os.path.join(db_folder, "job_descriptions.json")
         self.results_file = os.path.join(db_folder, "analysis_results.json")
+        self.latest_results_file = os.path.join(db_folder, "latest_results.json")
+        self.latest_log_file = os.path.join(db_folder, "latest_results.jsonl")
         
         self._init_files()
     
@@ -28,125 +91,976 @@ class SimpleDatabase:
                 with open(file_path, 'w') as f:
                     json.dump([], f)
     
-    def _load_data(self, file_path: str) -> List[Dict[str, Any]]:
+    @contextlib.contextmanager
+    def _write_lock(self):
+        # The thread lock serialises writers in this process; the flock on
+        # data/.lock serialises them across worker processes. flock is per open
+        # file, so only the outermost acquisition takes it.
+        with self._thread_lock:
+            if self._lock_depth == 0 and fcntl is not None:
+                self._lock_handle = open(self.lock_file, 'a')
+                fcntl.flock(self._lock_handle, fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0 and self._lock_handle is not None:
+                    fcntl.flock(self._lock_handle, fcntl.LOCK_UN)
+                    self._lock_handle.close()
+                    self._lock_handle = None
+    
+    def _open(self, file_path: str):
+        if file_path.endswith('.gz'):
+            return gzip.open(file_path, 'rt', encoding='utf-8')
+        return open(file_path, 'r')
+    
+    def _file_signature(self, file_path: str) -> Optional[tuple]:
+        # _save_data replaces files via rename, so the inode changes on every
+        # write we make; mtime and size catch edits made by anything else.
         try:
-            with open(file_path, 'r') as f:
-                return json.load(f)
+            stat = os.stat(file_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    
+    def _cached_entry(self, file_path: str) -> Optional[Dict[str, Any]]:
+        entry = self._cache.get(file_path)
+        if entry is not None and entry['signature'] == self._file_signature(file_path):
+            return entry
+        return None
+    
+    def _read_json(self, file_path: str, for_update: bool = False) -> Any:
+        # Readers share the cached objects, so a writer, which mutates what it
+        # loads, always parses its own copy from disk; _save_data then caches
+        # that copy in place of the old one.
+        if self.cache_enabled and not for_update:
+            with self._cache_lock:
+                entry = self._cached_entry(file_path)
+                if entry is not None:
+                    self.cache_hits += 1
+                    return entry['data']
+                self.cache_misses += 1
+        
+        signature = self._file_signature(file_path)
+        try:
+            with self._open(file_path) as f:
+                data = json.load(f)
         except (FileNotFoundError, json.JSONDecodeError):
-            return []
+            return None
+        
+        if self.cache_enabled and not for_update:
+            self._remember(file_path, data, signature)
+        return data
     
-    def _save_data(self, file_path: str, data: List[Dict[str, Any]]):
-        with open(file_path, 'w') as f:
-            json.dump(data, f, indent=2, default=str)
-
-    def save_application(self, application_data: Dict[str, Any]) -> str:
-        applications = self._load_data(self.applications_file)
+    def _remember(self, file_path: str, data: Any, signature: Optional[tuple]):
+        if signature is None:
+            return
+        with self._cache_lock:
+            self._cache[file_path] = {'signature': signature, 'data': data, 'indexes': {}}
+    
+    def _lookup(self, file_path: str, index_name: str, key: Any, build_index) -> Optional[Dict[str, Any]]:
+        data = self._load_data(file_path)
+        
+        index = None
+        if self.cache_enabled:
+            with self._cache_lock:
+                entry = self._cache.get(file_path)
+                if entry is not None and entry['data'] is data:
+                    index = entry['indexes'].get(index_name)
+                    if index is None:
+                        index = entry['indexes'][index_name] = build_index(data)
         
-        application_id = str(uuid.uuid4())
-        application_data['id'] = application_id
-        application_data['created_at'] = datetime.now().isoformat()
-        application_data['status'] = 'pending'
+        if index is None:
+            index = build_index(data)
+        return index.get(key)
+    
+    def cache_stats(self) -> Dict[str, int]:
+        with self._cache_lock:
+            return {
+                'hits': self.cache_hits,
+                'misses': self.cache_misses,
+                'entries': len(self._cache),
+            }
+    
+    def _load_data(self, file_path: str, for_update: bool = False) -> List[Dict[str, Any]]:
+        data = self._read_json(file_path, for_update)
+        return data if data is not None else []
+    
+    def _iter_records(self, file_path: str, chunk_size: int = 65536) -> Iterator[Dict[str, Any]]:
+        if self.cache_enabled:
+            with self._cache_lock:
+                entry = self._cached_entry(file_path)
+            if entry is not None:
+                yield from entry['data']
+                return
         
-        applications.append(application_data)
-        self._save_data(self.applications_file, applications)
+        # Decodes the top-level JSON array one element at a time so callers can
+        # walk a large file without holding the whole list in memory.
+        decoder = json.JSONDecoder()
+        try:
+            f = self._open(file_path)
+        except FileNotFoundError:
+            return
         
-        return application_id
+        with f:
+            buffer = ''
+            pos = 0
+            in_array = False
+            eof = False
+            while True:
+                while True:
+                    while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                        pos += 1
+                    if pos < len(buffer) or eof:
+                        break
+                    chunk = f.read(chunk_size)
+                    eof = not chunk
+                    buffer = buffer[pos:] + chunk
+                    pos = 0
+                
+                if pos >= len(buffer):
+                    return
+                
+                if not in_array:
+                    if buffer[pos] != '[':
+                        return
+                    in_array = True
+                    pos += 1
+                    continue
+                
+                if buffer[pos] == ']':
+                    return
+                
+                try:
+                    record, pos = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        return
+                    chunk = f.read(chunk_size)
+                    eof = not chunk
+                    buffer = buffer[pos:] + chunk
+                    pos = 0
+                    continue
+                
+                yield record
+    
+    def _iter_after(self, records: Iterator[Dict[str, Any]], cursor: Optional[str]) -> Iterator[Dict[str, Any]]:
+        # The cursor is the id of the last record the caller has already seen.
+        if cursor is not None:
+            for record in records:
+                if record.get('id') == cursor:
+                    break
+        yield from records
+    
+    def _save_data(self, file_path: str, data: Any):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(file_path) or '.', suffix='.tmp')
+        try:
+            if file_path.endswith('.gz'):
+                with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb') as f:
+                    f.write(json.dumps(data, default=str).encode('utf-8'))
+            else:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(data, f, indent=2, default=str)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        
+        if self.cache_enabled:
+            self._remember(file_path, data, self._file_signature(file_path))
+
+    def save_application(self, application_data: Dict[str, Any]) -> str:
+        return self.save_applications([application_data])[0]
+
+    def save_applications(self, applications_data: List[Dict[str, Any]]) -> List[str]:
+        with self._write_lock():
+            applications = self._load_data(self.applications_file, for_update=True)
+            
+            application_ids = []
+            for application_data in applications_data:
+                application_id = str(uuid.uuid4())
+                application_data['id'] = application_id
+                application_data['created_at'] = datetime.now().isoformat()
+                application_data['status'] = 'pending'
+                application_ids.append(application_id)
+            
+            applications.extend(applications_data)
+            self._save_data(self.applications_file, applications)
+            
+            return application_ids
     
     def get_application(self, application_id: str) -> Optional[Dict[str, Any]]:
-        applications = self._load_data(self.applications_file)
-        for app in applications:
-            if app.get('id') == application_id:
-                return app
-        return None
+        return _copy_record(self._lookup(self.applications_file, 'id', application_id, _index_by_id))
     
     def get_all_applications(self) -> List[Dict[str, Any]]:
-        return self._load_data(self.applications_file)
+        return [_copy_record(app) for app in self._load_data(self.applications_file)]
+    
+    def iter_applications(self, status: Optional[str] = None, position: Optional[str] = None,
+                          since: Optional[str] = None, limit: Optional[int] = None,
+                          cursor: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        if isinstance(since, datetime):
+            since = since.isoformat()
+        
+        records = self._iter_after(self._iter_records(self.applications_file), cursor)
+        matching = (
+            _copy_record(app) for app in records
+            if (status is None or app.get('status') == status)
+            and (position is None or app.get('position_applied') == position)
+            and (since is None or app.get('created_at', '') >= since)
+        )
+        return itertools.islice(matching, limit)
     
     def update_application_status(self, application_id: str, status: str):
-        applications = self._load_data(self.applications_file)
-        for app in applications:
-            if app.get('id') == application_id:
-                app['status'] = status
-                app['updated_at'] = datetime.now().isoformat()
-                break
-        self._save_data(self.applications_file, applications)
+        self.update_application_statuses({application_id: status})
+    
+    def update_application_statuses(self, statuses: Dict[str, str]) -> int:
+        with self._write_lock():
+            applications = self._load_data(self.applications_file, for_update=True)
+            
+            updated = 0
+            for app in applications:
+                status = statuses.get(app.get('id'))
+                if status is not None:
+                    app['status'] = status
+                    app['updated_at'] = datetime.now().isoformat()
+                    app.pop('claimed_by', None)
+                    app.pop('lease_expires_at', None)
+                    updated += 1
+            
+            if updated:
+                self._save_data(self.applications_file, applications)
+            
+            return updated
+    
+    def claim_pending_applications(self, worker_id: str, n: int, ttl: float,
+                                   application_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        with self._write_lock():
+            applications = self._load_data(self.applications_file, for_update=True)
+            
+            now = datetime.now()
+            lease_expires_at = (now + timedelta(seconds=ttl)).isoformat()
+            wanted = set(application_ids) if application_ids is not None else None
+            
+            claimed = []
+            for app in applications:
+                if len(claimed) >= n:
+                    break
+                if app.get('status') != 'pending':
+                    continue
+                if wanted is not None and app.get('id') not in wanted:
+                    continue
+                if _is_leased_to_other(app, worker_id, now):
+                    continue
+                
+                app['claimed_by'] = worker_id
+                app['lease_expires_at'] = lease_expires_at
+                claimed.append(dict(app))
+            
+            if claimed:
+                self._save_data(self.applications_file, applications)
+            
+            return claimed
     
     def save_job_description(self, job_data: Dict[str, Any]) -> str:
-        job_descriptions = self._load_data(self.job_descriptions_file)
-        
-        job_id = str(uuid.uuid4())
-        job_data['id'] = job_id
-        job_data['created_at'] = datetime.now().isoformat()
-        job_data['is_active'] = True
+        with self._write_lock():
+            job_descriptions = self._load_data(self.job_descriptions_file, for_update=True)
+            
+            job_id = str(uuid.uuid4())
+            job_data['id'] = job_id
+            job_data['created_at'] = datetime.now().isoformat()
+            job_data['is_active'] = True
 
-        for job in job_descriptions:
-            job['is_active'] = False
-        
-        job_descriptions.append(job_data)
-        self._save_data(self.job_descriptions_file, job_descriptions)
-        
-        return job_id
+            for job in job_descriptions:
+                job['is_active'] = False
+            
+            job_descriptions.append(job_data)
+            self._save_data(self.job_descriptions_file, job_descriptions)
+            
+            return job_id
     
     def get_active_job_description(self) -> Optional[Dict[str, Any]]:
         job_descriptions = self._load_data(self.job_descriptions_file)
         for job in job_descriptions:
             if job.get('is_active', False):
-                return job
+                return _copy_record(job)
         return None
     
     def get_job_description_by_title(self, job_title: str) -> Optional[Dict[str, Any]]:
-        job_descriptions = self._load_data(self.job_descriptions_file)
-        for job in job_descriptions:
-            if job.get('job_title', '').lower() == job_title.lower() and job.get('is_active', False):
-                return job
-        return None
+        return _copy_record(self._lookup(self.job_descriptions_file, 'active_title', job_title.lower(),
+                                         _index_active_jobs_by_title))
     
     def get_all_job_descriptions(self) -> List[Dict[str, Any]]:
-        return self._load_data(self.job_descriptions_file)
+        return [_copy_record(job) for job in self._load_data(self.job_descriptions_file)]
     
     def save_analysis_results(self, results_data: List[Dict[str, Any]]) -> str:
-        all_results = self._load_data(self.results_file)
-        
-        batch_id = str(uuid.uuid4())
-        batch_data = {
-            'id': batch_id,
-            'created_at': datetime.now().isoformat(),
-            'results': results_data,
-        }
-        
+        with self._write_lock():
+            batch_id = str(uuid.uuid4())
+            batch_data = {
+                'id': batch_id,
+                'created_at': datetime.now().isoformat(),
+                'results': results_data,
+            }
+            
+            self._append_batch(batch_data)
+            self._log_latest_batch(batch_data)
+            
+            return batch_id
+    
+    def _append_batch(self, batch_data: Dict[str, Any]):
+        all_results = self._load_data(self.results_file, for_update=True)
         all_results.append(batch_data)
         self._save_data(self.results_file, all_results)
+    
+    def _index_batch(self, latest_index: Dict[str, Any], batch: Dict[str, Any]):
+        latest_batch = latest_index.get('latest_batch')
+        if not latest_batch or batch.get('created_at', '') >= latest_batch.get('created_at', ''):
+            latest_index['latest_batch'] = batch
         
-        return batch_id
+        for result in batch.get('results', []):
+            applicant_id = result.get('applicant_id')
+            if applicant_id is not None:
+                latest_index['results'][applicant_id] = dict(result, batch_id=batch.get('id'))
+    
+    def _log_latest_batch(self, batch: Dict[str, Any]):
+        # Called with the write lock held. The index is latest_results.json
+        # plus the batches appended to latest_results.jsonl since it was last
+        # written; readers fold the two together.
+        if self._file_signature(self.latest_results_file) is None:
+            self._load_latest_index()
+        
+        line = (json.dumps(batch, default=str) + '\n').encode('utf-8')
+        with open(self.latest_log_file, 'ab+') as f:
+            # A line torn by a writer that crashed mid-append is ended here so
+            # this entry is not glued onto it; readers skip it.
+            if f.seek(0, os.SEEK_END):
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    f.write(b'\n')
+            f.write(line)
+            log_size = f.tell()
+        
+        if log_size > max(os.path.getsize(self.latest_results_file), LATEST_LOG_MIN_BYTES):
+            self._save_latest_index(self._load_latest_index(for_update=True))
+    
+    def _save_latest_index(self, latest_index: Dict[str, Any]):
+        # Called with the write lock held. The snapshot goes first: a crash
+        # before the log is emptied only replays batches it already holds.
+        self._save_data(self.latest_results_file, latest_index)
+        with open(self.latest_log_file, 'w'):
+            pass
+    
+    def _read_latest_log(self) -> List[Dict[str, Any]]:
+        batches = []
+        try:
+            with open(self.latest_log_file, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b'\n') or not line.strip():
+                        continue
+                    try:
+                        batches.append(json.loads(line))
+                    except ValueError:
+                        print(f"Skipping corrupt entry in {self.latest_log_file}")
+        except FileNotFoundError:
+            pass
+        return batches
+    
+    def _load_latest_index(self, for_update: bool = False) -> Dict[str, Any]:
+        while True:
+            signature = (self._file_signature(self.latest_results_file), self._file_signature(self.latest_log_file))
+            if signature[0] is None:
+                break
+            
+            if self.cache_enabled and not for_update:
+                with self._cache_lock:
+                    entry = self._cache.get(self.latest_log_file)
+                    if entry is not None and entry['signature'] == signature:
+                        self.cache_hits += 1
+                        return entry['data']
+                    self.cache_misses += 1
+            
+            latest_index = self._read_json(self.latest_results_file, for_update=True)
+            batches = self._read_latest_log()
+            if latest_index is None:
+                break
+            # A writer folding the log in between would have replaced the
+            # snapshot; read both again rather than apply a log it emptied.
+            if self._file_signature(self.latest_results_file) != signature[0]:
+                continue
+            
+            for batch in batches:
+                self._index_batch(latest_index, batch)
+            if self.cache_enabled and not for_update:
+                self._remember(self.latest_log_file, latest_index, signature)
+            return latest_index
+        
+        # One-off rebuild for stores written before the index existed.
+        with self._write_lock():
+            latest_index = {'latest_batch': None, 'results': {}}
+            for batch in self._iter_batches():
+                self._index_batch(latest_index, batch)
+            self._save_latest_index(latest_index)
+            return latest_index
+    
+    def get_latest_result_for(self, applicant_id: str) -> Optional[Dict[str, Any]]:
+        return _copy_record(self._load_latest_index()['results'].get(applicant_id))
+    
+    def iter_latest_results(self) -> Iterator[Dict[str, Any]]:
+        return map(_copy_record, self._load_latest_index()['results'].values())
+    
+    def iter_analysis_results(self, since: Optional[str] = None, limit: Optional[int] = None,
+                              cursor: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        if isinstance(since, datetime):
+            since = since.isoformat()
+        
+        matching = (
+            _copy_record(batch) for batch in self._iter_batches(since, cursor)
+            if since is None or batch.get('created_at', '') >= since
+        )
+        return itertools.islice(matching, limit)
+    
+    def _iter_batches(self, since: Optional[str] = None, cursor: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        return self._iter_after(self._iter_records(self.results_file), cursor)
+    
+    def iter_results_for(self, applicant_id: str) -> Iterator[Dict[str, Any]]:
+        for batch in self._iter_batches():
+            for result in batch.get('results', []):
+                if result.get('applicant_id') == applicant_id:
+                    yield dict(result, batch_id=batch.get('id'))
     
     def get_analysis_results(self, batch_id: str) -> Optional[Dict[str, Any]]:
-        all_results = self._load_data(self.results_file)
-        for batch in all_results:
-            if batch.get('id') == batch_id:
-                return batch
-        return None
+        return _copy_record(self._lookup(self.results_file, 'id', batch_id, _index_by_id))
     
     def get_latest_analysis_results(self) -> Optional[Dict[str, Any]]:
-        all_results = self._load_data(self.results_file)
-        if all_results:
-            return max(all_results, key=lambda x: x.get('created_at', ''))
-        return None
+        return _copy_record(self._load_latest_index().get('latest_batch'))
     
     def get_all_analysis_results(self) -> List[Dict[str, Any]]:
-        return self._load_data(self.results_file)
+        return [_copy_record(batch) for batch in self._load_data(self.results_file)]
 
     def get_pending_applications(self) -> List[Dict[str, Any]]:
         applications = self._load_data(self.applications_file)
-        return [app for app in applications if app.get('status') == 'pending']
+        return [_copy_record(app) for app in applications if app.get('status') == 'pending']
     
     def get_processed_applications(self) -> List[Dict[str, Any]]:
         applications = self._load_data(self.applications_file)
-        return [app for app in applications if app.get('status') in ['selected', 'rejected']]
+        return [_copy_record(app) for app in applications if app.get('status') in ['selected', 'rejected']]
+    
+    def clear_all_data(self):
+        with self._write_lock():
+            self._save_data(self.applications_file, [])
+            self._save_data(self.job_descriptions_file, [])
+            self._save_data(self.results_file, [])
+            self._save_latest_index({'latest_batch': None, 'results': {}})
+
+
+class PartitionedDatabase(SimpleDatabase):
+    # Keeps analysis batches in one file per calendar month under
+    # data/analysis_results/, with an index of which month holds each batch
+    # and applicant. Saving a batch only rewrites the current month, and
+    # months older than the hot window can be gzip-compressed.
+    
+    def __init__(self, db_folder: str = "data", cache: bool = True,
+                 compress_archives: bool = True, hot_months: int = 1):
+        super().__init__(db_folder, cache)
+        
+        self.segments_folder = os.path.join(db_folder, "analysis_results")
+        self.segment_index_file = os.path.join(self.segments_folder, "index.json")
+        self.compress_archives = compress_archives
+        self.hot_months = hot_months
+        os.makedirs(self.segments_folder, exist_ok=True)
+        
+        self._migrate_legacy_results()
+    
+    def _segment_file(self, segment: str, compressed: bool) -> str:
+        return os.path.join(self.segments_folder, f"{segment}.json.gz" if compressed else f"{segment}.json")
+    
+    def _segment_path(self, index: Dict[str, Any], segment: str) -> str:
+        return self._segment_file(segment, segment in index['compressed'])
+    
+    def _segment_of(self, batch: Dict[str, Any]) -> str:
+        return (batch.get('created_at') or '')[:7] or 'undated'
+    
+    def _load_segment_index(self, for_update: bool = False) -> Dict[str, Any]:
+        index = self._read_json(self.segment_index_file, for_update)
+        if index is None:
+            index = {'segments': [], 'compressed': [], 'batches': {}, 'applicants': {}}
+        return index
+    
+    def _add_to_index(self, index: Dict[str, Any], segment: str, batch: Dict[str, Any]) -> bool:
+        is_new = segment not in index['segments']
+        if is_new:
+            index['segments'].append(segment)
+            index['segments'].sort()
+        
+        index['batches'][batch['id']] = segment
+        for result in batch.get('results', []):
+            segments = index['applicants'].setdefault(result.get('applicant_id'), [])
+            if segment not in segments:
+                segments.append(segment)
+        return is_new
+    
+    def _migrate_legacy_results(self):
+        if os.path.exists(self.segment_index_file):
+            return
+        
+        with self._write_lock():
+            if os.path.exists(self.segment_index_file):
+                return
+            
+            by_segment = {}
+            for batch in self._iter_records(self.results_file):
+                by_segment.setdefault(self._segment_of(batch), []).append(batch)
+            
+            index = self._load_segment_index(for_update=True)
+            for segment, batches in sorted(by_segment.items()):
+                self._save_data(self._segment_file(segment, False), batches)
+                for batch in batches:
+                    self._add_to_index(index, segment, batch)
+            self._save_data(self.segment_index_file, index)
+            
+            if by_segment:
+                # Keep the old single-file history as a backup rather than
+                # deleting it, and leave an empty file in its place.
+                os.replace(self.results_file, self.results_file + '.migrated')
+                self._init_files()
+                print(f"Moved {sum(len(b) for b in by_segment.values())} analysis batches into monthly segments")
+        
+        if self.compress_archives:
+            self.archive_results()
+    
+    def _append_batch(self, batch_data: Dict[str, Any]):
+        index = self._load_segment_index(for_update=True)
+        segment = self._segment_of(batch_data)
+        is_new = self._add_to_index(index, segment, batch_data)
+        
+        segment_file = self._segment_path(index, segment)
+        batches = self._load_data(segment_file, for_update=True)
+        batches.append(batch_data)
+        self._save_data(segment_file, batches)
+        self._save_data(self.segment_index_file, index)
+        
+        if is_new and self.compress_archives:
+            self.archive_results()
+    
+    def archive_results(self, hot_months: Optional[int] = None) -> int:
+        hot_months = self.hot_months if hot_months is None else hot_months
+        
+        with self._write_lock():
+            index = self._load_segment_index(for_update=True)
+            hot = set(index['segments'][-hot_months:]) if hot_months > 0 else set()
+            
+            archived = []
+            for segment in index['segments']:
+                if segment in hot or segment in index['compressed']:
+                    continue
+                plain_file = self._segment_file(segment, False)
+                self._save_data(self._segment_file(segment, True), self._load_data(plain_file))
+                index['compressed'].append(segment)
+                archived.append(plain_file)
+            
+            # The index must point at the compressed copies before the plain
+            # files go away; a crash in between only leaves a stale plain file.
+            self._save_data(self.segment_index_file, index)
+            for plain_file in archived:
+                os.remove(plain_file)
+            
+            return len(archived)
+    
+    def _iter_batches(self, since: Optional[str] = None, cursor: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        index = self._load_segment_index()
+        segments = index['segments']
+        
+        if cursor is not None:
+            start = index['batches'].get(cursor)
+            if start is None:
+                return
+            segments = [segment for segment in segments if segment >= start]
+        if since is not None:
+            segments = [segment for segment in segments if segment >= since[:7]]
+        
+        batches = itertools.chain.from_iterable(
+            self._iter_records(self._segment_path(index, segment)) for segment in segments
+        )
+        yield from self._iter_after(batches, cursor)
+    
+    def iter_results_for(self, applicant_id: str) -> Iterator[Dict[str, Any]]:
+        index = self._load_segment_index()
+        for segment in index['applicants'].get(applicant_id, []):
+            for batch in self._iter_records(self._segment_path(index, segment)):
+                for result in batch.get('results', []):
+                    if result.get('applicant_id') == applicant_id:
+                        yield dict(result, batch_id=batch.get('id'))
+    
+    def get_analysis_results(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        index = self._load_segment_index()
+        segment = index['batches'].get(batch_id)
+        if segment is None:
+            return None
+        return _copy_record(self._lookup(self._segment_path(index, segment), 'id', batch_id, _index_by_id))
     
     def get_all_analysis_results(self) -> List[Dict[str, Any]]:
-        return self._load_data(self.results_file)
+        return [_copy_record(batch) for batch in self._iter_batches()]
+    
+    def clear_all_data(self):
+        with self._write_lock():
+            index = self._load_segment_index(for_update=True)
+            for segment in index['segments']:
+                segment_file = self._segment_path(index, segment)
+                if os.path.exists(segment_file):
+                    os.remove(segment_file)
+            self._save_data(self.segment_index_file, {'segments': [], 'compressed': [], 'batches': {}, 'applicants': {}})
+            
+            super().clear_all_data()
+
+
+class JournaledDatabase(SimpleDatabase):
+    # Flat-file mode for deployments that cannot use SQLite. Writes are
+    # appended to a JSON Lines journal and applied to an in-memory copy of the
+    # data; a background thread periodically folds the journal back into the
+    # regular JSON files. Several processes may share a store: writers take the
+    # data/.lock flock and first replay entries other processes appended, and
+    # readers replay them too. Compaction swaps in a new, empty journal file,
+    # which tells the other processes to reload the folded JSON files.
+    
+    def __init__(self, db_folder: str = "data", compact_interval: float = 60.0):
+        # The journal keeps its own in-memory copy, so the file cache would only
+        # hold a second reference to data that is never read from disk again.
+        super().__init__(db_folder, cache=False)
+        
+        self.journal_file = os.path.join(db_folder, "journal.jsonl")
+        self._collections = {
+            'applications': self.applications_file,
+            'job_descriptions': self.job_descriptions_file,
+            'analysis_results': self.results_file,
+        }
+        self._lock = threading.RLock()
+        self._journal = None
+        
+        with self._lock:
+            self._reload()
+        
+        self._stop_event = threading.Event()
+        self._compactor = None
+        if compact_interval:
+            self._compactor = threading.Thread(target=self._compact_loop, args=(compact_interval,), daemon=True)
+            self._compactor.start()
+        
+        atexit.register(self.close)
+    
+    @contextlib.contextmanager
+    def _locked(self):
+        # Writers always take the flock before the in-memory lock, and read the
+        # journal tail once they hold both.
+        with self._write_lock(), self._lock:
+            self._catch_up(writing=True)
+            yield
+    
+    def _reload(self):
+        # Called with self._lock held: rebuilds the in-memory state from the
+        # JSON snapshots and replays the current journal file from the start.
+        self._records = {}
+        self._by_id = {}
+        for file_path in self._collections.values():
+            records = SimpleDatabase._load_data(self, file_path)
+            self._records[file_path] = records
+            self._by_id[file_path] = {r['id']: r for r in records if r.get('id') is not None}
+        
+        self._latest_index = {'latest_batch': None, 'results': {}}
+        for batch in self._records[self.results_file]:
+            self._index_batch(self._latest_index, batch)
+        
+        if self._journal is not None:
+            self._journal.close()
+        self._journal = open(self.journal_file, 'a')
+        self._journal_inode = os.fstat(self._journal.fileno()).st_ino
+        self._journal_offset = 0
+        self._replay_journal()
+    
+    def _catch_up(self, writing: bool = False):
+        # Called with self._lock held. Applies entries other processes have
+        # appended since we last looked; a new journal file means another
+        # process compacted, so the snapshots are re-read.
+        try:
+            stat = os.stat(self.journal_file)
+        except FileNotFoundError:
+            stat = None
+        if stat is None or stat.st_ino != self._journal_inode:
+            self._reload()
+        elif stat.st_size != self._journal_offset:
+            self._replay_journal()
+        
+        if writing and os.path.getsize(self.journal_file) > self._journal_offset:
+            # What is left is a line torn by a writer that crashed mid-append;
+            # drop it so the next entry does not get glued onto it. Only ever
+            # a tail without a newline: complete lines are committed entries.
+            with open(self.journal_file, 'rb') as f:
+                f.seek(self._journal_offset)
+                torn = b'\n' not in f.read()
+            if torn:
+                print(f"Ignoring truncated journal entry in {self.journal_file}")
+                os.truncate(self.journal_file, self._journal_offset)
+    
+    def _replay_journal(self) -> int:
+        # Applies complete lines from _journal_offset on. A line without its
+        # newline is either still being written or torn by a crash; it is left
+        # for the next call (or for a writer to truncate). A complete line that
+        # is not valid JSON is skipped.
+        replayed = 0
+        try:
+            with open(self.journal_file, 'rb') as f:
+                f.seek(self._journal_offset)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    if line.strip():
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            # Skipped, not stopped at: the entries after it
+                            # were committed and must still be applied.
+                            print(f"Skipping corrupt journal entry at byte {self._journal_offset} "
+                                  f"in {self.journal_file}")
+                        else:
+                            self._apply(entry)
+                            replayed += 1
+                    self._journal_offset += len(line)
+        except FileNotFoundError:
+            pass
+        return replayed
+    
+    def _apply(self, entry: Dict[str, Any]):
+        file_path = self._collections[entry['collection']]
+        records = self._records[file_path]
+        by_id = self._by_id[file_path]
+        
+        if entry['op'] == 'insert':
+            for record in entry['records']:
+                # Inserts are idempotent so replaying a journal that was already
+                # folded into the snapshot does not duplicate records.
+                existing = by_id.get(record.get('id'))
+                if existing is not None:
+                    existing.clear()
+                    existing.update(record)
+                else:
+                    records.append(record)
+                    by_id[record.get('id')] = record
+                
+                if file_path == self.results_file:
+                    self._index_batch(self._latest_index, record)
+        
+        elif entry['op'] == 'update':
+            for record_id, fields in entry['updates'].items():
+                record = by_id.get(record_id)
+                if record is None:
+                    continue
+                for key, value in fields.items():
+                    # None marks a field to drop, e.g. a released lease.
+                    if value is None:
+                        record.pop(key, None)
+                    else:
+                        record[key] = value
+    
+    def _write_journal(self, entries: List[Dict[str, Any]]):
+        lines = [json.dumps(entry, default=str) for entry in entries]
+        data = '\n'.join(lines) + '\n'
+        with self._locked():
+            self._journal.write(data)
+            self._journal.flush()
+            self._journal_offset += len(data.encode('utf-8'))
+            for line in lines:
+                self._apply(json.loads(line))
+    
+    def _load_data(self, file_path: str, for_update: bool = False) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._catch_up()
+            return list(self._records.get(file_path, []))
+    
+    def _iter_records(self, file_path: str, chunk_size: int = 65536) -> Iterator[Dict[str, Any]]:
+        return iter(self._load_data(file_path))
+    
+    def _load_latest_index(self, for_update: bool = False) -> Dict[str, Any]:
+        with self._lock:
+            self._catch_up()
+            return self._latest_index
+    
+    def save_applications(self, applications_data: List[Dict[str, Any]]) -> List[str]:
+        application_ids = []
+        for application_data in applications_data:
+            application_id = str(uuid.uuid4())
+            application_data['id'] = application_id
+            application_data['created_at'] = datetime.now().isoformat()
+            application_data['status'] = 'pending'
+            application_ids.append(application_id)
+        
+        self._write_journal([{'op': 'insert', 'collection': 'applications', 'records': applications_data}])
+        
+        return application_ids
+    
+    def get_application(self, application_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._catch_up()
+            return _copy_record(self._by_id[self.applications_file].get(application_id))
+    
+    def update_application_statuses(self, statuses: Dict[str, str]) -> int:
+        with self._locked():
+            applications = self._by_id[self.applications_file]
+            updates = {}
+            for application_id, status in statuses.items():
+                if application_id in applications:
+                    updates[application_id] = {
+                        'status': status,
+                        'updated_at': datetime.now().isoformat(),
+                        'claimed_by': None,
+                        'lease_expires_at': None,
+                    }
+            
+            if updates:
+                self._write_journal([{'op': 'update', 'collection': 'applications', 'updates': updates}])
+        
+        return len(updates)
+    
+    def claim_pending_applications(self, worker_id: str, n: int, ttl: float,
+                                   application_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        now = datetime.now()
+        lease_expires_at = (now + timedelta(seconds=ttl)).isoformat()
+        
+        with self._locked():
+            if application_ids is not None:
+                candidates = [self._by_id[self.applications_file].get(i) for i in application_ids]
+            else:
+                candidates = self._records[self.applications_file]
+            
+            updates = {}
+            for app in candidates:
+                if len(updates) >= n:
+                    break
+                if app is None or app.get('status') != 'pending' or _is_leased_to_other(app, worker_id, now):
+                    continue
+                updates[app['id']] = {'claimed_by': worker_id, 'lease_expires_at': lease_expires_at}
+            
+            if updates:
+                self._write_journal([{'op': 'update', 'collection': 'applications', 'updates': updates}])
+            
+            return [dict(self._by_id[self.applications_file][i]) for i in updates]
+    
+    def save_job_description(self, job_data: Dict[str, Any]) -> str:
+        job_id = str(uuid.uuid4())
+        job_data['id'] = job_id
+        job_data['created_at'] = datetime.now().isoformat()
+        job_data['is_active'] = True
+        
+        with self._locked():
+            deactivated = {
+                job['id']: {'is_active': False}
+                for job in self._records[self.job_descriptions_file]
+                if job.get('is_active', False) and job.get('id') is not None
+            }
+            self._write_journal([
+                {'op': 'update', 'collection': 'job_descriptions', 'updates': deactivated},
+                {'op': 'insert', 'collection': 'job_descriptions', 'records': [job_data]},
+            ])
+        
+        return job_id
+    
+    def save_analysis_results(self, results_data: List[Dict[str, Any]]) -> str:
+        batch_id = str(uuid.uuid4())
+        batch_data = {
+            'id': batch_id,
+            'created_at': datetime.now().isoformat(),
+            'results': results_data,
+        }
+        
+        self._write_journal([{'op': 'insert', 'collection': 'analysis_results', 'records': [batch_data]}])
+        
+        return batch_id
+    
+    def get_latest_result_for(self, applicant_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._catch_up()
+            return _copy_record(self._latest_index['results'].get(applicant_id))
+    
+    def iter_latest_results(self) -> Iterator[Dict[str, Any]]:
+        with self._lock:
+            self._catch_up()
+            return iter([_copy_record(result) for result in self._latest_index['results'].values()])
+    
+    def _new_journal(self):
+        # Called with both locks held. Replacing the file, rather than
+        # truncating it, gives it a new inode that other processes notice.
+        fd, tmp_path = tempfile.mkstemp(dir=self.db_folder, suffix='.tmp')
+        os.close(fd)
+        os.replace(tmp_path, self.journal_file)
+        self._journal.close()
+        self._journal = open(self.journal_file, 'a')
+        self._journal_inode = os.fstat(self._journal.fileno()).st_ino
+        self._journal_offset = 0
+    
+    def compact(self):
+        with self._locked():
+            if not self._journal_offset:
+                return
+            
+            for file_path in self._collections.values():
+                self._save_data(file_path, self._records[file_path])
+            self._save_latest_index(self._latest_index)
+            
+            # Snapshots are written before the journal is replaced; a crash in
+            # between only means the (idempotent) entries are replayed again.
+            self._new_journal()
+    
+    def _compact_loop(self, interval: float):
+        while not self._stop_event.wait(interval):
+            try:
+                self.compact()
+            except Exception as e:
+                print(f"Error compacting journal: {str(e)}")
+    
+    def close(self):
+        if self._stop_event.is_set():
+            return
+        self._stop_event.set()
+        if self._compactor is not None:
+            self._compactor.join()
+        
+        with self._locked():
+            self.compact()
+            self._journal.close()
     
     def clear_all_data(self):
-        self._save_data(self.applications_file, [])
-        self._save_data(self.job_descriptions_file, [])
-        self._save_data(self.results_file, [])
+        with self._locked():
+            for file_path in self._collections.values():
+                self._records[file_path] = []
+                self._by_id[file_path] = {}
+            self._latest_index = {'latest_batch': None, 'results': {}}
+            
+            super().clear_all_data()
+            
+            self._new_journal()
+
+
+def get_database(backend: Optional[str] = None, db_folder: str = "data"):
+    backend = (backend or os.environ.get('DATABASE_BACKEND') or 'json').lower()
+
+    if backend == 'sqlite':
+        from sqlite_database import SQLiteDatabase, migrate_json_to_sqlite
+
+        is_new = not os.path.exists(os.path.join(db_folder, "recruiter.db"))
+        database = SQLiteDatabase(db_folder)
+        if is_new:
+            counts = migrate_json_to_sqlite(db_folder, database)
+            print(f"Imported existing JSON data into SQLite: {counts}")
+        return database
+
+    if backend == 'partitioned':
+        compress = os.environ.get('ARCHIVE_COMPRESSION', 'gzip').lower() != 'none'
+        return PartitionedDatabase(db_folder, compress_archives=compress)
+
+    if backend == 'journal':
+        interval = float(os.environ.get('JOURNAL_COMPACT_INTERVAL', 60))
+        return JournaledDatabase(db_folder, compact_interval=interval)
+
+    if backend != 'json':
+        raise ValueError(f"Unsupported database backend: {backend}")
+
+    return SimpleDatabase(db_folder)
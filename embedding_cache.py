@@ -0,0 +1,201 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Dict, List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class EmbeddingCache:
+    # Append-only on-disk store of float32 vectors for one embedding model.
+    # Row i of <model>.f32 belongs to line i of <model>.keys, where each key is
+    # the SHA-256 of the embedded text. Vectors are read through a read-only
+    # memory map, so cached embeddings are not copied into every process.
+
+    def __init__(self, cache_folder: str, model_name: str):
+        self.cache_folder = cache_folder
+        self.model_name = model_name
+        os.makedirs(cache_folder, exist_ok=True)
+
+        base_name = re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name)
+        self.vectors_file = os.path.join(cache_folder, f"{base_name}.f32")
+        self.keys_file = os.path.join(cache_folder, f"{base_name}.keys")
+        self.meta_file = os.path.join(cache_folder, f"{base_name}.json")
+        self.lock_file = os.path.join(cache_folder, f"{base_name}.lock")
+
+        self._lock = threading.RLock()
+        self._rows = {}
+        self._keys_offset = 0
+        self._dimension = None
+        self._matrix = None
+
+        self.hits = 0
+        self.misses = 0
+
+        with self._lock:
+            self._sync()
+
+    @staticmethod
+    def key_for(text: str) -> str:
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def _sync(self):
+        # Picks up rows appended since the last sync, including ones written by
+        # other processes sharing the cache folder.
+        if self._dimension is None and os.path.exists(self.meta_file):
+            with open(self.meta_file, 'r') as f:
+                self._dimension = json.load(f)['dimension']
+        if self._dimension is None or not os.path.exists(self.keys_file):
+            return
+
+        with open(self.keys_file, 'r') as f:
+            f.seek(self._keys_offset)
+            for line in f:
+                if not line.endswith('\n'):
+                    break
+                self._keys_offset += len(line)
+                self._rows.setdefault(line.strip(), len(self._rows))
+
+        rows = len(self._rows)
+        if rows and (self._matrix is None or self._matrix.shape[0] != rows):
+            self._matrix = np.memmap(self.vectors_file, dtype=np.float32, mode='r',
+                                     shape=(rows, self._dimension))
+
+    def get_many(self, keys: List[str]) -> List[Optional[np.ndarray]]:
+        with self._lock:
+            if any(key not in self._rows for key in keys):
+                self._sync()
+
+            vectors = []
+            for key in keys:
+                row = self._rows.get(key)
+                if row is None:
+                    self.misses += 1
+                    vectors.append(None)
+                else:
+                    self.hits += 1
+                    vectors.append(self._matrix[row])
+            return vectors
+
+    def put_many(self, keys: List[str], vectors: List[List[float]]):
+        if not keys:
+            return
+
+        matrix = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            lock_handle = open(self.lock_file, 'a')
+            try:
+                if fcntl is not None:
+                    fcntl.flock(lock_handle, fcntl.LOCK_EX)
+                self._sync()
+
+                if self._dimension is None:
+                    self._dimension = int(matrix.shape[1])
+                    with open(self.meta_file, 'w') as f:
+                        json.dump({'model_name': self.model_name, 'dimension': self._dimension}, f)
+
+                new_rows = [i for i, key in enumerate(keys) if key not in self._rows]
+                new_rows = list({keys[i]: i for i in new_rows}.values())
+                if not new_rows:
+                    return
+
+                # Vectors go in before keys: a key line is only ever written
+                # once its row is fully on disk. A writer that died between the
+                # two appends left a vector without a key, or half a key line;
+                # cut both files back to the last complete entry so row i stays
+                # the vector of key line i.
+                row_bytes = len(self._rows) * self._dimension * np.dtype(np.float32).itemsize
+                if os.path.exists(self.vectors_file) and os.path.getsize(self.vectors_file) > row_bytes:
+                    os.truncate(self.vectors_file, row_bytes)
+                if os.path.exists(self.keys_file) and os.path.getsize(self.keys_file) > self._keys_offset:
+                    os.truncate(self.keys_file, self._keys_offset)
+                with open(self.vectors_file, 'ab') as f:
+                    f.write(matrix[new_rows].tobytes())
+                with open(self.keys_file, 'a') as f:
+                    f.write(''.join(keys[i] + '\n' for i in new_rows))
+
+                self._sync()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_handle, fcntl.LOCK_UN)
+                lock_handle.close()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._rows),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+class CachedEmbeddings(Embeddings):
+    # Wraps a LangChain embeddings model so only texts missing from the cache
+    # are sent to the model. Duplicate texts within one call are embedded once.
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def _embed(self, texts: List[str], keys: List[str], embed_fn) -> List[List[float]]:
+        cached = self.cache.get_many(keys)
+
+        missing = {}
+        for text, key, vector in zip(texts, keys, cached):
+            if vector is None:
+                missing.setdefault(key, text)
+
+        if missing:
+            new_vectors = embed_fn(list(missing.values()))
+            self.cache.put_many(list(missing.keys()), new_vectors)
+            fresh = dict(zip(missing.keys(), new_vectors))
+            cached = [fresh[key] if vector is None else vector for key, vector in zip(keys, cached)]
+
+        return [np.asarray(vector, dtype=np.float32).tolist() for vector in cached]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [EmbeddingCache.key_for(text) for text in texts]
+        return self._embed(texts, keys, self.embeddings.embed_documents)
+
+    def embed_query(self, text: str) -> List[float]:
+        # Some models embed queries differently from documents, so queries
+        # get their own key space.
+        key = EmbeddingCache.key_for('query\0' + text)
+        return self._embed([text], [key], lambda texts: [self.embeddings.embed_query(texts[0])])[0]
+
+
+class LazyEmbeddings(Embeddings):
+    # Defers building the real embeddings model (and importing its heavy
+    # dependencies) until the first text actually needs embedding, so cache
+    # hits and app startup never pay for it.
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._embeddings = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._embeddings is not None
+
+    def load(self) -> Embeddings:
+        if self._embeddings is None:
+            with self._lock:
+                if self._embeddings is None:
+                    self._embeddings = self._factory()
+        return self._embeddings
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.load().embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.load().embed_query(text)
@@ -0,0 +1,137 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, Any, List, Optional, Iterable
+
+# '+' and '#' are part of words so "C++" and "C#" stay searchable terms.
+SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5(
+    chunk_id UNINDEXED,
+    applicant_id UNINDEXED,
+    position UNINDEXED,
+    content,
+    tokenize = "unicode61 tokenchars '+#'"
+);
+"""
+
+TOKEN_PATTERN = re.compile(r"[\w+#]+")
+
+
+def match_expression(query_text: str) -> Optional[str]:
+    # Any query term may match; BM25 ranks chunks that match more, and rarer,
+    # terms higher. Quoting keeps FTS5 operators in user input literal.
+    terms = dict.fromkeys(TOKEN_PATTERN.findall(query_text.lower()))
+    if not terms:
+        return None
+    return ' OR '.join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+class KeywordIndex:
+    # BM25 inverted index over the same resume chunks as the vector shards,
+    # kept in an SQLite FTS5 table. Rows are added and deleted per applicant
+    # as resumes are indexed, and every worker process reads the same file.
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+
+        folder = os.path.dirname(db_path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+        self._local = threading.local()
+        self._connect().executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def is_empty(self) -> bool:
+        return self._connect().execute("SELECT 1 FROM chunks LIMIT 1").fetchone() is None
+
+    def replace_applicants(self, applicant_ids: Iterable[str], rows: List[Dict[str, Any]]):
+        # rows: chunk_id, applicant_id, position, content. Existing rows of the
+        # applicants are dropped first, whatever position they were under.
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM chunks WHERE applicant_id IN (SELECT value FROM json_each(?))",
+                         (json.dumps(list(applicant_ids)),))
+            conn.executemany(
+                "INSERT INTO chunks (chunk_id, applicant_id, position, content) VALUES (?, ?, ?, ?)",
+                [(row['chunk_id'], row['applicant_id'], row['position'] or '', row['content']) for row in rows]
+            )
+
+    def backfill(self, rows: Iterable[Dict[str, Any]]) -> int:
+        # Fills an empty index from existing chunks. BEGIN IMMEDIATE makes a
+        # second worker doing the same wait and then find the rows there.
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM chunks LIMIT 1").fetchone() is not None:
+                conn.rollback()
+                return 0
+            cursor = conn.executemany(
+                "INSERT INTO chunks (chunk_id, applicant_id, position, content) VALUES (?, ?, ?, ?)",
+                ((row['chunk_id'], row['applicant_id'], row['position'] or '', row['content']) for row in rows)
+            )
+            conn.commit()
+            return cursor.rowcount
+        except BaseException:
+            conn.rollback()
+            raise
+
+    def remove_applicant(self, applicant_id: str) -> bool:
+        conn = self._connect()
+        with conn:
+            return conn.execute("DELETE FROM chunks WHERE applicant_id = ?", (applicant_id,)).rowcount > 0
+
+    def clear(self):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM chunks")
+
+    def search_applicants(self, query_text: str, k: int, position: Optional[str] = None,
+                          applicant_ids=None) -> Dict[str, Dict[str, Any]]:
+        # Best chunk per applicant by BM25, in rank order. FTS5's bm25() is
+        # lower-is-better, so scores are negated.
+        expression = match_expression(query_text)
+        if expression is None:
+            return {}
+
+        sql = "SELECT applicant_id, position, content, -bm25(chunks) FROM chunks WHERE chunks MATCH ?"
+        params = [expression]
+        if position is not None:
+            sql += " AND position = ?"
+            params.append(position)
+        if applicant_ids is not None:
+            sql += " AND applicant_id IN (SELECT value FROM json_each(?))"
+            params.append(json.dumps(list(applicant_ids)))
+        sql += " ORDER BY rank LIMIT ?"
+
+        conn = self._connect()
+        limit = k * 4
+        while True:
+            rows = conn.execute(sql, params + [limit]).fetchall()
+            hits = {}
+            for applicant_id, row_position, content, score in rows:
+                hit = hits.get(applicant_id)
+                if hit is None:
+                    hits[applicant_id] = {'score': score, 'chunk_hits': 1, 'best_chunk': content,
+                                          'position_applied': row_position or None}
+                else:
+                    hit['chunk_hits'] += 1
+            if len(hits) >= k or len(rows) < limit:
+                return hits
+            limit *= 2
+
+    def stats(self) -> Dict[str, int]:
+        conn = self._connect()
+        return {
+            'chunks': conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0],
+            'applicants': conn.execute("SELECT COUNT(DISTINCT applicant_id) FROM chunks").fetchone()[0],
+        }
@@ -0,0 +1,160 @@
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import Dict, Any, List, Optional
+from config import Config
+from llm_client import estimate_tokens
+
+
+class LLMBackend:
+    # Anything ResumeRAGSystem sends prompts to. generate_content returns an
+    # object with .text, or with stream=True an iterable of such chunks,
+    # matching google.generativeai.GenerativeModel.
+
+    name = 'base'
+
+    def generate_content(self, prompt: str, stream: bool = False):
+        raise NotImplementedError
+
+
+class GeminiBackend(LLMBackend):
+
+    name = 'gemini'
+
+    def __init__(self, model_name: Optional[str] = None, api_key: Optional[str] = None):
+        import google.generativeai as genai
+
+        config = Config()
+        genai.configure(api_key=api_key or config.GEMINI_API_KEY)
+        self.model_name = model_name or config.GEMINI_MODEL
+        self.model = genai.GenerativeModel(self.model_name)
+
+    def generate_content(self, prompt: str, stream: bool = False):
+        return self.model.generate_content(prompt, stream=stream)
+
+
+class StubError(Exception):
+    # Looks like a 503 from the API, so the retry logic treats it as transient.
+    code = 503
+
+
+class StubBackend(LLMBackend):
+    # Offline stand-in for Gemini. Answers are a pure function of the prompt:
+    # required skills found in the resume text decide the matched/missing
+    # lists, the score and the recommendation. Latency and failures are drawn
+    # from a seeded RNG, so a run is reproducible for a given seed.
+
+    name = 'stub'
+
+    def __init__(self, latency: float = 0.0, latency_distribution: str = 'fixed', chunk_delay: float = 0.0,
+                 error_rate: float = 0.0, hang_rate: float = 0.0, hang_seconds: float = 60.0,
+                 selection_threshold: float = 7.0, seed: int = 0):
+        self.latency = latency
+        self.latency_distribution = latency_distribution
+        self.chunk_delay = chunk_delay
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.selection_threshold = selection_threshold
+        self.outage = False
+        self.requests = 0
+        self.prompt_tokens = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _sample_latency(self) -> float:
+        # Called with self._lock held.
+        if self.latency_distribution == 'uniform':
+            return self._rng.uniform(0, 2 * self.latency)
+        if self.latency_distribution == 'exponential':
+            return self._rng.expovariate(1 / self.latency) if self.latency else 0.0
+        if self.latency_distribution == 'lognormal':
+            # Median at `latency` with a long right tail, like real API calls.
+            return self.latency * self._rng.lognormvariate(0, 0.5) if self.latency else 0.0
+        return self.latency
+
+    def generate_content(self, prompt: str, stream: bool = False):
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += estimate_tokens(prompt)
+            roll = self._rng.random()
+            latency = self._sample_latency()
+
+        if self.outage or roll < self.error_rate:
+            time.sleep(latency)
+            raise StubError("503 Service Unavailable (stub)")
+        if roll < self.error_rate + self.hang_rate:
+            time.sleep(self.hang_seconds)
+
+        text = self.respond(prompt)
+        if stream:
+            return self._stream(text, latency)
+        time.sleep(latency + self.chunk_delay * len(text) / 16)
+        return SimpleNamespace(text=text)
+
+    def _stream(self, text: str, latency: float):
+        # First chunk after `latency`, then 16 characters every `chunk_delay`.
+        time.sleep(latency)
+        for start in range(0, len(text), 16):
+            time.sleep(self.chunk_delay)
+            yield SimpleNamespace(text=text[start:start + 16])
+
+    def respond(self, prompt: str) -> str:
+        skills_line = re.search(r'^Required Skills: (.*)$', prompt, re.MULTILINE)
+        skills = [s.strip() for s in (skills_line.group(1) if skills_line else '').split(',') if s.strip()]
+
+        # Packed prompts introduce each resume with "CANDIDATE applicant_id=<id>:".
+        candidates = re.split(r'^CANDIDATE applicant_id=(\S+):\n', prompt, flags=re.MULTILINE)
+        if len(candidates) > 1:
+            analyses = []
+            for applicant_id, resume_text in zip(candidates[1::2], candidates[2::2]):
+                resume_text = resume_text.split('\n\nIMPORTANT:')[0]
+                analyses.append(dict(self.analyze(resume_text, skills), applicant_id=applicant_id))
+            return json.dumps(analyses)
+
+        resume = re.search(r"CANDIDATE'S RESUME[^\n]*\n(.*?)\n\nPlease provide", prompt, re.DOTALL)
+        return json.dumps(self.analyze(resume.group(1) if resume else prompt, skills), indent=4)
+
+    def analyze(self, resume_text: str, skills: List[str]) -> Dict[str, Any]:
+        lowered = resume_text.lower()
+        matched = [s for s in skills if s.lower() in lowered]
+        missing = [s for s in skills if s.lower() not in lowered]
+        fraction = len(matched) / len(skills) if skills else 0.5
+
+        # A stable per-resume offset in [0, 1) keeps scores from clumping.
+        digest = hashlib.sha256(resume_text.encode('utf-8')).digest()
+        score = round(min(10.0, 3.0 + 6.0 * fraction + digest[0] / 256), 1)
+        recommendation = 'SELECTED' if score >= self.selection_threshold else 'REJECTED'
+
+        return {
+            "overall_score": score,
+            "skills_match": {"matched_skills": matched, "missing_skills": missing},
+            "experience_assessment": f"Stub assessment: {len(matched)} of {len(skills)} required skills found.",
+            "strengths": [f"Experience with {s}" for s in matched[:4]] or ["Clear resume structure"],
+            "weaknesses": [f"No evidence of {s}" for s in missing[:4]] or ["None identified"],
+            "recommendation": recommendation,
+            "reasoning": f"Stub reasoning: skills coverage {fraction:.0%}, score {score}. " * 8
+        }
+
+
+def get_llm_backend(backend: Optional[str] = None) -> LLMBackend:
+    backend = (backend or os.environ.get('LLM_BACKEND') or 'gemini').lower()
+
+    if backend == 'stub':
+        return StubBackend(
+            latency=float(os.environ.get('STUB_LLM_LATENCY', 0.0)),
+            latency_distribution=os.environ.get('STUB_LLM_LATENCY_DISTRIBUTION', 'fixed'),
+            error_rate=float(os.environ.get('STUB_LLM_ERROR_RATE', 0.0)),
+            hang_rate=float(os.environ.get('STUB_LLM_HANG_RATE', 0.0)),
+            seed=int(os.environ.get('STUB_LLM_SEED', 0))
+        )
+
+    if backend != 'gemini':
+        raise ValueError(f"Unsupported LLM backend: {backend}")
+
+    return GeminiBackend()
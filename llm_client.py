@@ -0,0 +1,447 @@
+import bisect
+import json
+import random
+import threading
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    # Reservation-style token bucket: callers take tokens immediately, which
+    # may push the balance negative, and then sleep until the debt is repaid.
+    # Waiters therefore get served in arrival order without polling.
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float = 1.0) -> float:
+        with self._lock:
+            self._refill()
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def acquire(self, amount: float = 1.0) -> float:
+        wait = self.reserve(amount)
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+
+class RateLimiter:
+    # Limits both requests per minute and (estimated) tokens per minute.
+    # A limit of 0 or None disables that bucket.
+
+    def __init__(self, requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.request_bucket = TokenBucket(requests_per_minute, clock=clock, sleep=sleep) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute, clock=clock, sleep=sleep) if tokens_per_minute else None
+        self._sleep = sleep
+        self.total_wait = 0.0
+
+    def acquire(self, tokens: float = 0.0) -> float:
+        wait = 0.0
+        if self.request_bucket is not None:
+            wait = max(wait, self.request_bucket.reserve(1))
+        if self.token_bucket is not None and tokens:
+            wait = max(wait, self.token_bucket.reserve(tokens))
+        if wait > 0:
+            self._sleep(wait)
+            self.total_wait += wait
+        return wait
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly four characters per token for English prose; good enough to
+    # keep a tokens-per-minute budget without calling the tokenizer.
+    return len(text) // 4 + 1
+
+
+class IncrementalJSONParser:
+    # Consumes a streamed JSON object chunk by chunk and reports each
+    # top-level scalar field (string, number, true/false/null) as soon as its
+    # value is complete. Nested values are skipped; anything before the
+    # opening brace, such as a ```json fence, is ignored.
+
+    def __init__(self):
+        self.buffer = ''
+        self.fields = {}
+        self.complete = False
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._token_start = None
+        self._key = None
+        self._expect = 'key'
+
+    def feed(self, text: str) -> dict:
+        self.buffer += text
+        new_fields = {}
+
+        while self._pos < len(self.buffer) and not self.complete:
+            i = self._pos
+            char = self.buffer[i]
+            self._pos += 1
+
+            if self._depth == 0:
+                if char == '{':
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._finish_token(i + 1, new_fields)
+                continue
+
+            if self._depth == 1 and self._token_start is not None and (char in ',}' or char.isspace()):
+                self._finish_token(i, new_fields)
+
+            if char == '"':
+                self._in_string = True
+                if self._depth == 1:
+                    self._token_start = i
+            elif char in '{[':
+                if self._depth == 1:
+                    self._key = None
+                    self._expect = 'comma'
+                self._depth += 1
+            elif char in '}]':
+                self._depth -= 1
+                self.complete = self._depth == 0
+            elif self._depth == 1:
+                if char == ':':
+                    self._expect = 'value'
+                elif char == ',':
+                    self._expect = 'key'
+                    self._key = None
+                elif not char.isspace() and self._expect == 'value' and self._token_start is None:
+                    self._token_start = i
+
+        return new_fields
+
+    def _finish_token(self, end: int, new_fields: dict):
+        token = self.buffer[self._token_start:end]
+        self._token_start = None
+        try:
+            value = json.loads(token)
+        except ValueError:
+            return
+
+        if self._expect == 'key':
+            self._key = value
+        elif self._key is not None:
+            self.fields[self._key] = new_fields[self._key] = value
+            self._key = None
+            self._expect = 'comma'
+
+
+class LatencyHistogram:
+    # Fixed, roughly log-spaced buckets in seconds. Percentiles are reported
+    # as the upper bound of the bucket they fall in.
+
+    BOUNDS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 64.0, float('inf'))
+
+    def __init__(self):
+        self.counts = [0] * len(self.BOUNDS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+
+    def percentile(self, q: float) -> float:
+        with self._lock:
+            if not self.count:
+                return 0.0
+            rank = q * self.count
+            seen = 0
+            for bound, count in zip(self.BOUNDS, self.counts):
+                seen += count
+                if seen >= rank:
+                    return min(bound, self.max)
+            return self.max
+
+    def summary(self) -> dict:
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'p50': self.percentile(0.5),
+            'p95': self.percentile(0.95),
+            'p99': self.percentile(0.99),
+            'max': self.max,
+        }
+
+
+class LLMUnavailableError(Exception):
+    # Raised instead of returning an answer when the provider cannot be
+    # reached; callers should requeue the work rather than fall back.
+    pass
+
+
+class CircuitOpenError(LLMUnavailableError):
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"LLM circuit breaker is open, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+# HTTP status codes worth retrying; google.api_core errors expose them as .code.
+RETRYABLE_STATUS_CODES = (408, 429, 500, 502, 503, 504)
+
+
+def is_retryable(error: Exception) -> bool:
+    code = getattr(error, 'code', None)
+    if isinstance(code, int):
+        return code in RETRYABLE_STATUS_CODES
+    return not isinstance(error, (ValueError, TypeError))
+
+
+def is_provider_error(error: Exception) -> bool:
+    # Any other status from the provider (400 for an invalid key, 401, 403,
+    # 404 for an unknown model, ...) means it will not serve us until someone
+    # fixes the configuration. Retrying now is pointless, but it is no verdict
+    # on the candidate either.
+    return isinstance(getattr(error, 'code', None), int) and not is_retryable(error)
+
+
+class CircuitBreaker:
+    # Opens after failure_threshold consecutive failures and rejects calls for
+    # reset_timeout seconds. After that a single trial call is let through:
+    # success closes the breaker, failure opens it again.
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+
+    def retry_after(self) -> float:
+        with self._lock:
+            if self.state != 'open':
+                return 0.0
+            return max(0.0, self.opened_at + self.reset_timeout - self._clock())
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'open':
+                remaining = self.opened_at + self.reset_timeout - self._clock()
+                if remaining > 0:
+                    raise CircuitOpenError(remaining)
+                self.state = 'half_open'
+            elif self.state == 'half_open':
+                # A trial call is already in flight.
+                raise CircuitOpenError(self.reset_timeout)
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    self.times_opened += 1
+                self.state = 'open'
+                self.opened_at = self._clock()
+
+
+class ResilientLLMClient:
+    # Wraps any model with generate_content(prompt, stream=False). Each attempt
+    # is cut off after attempt_timeout and the call as a whole after deadline;
+    # retryable failures are retried with full-jitter exponential backoff, and
+    # all failures feed a circuit breaker. Every attempt, retries included,
+    # goes through rate_limiter when one is set.
+    # When the provider is down or refuses us, LLMUnavailableError is raised
+    # rather than a made-up answer.
+
+    def __init__(self, model=None, deadline: float = 120.0, attempt_timeout: float = 45.0,
+                 max_attempts: int = 4, backoff_base: float = 1.0,
+                 backoff_max: float = 30.0, breaker: Optional[CircuitBreaker] = None,
+                 clock=time.monotonic, sleep=time.sleep, rng=None, model_factory=None,
+                 rate_limiter: Optional[RateLimiter] = None):
+        # Either a ready model or a model_factory, called on first use.
+        self._model = model
+        self._model_factory = model_factory
+        self._model_lock = threading.Lock()
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.rate_limiter = rate_limiter
+        self._clock = clock
+        self._sleep = sleep
+        self._rng = rng or random.Random()
+        self.latency = LatencyHistogram()
+        self.attempts = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.failures = 0
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = self._model_factory()
+        return self._model
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def _run_with_timeout(self, fn, timeout: float):
+        # The underlying SDK call cannot be cancelled, so it runs on a daemon
+        # thread that is simply abandoned if it outlives the deadline.
+        outcome = {}
+        done = threading.Event()
+
+        def target():
+            try:
+                outcome['value'] = fn()
+            except BaseException as e:
+                outcome['error'] = e
+            finally:
+                done.set()
+
+        threading.Thread(target=target, daemon=True).start()
+        if not done.wait(timeout):
+            raise TimeoutError(f"LLM call exceeded {timeout:.1f}s")
+        if 'error' in outcome:
+            raise outcome['error']
+        return outcome['value']
+
+    def _call(self, fn, deadline: Optional[float] = None, tokens: float = 0.0):
+        deadline = deadline if deadline is not None else self._clock() + self.deadline
+        last_error = None
+        tried = 0
+
+        for attempt in range(self.max_attempts):
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(tokens)
+            remaining = deadline - self._clock()
+            if remaining <= 0:
+                break
+            tried += 1
+
+            self.breaker.allow()
+            self.attempts += 1
+            start = self._clock()
+            try:
+                value = self._run_with_timeout(fn, min(remaining, self.attempt_timeout))
+            except Exception as e:
+                self.latency.observe(self._clock() - start)
+                last_error = e
+                if isinstance(e, TimeoutError):
+                    self.timeouts += 1
+                if is_provider_error(e):
+                    self.failures += 1
+                    self.breaker.record_failure()
+                    raise LLMUnavailableError(f"LLM provider refused the call: {e}") from e
+                if not is_retryable(e):
+                    # The request itself is bad; the provider is fine.
+                    self.breaker.record_success()
+                    raise
+                self.failures += 1
+                self.breaker.record_failure()
+            else:
+                self.latency.observe(self._clock() - start)
+                self.breaker.record_success()
+                return value
+
+            if attempt + 1 < self.max_attempts:
+                delay = self._rng.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                delay = min(delay, max(0.0, deadline - self._clock()))
+                if delay > 0:
+                    self.retries += 1
+                    self._sleep(delay)
+
+        raise LLMUnavailableError(f"LLM call failed after {tried} attempts: {last_error}")
+
+    def generate_content(self, prompt: str, stream: bool = False, tokens: Optional[float] = None):
+        # tokens is what each attempt charges the rate limiter, the prompt
+        # alone by default.
+        tokens = estimate_tokens(prompt) if tokens is None else tokens
+        if not stream:
+            return self._call(lambda: self.model.generate_content(prompt), tokens=tokens)
+
+        # Only getting the first chunk is retried; once output has been
+        # handed to the caller a failure can no longer be replayed. The rest
+        # of the stream still runs under the same deadline and feeds the
+        # breaker, and a transient failure in it raises LLMUnavailableError.
+        deadline = self._clock() + self.deadline
+
+        def first_chunk():
+            chunks = iter(self.model.generate_content(prompt, stream=True))
+            return next(chunks, None), chunks
+
+        first, chunks = self._call(first_chunk, deadline, tokens)
+        return self._continue_stream(first, chunks, deadline)
+
+    def _continue_stream(self, first, chunks, deadline: float):
+        if first is None:
+            return
+        yield first
+        while True:
+            try:
+                remaining = deadline - self._clock()
+                if remaining <= 0:
+                    raise TimeoutError(f"LLM stream exceeded the {self.deadline:.1f}s deadline")
+                chunk = self._run_with_timeout(lambda: next(chunks, None), min(remaining, self.attempt_timeout))
+            except Exception as e:
+                if isinstance(e, TimeoutError):
+                    self.timeouts += 1
+                if not is_retryable(e) and not is_provider_error(e):
+                    self.breaker.record_success()
+                    raise
+                self.failures += 1
+                self.breaker.record_failure()
+                raise LLMUnavailableError(f"LLM stream failed after partial output: {e}") from e
+            if chunk is None:
+                return
+            yield chunk
+
+    def stats(self) -> dict:
+        return {
+            'attempts': self.attempts,
+            'retries': self.retries,
+            'timeouts': self.timeouts,
+            'failures': self.failures,
+            'breaker_state': self.breaker.state,
+            'breaker_opened': self.breaker.times_opened,
+            'latency': self.latency.summary(),
+        }
@@ -0,0 +1,185 @@
+from typing import Dict, Any, List, Optional
+import numpy as np
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    vectors = np.array(vectors, dtype=np.float32, ndmin=2)
+    norms = np.linalg.norm(vectors, axis=1)
+    return vectors / np.where(norms == 0, 1, norms)[:, None]
+
+
+class MatchMatrix:
+    # Candidates x positions similarity matrix. A candidate scores against a
+    # job by their best chunk, the same cosine similarity prescreen_scores
+    # uses. Adding or replacing one candidate computes one row, one job one
+    # column; removals swap the last row/column into the gap.
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+
+        self.candidate_ids = []
+        self.candidate_positions = []
+        self._candidate_rows = {}
+        self._chunks = []
+        self._all_chunks = None
+
+        self.job_ids = []
+        self.job_titles = []
+        self._job_columns = {}
+        self._job_signatures = {}
+        self._job_vectors = np.zeros((0, dimension), dtype=np.float32)
+
+        self._scores = np.zeros((0, 0), dtype=np.float32)
+
+    @property
+    def scores(self) -> np.ndarray:
+        # len(candidate_ids) x len(job_ids), a view into the growable buffer.
+        return self._scores[:len(self.candidate_ids), :len(self.job_ids)]
+
+    def _grow(self, rows: int, columns: int):
+        # Capacity doubles, so adding one row or column is amortised O(1).
+        capacity_rows, capacity_columns = self._scores.shape
+        if rows <= capacity_rows and columns <= capacity_columns:
+            return
+        if rows > capacity_rows:
+            capacity_rows = max(rows, 2 * capacity_rows)
+        if columns > capacity_columns:
+            capacity_columns = max(columns, 2 * capacity_columns)
+        grown = np.zeros((capacity_rows, capacity_columns), dtype=np.float32)
+        grown[:len(self.candidate_ids), :len(self.job_ids)] = self.scores
+        self._scores = grown
+        if len(self._job_vectors) < grown.shape[1]:
+            job_vectors = np.zeros((grown.shape[1], self.dimension), dtype=np.float32)
+            job_vectors[:len(self.job_ids)] = self._job_vectors[:len(self.job_ids)]
+            self._job_vectors = job_vectors
+
+    def _chunk_matrix(self):
+        # All candidates' chunks stacked, with each candidate's first row, for
+        # scoring a new job column in one matrix-vector product.
+        if self._all_chunks is None:
+            offsets = np.cumsum([0] + [len(chunks) for chunks in self._chunks[:-1]]) if self._chunks else []
+            stacked = np.concatenate(self._chunks) if self._chunks else np.zeros((0, self.dimension), np.float32)
+            self._all_chunks = (stacked, np.asarray(offsets, dtype=np.int64))
+        return self._all_chunks
+
+    def set_candidates(self, candidates: Dict[str, Any]):
+        # candidates: applicant_id -> (chunk vectors, position applied). Rows
+        # for all of them come from one chunks x jobs matrix product.
+        if not candidates:
+            return
+        chunk_sets = [normalize_rows(vectors) for vectors, _ in candidates.values()]
+        rows = []
+        for applicant_id, (_, position) in candidates.items():
+            row = self._candidate_rows.get(applicant_id)
+            if row is None:
+                row = len(self.candidate_ids)
+                self._grow(row + 1, len(self.job_ids))
+                self._candidate_rows[applicant_id] = row
+                self.candidate_ids.append(applicant_id)
+                self.candidate_positions.append(position)
+                self._chunks.append(None)
+            self.candidate_positions[row] = position
+            rows.append(row)
+
+        for row, chunks in zip(rows, chunk_sets):
+            self._chunks[row] = chunks
+        self._all_chunks = None
+
+        if self.job_ids:
+            stacked = np.concatenate(chunk_sets)
+            offsets = np.cumsum([0] + [len(chunks) for chunks in chunk_sets[:-1]])
+            similarities = stacked @ self._job_vectors[:len(self.job_ids)].T
+            self._scores[rows, :len(self.job_ids)] = np.maximum.reduceat(similarities, offsets, axis=0)
+
+    def set_candidate(self, applicant_id: str, chunk_vectors, position: Optional[str] = None):
+        self.set_candidates({applicant_id: (chunk_vectors, position)})
+
+    def remove_candidate(self, applicant_id: str) -> bool:
+        row = self._candidate_rows.pop(applicant_id, None)
+        if row is None:
+            return False
+        last = len(self.candidate_ids) - 1
+        if row != last:
+            moved = self.candidate_ids[last]
+            self.candidate_ids[row] = moved
+            self.candidate_positions[row] = self.candidate_positions[last]
+            self._chunks[row] = self._chunks[last]
+            self._scores[row] = self._scores[last]
+            self._candidate_rows[moved] = row
+        self.candidate_ids.pop()
+        self.candidate_positions.pop()
+        self._chunks.pop()
+        self._all_chunks = None
+        return True
+
+    def job_signature(self, job_id: str):
+        return self._job_signatures.get(job_id)
+
+    def set_job(self, job_id: str, vector, title: str, signature: Any = None):
+        vector = normalize_rows(vector)[0]
+        column = self._job_columns.get(job_id)
+        if column is None:
+            column = len(self.job_ids)
+            self._grow(len(self.candidate_ids), column + 1)
+            self._job_columns[job_id] = column
+            self.job_ids.append(job_id)
+            self.job_titles.append(title)
+        self.job_titles[column] = title
+        self._job_signatures[job_id] = signature
+        self._job_vectors[column] = vector
+
+        if self.candidate_ids:
+            stacked, offsets = self._chunk_matrix()
+            self._scores[:len(self.candidate_ids), column] = np.maximum.reduceat(stacked @ vector, offsets)
+
+    def remove_job(self, job_id: str) -> bool:
+        column = self._job_columns.pop(job_id, None)
+        if column is None:
+            return False
+        self._job_signatures.pop(job_id, None)
+        last = len(self.job_ids) - 1
+        if column != last:
+            moved = self.job_ids[last]
+            self.job_ids[column] = moved
+            self.job_titles[column] = self.job_titles[last]
+            self._job_vectors[column] = self._job_vectors[last]
+            self._scores[:, column] = self._scores[:, last]
+            self._job_columns[moved] = column
+        self.job_ids.pop()
+        self.job_titles.pop()
+        return True
+
+    def top_positions(self, applicant_id: str, n: int = 3, exclude_applied: bool = True) -> List[Dict[str, Any]]:
+        # Best alternative openings for one candidate.
+        row = self._candidate_rows.get(applicant_id)
+        if row is None:
+            return []
+        applied = (self.candidate_positions[row] or '').lower()
+        matches = [
+            {'job_id': self.job_ids[column], 'job_title': self.job_titles[column], 'score': float(self._scores[row, column])}
+            for column in np.argsort(-self.scores[row])
+            if not (exclude_applied and self.job_titles[column].lower() == applied)
+        ]
+        return matches[:n]
+
+    def top_candidates(self, job_id: str, n: int = 10) -> List[Dict[str, Any]]:
+        # Best candidates for one opening, whatever position they applied for.
+        column = self._job_columns.get(job_id)
+        if column is None or not self.candidate_ids:
+            return []
+        column_scores = self.scores[:, column]
+        n = min(n, len(column_scores))
+        top = np.argpartition(-column_scores, n - 1)[:n]
+        top = top[np.argsort(-column_scores[top])]
+        return [{'applicant_id': self.candidate_ids[row], 'position_applied': self.candidate_positions[row],
+                 'score': float(column_scores[row])} for row in top]
+
+    def top_candidates_by_job(self, n: int = 10) -> Dict[str, List[Dict[str, Any]]]:
+        return {job_id: self.top_candidates(job_id, n) for job_id in self.job_ids}
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'candidates': len(self.candidate_ids),
+            'jobs': len(self.job_ids),
+            'chunks': sum(len(chunks) for chunks in self._chunks),
+        }
@@ -0,0 +1,248 @@
+import difflib
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import zlib
+from typing import Dict, Any, List, Optional, Iterable
+import numpy as np
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS documents (
+    doc_id TEXT PRIMARY KEY,
+    position TEXT,
+    text_hash TEXT NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS buckets (
+    key INTEGER NOT NULL,
+    doc_id TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_buckets_key ON buckets (key);
+CREATE INDEX IF NOT EXISTS idx_buckets_doc_id ON buckets (doc_id);
+"""
+
+WORD_PATTERN = re.compile(r"[\w+#]+")
+# Largest prime below 2**32: (a * x + b) mod PRIME never overflows uint64.
+PRIME = 4294967291
+
+
+def normalize_text(text: str) -> str:
+    return ' '.join(WORD_PATTERN.findall((text or '').lower()))
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+
+
+def shingles(text: str, size: int = 3) -> set:
+    # Overlapping word n-grams; word order matters, case and punctuation
+    # (and so PDF extraction noise) do not.
+    words = normalize_text(text).split()
+    if len(words) < size:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def jaccard(text_a: str, text_b: str, size: int = 3) -> float:
+    return shingle_jaccard(shingles(text_a, size), shingles(text_b, size))
+
+
+def shingle_jaccard(a: set, b: set) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def lsh_bands(threshold: float, num_perm: int, false_negative_weight: float = 0.9) -> tuple:
+    # (bands, rows) whose S-curve 1 - (1 - s**rows)**bands best separates
+    # pairs above and below threshold: the weighted area of false positives
+    # below it plus false negatives above it is smallest. Candidates are
+    # verified exactly, so missed pairs cost more than extra candidates.
+    s = np.linspace(0, 1, 201)
+    best = None
+    for bands in range(1, num_perm + 1):
+        for rows in range(1, num_perm // bands + 1):
+            probability = 1 - (1 - s ** rows) ** bands
+            error = np.mean(np.where(s < threshold, (1 - false_negative_weight) * probability,
+                                     false_negative_weight * (1 - probability)))
+            if best is None or error < best[0]:
+                best = (error, bands, rows)
+    return best[1], best[2]
+
+
+def text_diff(old_text: str, new_text: str, limit: int = 20) -> Dict[str, List[str]]:
+    # Lines only in one of the two versions, ignoring whitespace changes.
+    old_lines = [' '.join(line.split()) for line in (old_text or '').splitlines() if line.strip()]
+    new_lines = [' '.join(line.split()) for line in (new_text or '').splitlines() if line.strip()]
+    added, removed = [], []
+    for line in difflib.ndiff(old_lines, new_lines):
+        if line.startswith('+ '):
+            added.append(line[2:])
+        elif line.startswith('- '):
+            removed.append(line[2:])
+    return {'added': added[:limit], 'removed': removed[:limit]}
+
+
+class MinHasher:
+    # num_perm universal hash functions over crc32 shingle hashes. Two
+    # signatures agree at each position with probability equal to the
+    # Jaccard similarity of the shingle sets, which is what LSH bands on.
+
+    def __init__(self, num_perm: int = 128, shingle_size: int = 3, seed: int = 1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, PRIME, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, PRIME, num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        return self.signature_of(shingles(text, self.shingle_size))
+
+    def signature_of(self, grams: set) -> Optional[np.ndarray]:
+        if not grams:
+            return None
+        hashes = np.fromiter((zlib.crc32(gram.encode('utf-8')) for gram in grams), dtype=np.uint64,
+                             count=len(grams)) % PRIME
+        return ((hashes[:, None] * self._a + self._b) % PRIME).min(axis=0).astype(np.uint32)
+
+
+class NearDuplicateIndex:
+    # MinHash signatures of resume texts with LSH buckets in SQLite. A query
+    # looks up one bucket per band, so it only compares against documents
+    # that share a band, not the whole collection, and confirms those with
+    # their exact shingle Jaccard similarity. Shared by all worker processes
+    # like KeywordIndex.
+
+    def __init__(self, db_path: str, threshold: float = 0.9, num_perm: int = 128, shingle_size: int = 3):
+        self.db_path = db_path
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm, shingle_size)
+        self.bands, self.rows = lsh_bands(threshold, num_perm)
+
+        folder = os.path.dirname(db_path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+        self._local = threading.local()
+        self._connect().executescript(SCHEMA)
+        self._check_settings()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def _check_settings(self):
+        # Signatures and buckets depend on these; the texts are stored, so a
+        # change just re-hashes everything.
+        settings = json.dumps([self.hasher.num_perm, self.hasher.shingle_size, self.bands, self.rows])
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT value FROM settings WHERE name = 'minhash'").fetchone()
+            if row is None or row[0] != settings:
+                documents = conn.execute("SELECT doc_id, position, text FROM documents").fetchall()
+                conn.execute("DELETE FROM documents")
+                conn.execute("DELETE FROM buckets")
+                for doc_id, position, text in documents:
+                    self._insert(conn, doc_id, text, position)
+                conn.execute("INSERT OR REPLACE INTO settings (name, value) VALUES ('minhash', ?)", (settings,))
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+    def _bucket_keys(self, signature: np.ndarray) -> List[int]:
+        keys = []
+        for band in range(self.bands):
+            rows = signature[band * self.rows:(band + 1) * self.rows]
+            digest = hashlib.blake2b(rows.tobytes(), digest_size=8, person=band.to_bytes(4, 'little')).digest()
+            keys.append(int.from_bytes(digest, 'little', signed=True))
+        return keys
+
+    def _insert(self, conn: sqlite3.Connection, doc_id: str, text: str, position: Optional[str]) -> bool:
+        conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,))
+        conn.execute("DELETE FROM buckets WHERE doc_id = ?", (doc_id,))
+        signature = self.hasher.signature(text)
+        if signature is None:
+            return False
+        conn.execute("INSERT INTO documents (doc_id, position, text_hash, text) VALUES (?, ?, ?, ?)",
+                     (doc_id, position, text_hash(text), text))
+        conn.executemany("INSERT INTO buckets (key, doc_id) VALUES (?, ?)",
+                         [(key, doc_id) for key in self._bucket_keys(signature)])
+        return True
+
+    def add(self, doc_id: str, text: str, position: Optional[str] = None) -> bool:
+        # Replaces any earlier text of doc_id. Texts without words are not
+        # indexed.
+        conn = self._connect()
+        with conn:
+            return self._insert(conn, doc_id, text, position)
+
+    def add_many(self, documents: Iterable[tuple]):
+        # documents: (doc_id, text, position), in one transaction.
+        conn = self._connect()
+        with conn:
+            for doc_id, text, position in documents:
+                self._insert(conn, doc_id, text, position)
+
+    def remove(self, doc_id: str) -> bool:
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM buckets WHERE doc_id = ?", (doc_id,))
+            return conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,)).rowcount > 0
+
+    def clear(self):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM documents")
+            conn.execute("DELETE FROM buckets")
+
+    def query(self, text: str, threshold: Optional[float] = None, exclude: Iterable[str] = (),
+              limit: int = 10) -> List[Dict[str, Any]]:
+        # Documents whose Jaccard similarity to text is at least threshold
+        # (default: the one the bands were tuned for; far lower ones miss
+        # candidates), most similar first. Exact copies have similarity 1.0.
+        threshold = self.threshold if threshold is None else threshold
+        grams = shingles(text, self.hasher.shingle_size)
+        signature = self.hasher.signature_of(grams)
+        if signature is None:
+            return []
+
+        rows = self._connect().execute(
+            "SELECT doc_id, position, text_hash, text FROM documents WHERE doc_id IN ("
+            "SELECT DISTINCT doc_id FROM buckets WHERE key IN (SELECT value FROM json_each(?)))",
+            (json.dumps(self._bucket_keys(signature)),)
+        ).fetchall()
+
+        excluded = set(exclude)
+        matches = []
+        for doc_id, position, doc_hash, doc_text in rows:
+            if doc_id in excluded:
+                continue
+            similarity = shingle_jaccard(grams, shingles(doc_text, self.hasher.shingle_size))
+            if similarity >= threshold:
+                matches.append({'doc_id': doc_id, 'position': position, 'similarity': similarity,
+                                'text_hash': doc_hash, 'text': doc_text})
+        matches.sort(key=lambda match: -match['similarity'])
+        return matches[:limit]
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._connect()
+        return {
+            'documents': conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0],
+            'threshold': self.threshold,
+            'num_perm': self.hasher.num_perm,
+            'bands': self.bands,
+            'rows': self.rows,
+        }
@@ -1,57 +1,639 @@
 import os
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Optional
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain.prompts import PromptTemplate
-from sentence_transformers import SentenceTransformer
 import numpy as np
-import google.generativeai as genai
 from config import Config
+from embedding_cache import EmbeddingCache, CachedEmbeddings, LazyEmbeddings
+from analysis_cache import AnalysisCache
+from keyword_index import KeywordIndex
+from match_matrix import MatchMatrix
+from near_duplicates import NearDuplicateIndex, text_diff
+from llm_backends import get_llm_backend
+from vector_index import index_settings_from_env
+from vector_shards import POSITION_FILE, VectorShard, shard_folder_name
+from llm_client import (RateLimiter, IncrementalJSONParser, LatencyHistogram, ResilientLLMClient,
+                        CircuitBreaker, LLMUnavailableError, estimate_tokens)
+
+# Budget for the JSON answer when charging a request against tokens-per-minute.
+ESTIMATED_RESPONSE_TOKENS = 800
+
+# Part of the analysis cache key; bump whenever the prompt changes so cached
+# answers to the old prompt are not reused.
+PROMPT_VERSION = 2
+
+# Roughly the old 4000-character cut-off.
+DEFAULT_RESUME_TOKEN_BUDGET = 1000
+
+JOB_QUERY_FIELDS = ('job_title', 'job_description', 'required_skills', 'experience_required')
+
+REQUIRED_FIELDS = ['overall_score', 'skills_match', 'experience_assessment',
+                   'strengths', 'weaknesses', 'recommendation', 'reasoning']
+
+ANALYSIS_EXAMPLE_JSON = """{
+    "overall_score": 7.2,
+    "skills_match": {
+        "matched_skills": ["Python", "Machine Learning", "Data Analysis"],
+        "missing_skills": ["Docker", "Kubernetes", "MLOps"]
+    },
+    "experience_assessment": "The candidate shows 2+ years of relevant experience in data science with hands-on Python development. While they have solid fundamentals, they would benefit from more exposure to production ML systems and DevOps practices.",
+    "strengths": [
+        "Strong foundation in Python programming and data manipulation",
+        "Demonstrated experience with machine learning algorithms and model development", 
+        "Good analytical thinking evident from project descriptions",
+        "Shows initiative in learning new technologies independently"
+    ],
+    "weaknesses": [
+        "Limited experience with containerization and deployment technologies like Docker",
+        "Could benefit from more exposure to cloud platforms and MLOps workflows",
+        "Resume could better highlight specific business impact of technical projects",
+        "Would benefit from more collaborative team project experience"
+    ],
+    "recommendation": "SELECTED",
+    "reasoning": "This candidate demonstrates strong technical fundamentals and genuine passion for AI/ML. While they may need some mentoring in production systems and DevOps practices, their solid programming skills and eagerness to learn make them a great fit for a growing team. I believe they would thrive in our collaborative environment and contribute meaningfully to our AI initiatives within 3-6 months."
+}"""
 
 class ResumeRAGSystem:
     
-    def __init__(self):
+    def __init__(self, index_folder: Optional[str] = None, embedding_cache_folder: Optional[str] = None,
+                 gemini_model=None, embeddings=None, max_in_flight: Optional[int] = None,
+                 requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None,
+                 analysis_cache: Optional[AnalysisCache] = None, resume_token_budget: Optional[int] = None,
+                 prescreen_floor: Optional[float] = None, pack_size: Optional[int] = None,
+                 pack_max_resume_tokens: Optional[int] = None, stream_responses: Optional[bool] = None,
+                 index_type: Optional[str] = None, mmap_index: Optional[bool] = None, database=None,
+                 keyword_index: Optional[KeywordIndex] = None,
+                 near_duplicate_index: Optional[NearDuplicateIndex] = None):
         self.config = Config()
-
-        genai.configure(api_key=self.config.GEMINI_API_KEY)
         
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name=self.config.EMBEDDING_MODEL
+        # The embedding model and the LLM backend are only imported and built
+        # on first use (or by warmup()); see _create_embeddings/get_llm_backend.
+        embedding_cache_folder = embedding_cache_folder or os.environ.get(
+            'EMBEDDING_CACHE_FOLDER', os.path.join('data', 'embedding_cache')
+        )
+        self.embedding_cache = EmbeddingCache(embedding_cache_folder, self.config.EMBEDDING_MODEL)
+        self.base_embeddings = embeddings or LazyEmbeddings(self._create_embeddings)
+        self.embeddings = CachedEmbeddings(self.base_embeddings, self.embedding_cache)
+        # gemini_model may be any LLMBackend (or object with the same
+        # generate_content); by default LLM_BACKEND picks Gemini or the
+        # offline StubBackend. llm_model_name goes into analysis cache keys,
+        # so stub or fake answers are never served as Gemini ones.
+        backend = gemini_model
+        if isinstance(gemini_model, ResilientLLMClient):
+            backend = gemini_model.model if gemini_model.loaded else None
+        if backend is None:
+            backend_name = (os.environ.get('LLM_BACKEND') or 'gemini').lower()
+            self.llm_model_name = self.config.GEMINI_MODEL if backend_name == 'gemini' else backend_name
+        else:
+            self.llm_model_name = (getattr(backend, 'model_name', None) or getattr(backend, 'name', None)
+                                   or type(backend).__name__)
+        
+        self.max_in_flight = max_in_flight or int(os.environ.get('LLM_MAX_IN_FLIGHT', 1))
+        self.rate_limiter = RateLimiter(
+            requests_per_minute or float(os.environ.get('LLM_REQUESTS_PER_MINUTE', 0)),
+            tokens_per_minute or float(os.environ.get('LLM_TOKENS_PER_MINUTE', 0))
         )
-        self.gemini_model = genai.GenerativeModel(self.config.GEMINI_MODEL)
+        # The client charges the limiter per attempt, so retries stay within
+        # the budget too.
+        if isinstance(gemini_model, ResilientLLMClient):
+            self.gemini_model = gemini_model
+            if gemini_model.rate_limiter is None:
+                gemini_model.rate_limiter = self.rate_limiter
+            else:
+                self.rate_limiter = gemini_model.rate_limiter
+        else:
+            self.gemini_model = ResilientLLMClient(
+                gemini_model,
+                model_factory=get_llm_backend,
+                deadline=float(os.environ.get('LLM_DEADLINE_SECONDS', 120)),
+                attempt_timeout=float(os.environ.get('LLM_ATTEMPT_TIMEOUT_SECONDS', 45)),
+                max_attempts=int(os.environ.get('LLM_MAX_ATTEMPTS', 4)),
+                backoff_base=float(os.environ.get('LLM_BACKOFF_BASE_SECONDS', 1.0)),
+                backoff_max=float(os.environ.get('LLM_BACKOFF_MAX_SECONDS', 30.0)),
+                breaker=CircuitBreaker(
+                    failure_threshold=int(os.environ.get('LLM_BREAKER_THRESHOLD', 5)),
+                    reset_timeout=float(os.environ.get('LLM_BREAKER_RESET_SECONDS', 60))
+                ),
+                rate_limiter=self.rate_limiter
+            )
+        
+        if analysis_cache is None and os.environ.get('ANALYSIS_CACHE', 'on').lower() not in ('0', 'off', 'false'):
+            analysis_cache = AnalysisCache(
+                os.environ.get('ANALYSIS_CACHE_PATH', os.path.join('data', 'analysis_cache.db')),
+                ttl_seconds=float(os.environ.get('ANALYSIS_CACHE_TTL_DAYS', 30)) * 24 * 3600,
+                max_entries=int(os.environ.get('ANALYSIS_CACHE_MAX_ENTRIES', 5000))
+            )
+        self.analysis_cache = analysis_cache
+        
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=1000,
             chunk_overlap=200
         )
-        self.vector_store = None
+        self.resume_token_budget = resume_token_budget or int(
+            os.environ.get('RESUME_TOKEN_BUDGET', DEFAULT_RESUME_TOKEN_BUDGET)
+        )
+        # Cosine similarity below which a resume is rejected without an LLM
+        # call; 0 turns the pre-screen off.
+        self.prescreen_floor = prescreen_floor if prescreen_floor is not None else float(
+            os.environ.get('PRESCREEN_SIMILARITY_FLOOR', 0)
+        )
+        # Resumes up to pack_max_resume_tokens long are scored pack_size at a
+        # time in a single request; 1 sends every resume on its own.
+        self.pack_size = pack_size or int(os.environ.get('LLM_PACK_SIZE', 1))
+        self.pack_max_resume_tokens = pack_max_resume_tokens or int(os.environ.get('PACK_MAX_RESUME_TOKENS', 600))
+        self.stream_responses = stream_responses if stream_responses is not None else (
+            os.environ.get('LLM_STREAM', 'off').lower() in ('1', 'on', 'true')
+        )
+        self.llm_latency = {
+            'time_to_first_decision': LatencyHistogram(),
+            'total': LatencyHistogram(),
+        }
         
-    def create_resume_embeddings(self, resume_texts: List[str], applicant_ids: List[str]) -> None:
-
-        all_chunks = []
+        self.index_folder = index_folder or os.environ.get('VECTOR_INDEX_FOLDER', os.path.join('data', 'vector_index'))
+        # flat (exact), ivf_flat, ivf_pq or hnsw; see vector_index.py.
+        self.index_settings = index_settings_from_env()
+        if index_type:
+            self.index_settings['index_type'] = index_type
+        # With mmap_index on, the published index is memory-mapped read-only,
+        # so every worker process shares one page-cache copy of the vectors.
+        # Either way, new versions published by other processes are picked up
+        # within index_refresh_seconds.
+        self.mmap_index = mmap_index if mmap_index is not None else (
+            os.environ.get('VECTOR_INDEX_MMAP', 'off').lower() in ('1', 'on', 'true')
+        )
+        self.index_refresh_seconds = float(os.environ.get('VECTOR_INDEX_REFRESH_SECONDS', 2))
+        self.index_keep_versions = int(os.environ.get('VECTOR_INDEX_KEEP_VERSIONS', 3))
+        # Each write appends a delta to the published version; a full new
+        # version is written every publish_every writes or publish_seconds,
+        # which bounds how long searches can miss a new resume.
+        self.index_publish_every = int(os.environ.get('VECTOR_INDEX_PUBLISH_EVERY', 32))
+        self.index_publish_seconds = float(os.environ.get('VECTOR_INDEX_PUBLISH_SECONDS', 2))
+        self._shards = {}
+        self._shards_lock = threading.RLock()
+        # Resolves the status/since filters of search_candidates.
+        self.database = database
+        
+        # BM25 over the same chunks, fused with vector ranks in
+        # search_candidates; catches exact tool names embeddings blur.
+        if keyword_index is None and os.environ.get('KEYWORD_INDEX', 'on').lower() not in ('0', 'off', 'false'):
+            keyword_index = KeywordIndex(os.path.join(self.index_folder, 'keywords.sqlite'))
+        self.keyword_index = keyword_index
+        self._keyword_index_checked = False
+        self.search_mode = os.environ.get('CANDIDATE_SEARCH_MODE', 'hybrid').lower()
+        self.rrf_k = int(os.environ.get('RRF_K', 60))
+        
+        # Built by match_matrix() on first use, then kept up to date here.
+        self._match_matrix = None
+        self._match_lock = threading.RLock()
+        
+        # MinHash/LSH over the indexed resume texts. On an analysis cache miss,
+        # a cached analysis of a resume at least NEAR_DUPLICATE_THRESHOLD
+        # Jaccard-similar, for the same job, is reused instead of a new LLM
+        # call (NEAR_DUPLICATE_REUSE=off only records the matches).
+        if near_duplicate_index is None and os.environ.get('NEAR_DUPLICATE_INDEX', 'on').lower() not in ('0', 'off', 'false'):
+            near_duplicate_index = NearDuplicateIndex(
+                os.path.join(self.index_folder, 'near_duplicates.sqlite'),
+                threshold=float(os.environ.get('NEAR_DUPLICATE_THRESHOLD', 0.9)),
+                num_perm=int(os.environ.get('MINHASH_PERMUTATIONS', 128))
+            )
+        self.near_duplicate_index = near_duplicate_index
+        self.reuse_near_duplicates = os.environ.get('NEAR_DUPLICATE_REUSE', 'on').lower() in ('1', 'on', 'true')
+    
+    def embedding_cache_stats(self) -> Dict[str, float]:
+        return self.embedding_cache.stats()
+    
+    def _create_embeddings(self):
+        from langchain_huggingface import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(model_name=self.config.EMBEDDING_MODEL)
+    
+    def warmup(self) -> Dict[str, float]:
+        # Builds everything that is otherwise created lazily, so the first
+        # request does not pay for it. Returns seconds spent per component.
+        timings = {}
+        
+        start = time.perf_counter()
+        if isinstance(self.base_embeddings, LazyEmbeddings):
+            self.base_embeddings.load()
+        timings['embeddings'] = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        self.gemini_model.model
+        timings['llm'] = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        for shard in self._all_shards():
+            shard.load()
+        timings['vector_index'] = time.perf_counter() - start
+        
+        return timings
+    
+    def llm_latency_stats(self) -> Dict[str, Dict[str, float]]:
+        stats = {name: histogram.summary() for name, histogram in self.llm_latency.items()}
+        stats['attempt'] = self.gemini_model.latency.summary()
+        return stats
+    
+    def llm_client_stats(self) -> Dict[str, Any]:
+        return self.gemini_model.stats()
+    
+    def analysis_cache_stats(self) -> Dict[str, float]:
+        if self.analysis_cache is None:
+            return {}
+        return self.analysis_cache.stats()
+    
+    def _shard(self, position: Optional[str] = None) -> VectorShard:
+        # Resumes indexed with a position go to that position's shard under
+        # positions/; the rest (and indexes built before sharding) live in the
+        # index folder itself.
+        with self._shards_lock:
+            shard = self._shards.get(position)
+            if shard is None:
+                folder = self.index_folder if position is None else os.path.join(
+                    self.index_folder, 'positions', shard_folder_name(position))
+                shard = VectorShard(folder, self.embeddings, self.index_settings, mmap=self.mmap_index,
+                                    refresh_seconds=self.index_refresh_seconds,
+                                    keep_versions=self.index_keep_versions, position=position,
+                                    publish_every=self.index_publish_every,
+                                    publish_seconds=self.index_publish_seconds)
+                self._shards[position] = shard
+            return shard
+    
+    def _all_shards(self) -> List[VectorShard]:
+        # Includes shards that other worker processes have created.
+        positions_folder = os.path.join(self.index_folder, 'positions')
+        if os.path.isdir(positions_folder):
+            for name in os.listdir(positions_folder):
+                try:
+                    with open(os.path.join(positions_folder, name, POSITION_FILE)) as f:
+                        self._shard(f.read())
+                except FileNotFoundError:
+                    continue
+        with self._shards_lock:
+            return [self._shards.get(None) or self._shard()] + [
+                shard for position, shard in self._shards.items() if position is not None
+            ]
+    
+    @property
+    def vector_store(self):
+        # The unsharded store; see _shard.
+        return self._shard().store
+    
+    def _chunk_resume(self, resume_text: str, applicant_id: str, position: Optional[str] = None):
+        chunks = self.text_splitter.split_text(resume_text)
         metadatas = []
+        chunk_ids = []
+        for chunk_idx, chunk in enumerate(chunks):
+            metadata = {
+                'applicant_id': applicant_id,
+                'chunk_index': chunk_idx,
+                'source': f'resume_{applicant_id}'
+            }
+            if position is not None:
+                metadata['position_applied'] = position
+            metadatas.append(metadata)
+            chunk_ids.append(f'{applicant_id}:{chunk_idx}')
+        return chunks, metadatas, chunk_ids
+    
+    def create_resume_embeddings(self, resume_texts: List[str], applicant_ids: List[str],
+                                 positions: Optional[List[Optional[str]]] = None) -> None:
+        for shard in self._all_shards():
+            shard.clear()
+        if self.keyword_index is not None:
+            self.keyword_index.clear()
+            self._keyword_index_checked = True
+        with self._match_lock:
+            self._match_matrix = None
+        if self.near_duplicate_index is not None:
+            self.near_duplicate_index.clear()
+        self.add_resumes(resume_texts, applicant_ids, positions)
+    
+    def add_resumes(self, resume_texts: List[str], applicant_ids: List[str],
+                    positions: Optional[List[Optional[str]]] = None) -> int:
+        positions = positions or [None] * len(applicant_ids)
+        if self.near_duplicate_index is not None:
+            self.near_duplicate_index.add_many(zip(applicant_ids, resume_texts, positions))
+        by_position = {}
+        for resume_text, applicant_id, position in zip(resume_texts, applicant_ids, positions):
+            by_position.setdefault(position, []).append((resume_text, applicant_id))
         
-        for idx, (resume_text, applicant_id) in enumerate(zip(resume_texts, applicant_ids)):
-            chunks = self.text_splitter.split_text(resume_text)
-            all_chunks.extend(chunks)
+        added = 0
+        matrix_updates = []
+        for position, resumes in by_position.items():
+            shard = self._shard(position)
+            with shard.write_lock():
+                all_chunks = []
+                metadatas = []
+                ids = []
+                stale_ids = []
+                
+                for resume_text, applicant_id in resumes:
+                    chunks, chunk_metadatas, chunk_ids = self._chunk_resume(resume_text, applicant_id, position)
+                    if shard.is_indexed(applicant_id, chunks, chunk_ids):
+                        continue
+                    stale_ids.extend(shard.pop_chunk_ids(applicant_id))
+                    all_chunks.extend(chunks)
+                    metadatas.extend(chunk_metadatas)
+                    ids.extend(chunk_ids)
+                
+                if not all_chunks:
+                    continue
+                
+                added += shard.add(all_chunks, metadatas, ids, stale_ids)
+                shard.commit()
+                
+                keywords = self._keywords()
+                if keywords is not None:
+                    keywords.replace_applicants(
+                        dict.fromkeys(metadata['applicant_id'] for metadata in metadatas),
+                        [{'chunk_id': chunk_id, 'applicant_id': metadata['applicant_id'], 'position': position,
+                          'content': chunk} for chunk, metadata, chunk_id in zip(all_chunks, metadatas, ids)]
+                    )
+                matrix_updates.append((all_chunks, metadatas, position))
             
-            for chunk_idx, chunk in enumerate(chunks):
-                metadatas.append({
-                    'applicant_id': applicant_id,
-                    'chunk_index': chunk_idx,
-                    'source': f'resume_{applicant_id}'
-                })
+            if position is not None:
+                # Applicants indexed before sharding move out of the unsharded store.
+                self._remove_from_shard(self._shard(), [applicant_id for _, applicant_id in resumes])
         
-        if all_chunks:
-            self.vector_store = FAISS.from_texts(
-                texts=all_chunks,
-                embedding=self.embeddings,
-                metadatas=metadatas
-            )
+        # match_matrix() reads the shards while holding _match_lock, so the
+        # matrix is only touched once no shard lock is held.
+        for chunks, metadatas, position in matrix_updates:
+            self._update_match_matrix(chunks, metadatas, position)
+        return added
+    
+    def _remove_from_shard(self, shard: VectorShard, applicant_ids: List[str]) -> bool:
+        if not shard.contains_any(applicant_ids):
+            return False
+        with shard.write_lock():
+            removed = [shard.remove_applicant(applicant_id) for applicant_id in applicant_ids]
+            if any(removed):
+                shard.commit()
+            return any(removed)
+    
+    def remove_applicant(self, applicant_id: str, position: Optional[str] = None) -> bool:
+        shards = [self._shard(position), self._shard()] if position is not None else self._all_shards()
+        removed = [self._remove_from_shard(shard, [applicant_id]) for shard in shards]
+        keywords = self._keywords()
+        if keywords is not None:
+            removed.append(keywords.remove_applicant(applicant_id))
+        with self._match_lock:
+            if self._match_matrix is not None:
+                removed.append(self._match_matrix.remove_candidate(applicant_id))
+        if self.near_duplicate_index is not None:
+            removed.append(self.near_duplicate_index.remove(applicant_id))
+        return any(removed)
+    
+    def rebuild_index(self, index_type: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        # Retrains and rebuilds every shard, e.g. after switching
+        # VECTOR_INDEX_TYPE or once IVF clusters have drifted with growth.
+        if index_type:
+            self.index_settings['index_type'] = index_type
+        return {shard.position: shard.rebuild(self.index_settings['index_type']) for shard in self._all_shards()}
+    
+    def index_stats(self, position: Optional[str] = None) -> Dict[str, Any]:
+        return self._shard(position).stats()
+    
+    def shard_stats(self) -> Dict[Optional[str], Dict[str, Any]]:
+        return {shard.position: shard.stats() for shard in self._all_shards()}
+    
+    def _update_match_matrix(self, chunks: List[str], metadatas: List[Dict[str, Any]], position: Optional[str]):
+        with self._match_lock:
+            if self._match_matrix is None:
+                return
+            # The chunks were just embedded, so these are embedding cache hits.
+            vectors = np.asarray(self.embeddings.embed_documents(chunks), dtype=np.float32)
+            by_applicant = {}
+            for vector, metadata in zip(vectors, metadatas):
+                by_applicant.setdefault(metadata['applicant_id'], []).append(vector)
+            self._match_matrix.set_candidates({
+                applicant_id: (applicant_vectors, position) for applicant_id, applicant_vectors in by_applicant.items()
+            })
+    
+    def match_matrix(self, jobs: Optional[List[Dict[str, Any]]] = None, refresh: bool = False) -> MatchMatrix:
+        # Every indexed candidate against every open job (the active job
+        # descriptions, or `jobs`). Candidates are loaded from the index once
+        # and then follow add_resumes/remove_applicant in this process;
+        # refresh=True reloads them, e.g. to pick up other workers' writes.
+        # Jobs are re-synced on every call and only new or edited ones are
+        # embedded and scored.
+        if jobs is None:
+            if self.database is None:
+                raise ValueError("match_matrix needs ResumeRAGSystem(database=...) or an explicit jobs list")
+            jobs = [job for job in self.database.get_all_job_descriptions() if job.get('is_active', False)]
+        
+        with self._match_lock:
+            matrix = self._match_matrix
+            if matrix is None or refresh:
+                matrix = self._build_match_matrix()
+            
+            job_texts = {job['id']: ' '.join(str(job.get(field, '')) for field in JOB_QUERY_FIELDS) for job in jobs}
+            for job_id in [job_id for job_id in matrix.job_ids if job_id not in job_texts]:
+                matrix.remove_job(job_id)
+            for job in jobs:
+                signature = hash(job_texts[job['id']])
+                if matrix.job_signature(job['id']) != signature:
+                    matrix.set_job(job['id'], self.embeddings.embed_query(job_texts[job['id']]),
+                                   job.get('job_title', ''), signature)
+            
+            self._match_matrix = matrix
+            return matrix
+    
+    def _build_match_matrix(self) -> MatchMatrix:
+        # Called with _match_lock held. Until the matrix exists add_resumes
+        # does not update it, so the build has to see every committed write,
+        # not just the last published version.
+        for shard in self._all_shards():
+            shard.publish_deltas()
+        
+        chunks = []
+        applicants = []
+        positions = {}
+        for chunk in self._indexed_chunks():
+            chunks.append(chunk['content'])
+            applicants.append(chunk['applicant_id'])
+            positions[chunk['applicant_id']] = chunk['position']
+        
+        if chunks:
+            vectors = np.asarray(self.embeddings.embed_documents(chunks), dtype=np.float32)
+        else:
+            vectors = np.zeros((0, len(self.embeddings.embed_query(''))), dtype=np.float32)
+        by_applicant = {}
+        for vector, applicant_id in zip(vectors, applicants):
+            by_applicant.setdefault(applicant_id, []).append(vector)
+        
+        matrix = MatchMatrix(vectors.shape[1])
+        matrix.set_candidates({
+            applicant_id: (applicant_vectors, positions[applicant_id])
+            for applicant_id, applicant_vectors in by_applicant.items()
+        })
+        return matrix
+    
+    def _keywords(self) -> Optional[KeywordIndex]:
+        # Indexes built before the keyword index existed are backfilled from
+        # the vector shards' documents the first time it is needed.
+        if self.keyword_index is not None and not self._keyword_index_checked:
+            if self.keyword_index.is_empty():
+                self.keyword_index.backfill(self._indexed_chunks())
+            self._keyword_index_checked = True
+        return self.keyword_index
+    
+    def _indexed_chunks(self):
+        for shard in self._all_shards():
+            store = shard.store
+            if store is None:
+                continue
+            for faiss_id in range(store.index.ntotal):
+                doc = store.docstore.search(store.index_to_docstore_id[faiss_id])
+                yield {
+                    'chunk_id': f"{doc.metadata.get('applicant_id')}:{doc.metadata.get('chunk_index')}",
+                    'applicant_id': doc.metadata.get('applicant_id'),
+                    'position': shard.position or doc.metadata.get('position_applied'),
+                    'content': doc.page_content,
+                }
+    
+    def condense_resume(self, resume_text: str, job_description: Dict[str, Any],
+                        token_budget: Optional[int] = None) -> str:
+        token_budget = token_budget or self.resume_token_budget
+        if estimate_tokens(resume_text) <= token_budget:
+            return resume_text
+        
+        chunks = self.text_splitter.split_text(resume_text)
+        query = ' '.join(str(job_description.get(field, '')) for field in JOB_QUERY_FIELDS)
+        try:
+            # Same splitter as the index, so chunk vectors are usually already
+            # in the embedding cache.
+            chunk_vectors = np.asarray(self.embeddings.embed_documents(chunks), dtype=np.float32)
+            query_vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        except Exception as e:
+            print(f"Error ranking resume chunks, truncating instead: {str(e)}")
+            return resume_text[:token_budget * 4]
+        
+        norms = np.linalg.norm(chunk_vectors, axis=1) * np.linalg.norm(query_vector)
+        similarities = chunk_vectors @ query_vector / np.where(norms == 0, 1, norms)
+        
+        selected = []
+        used = 0
+        for idx in np.argsort(-similarities):
+            tokens = estimate_tokens(chunks[idx])
+            if used + tokens > token_budget:
+                continue
+            selected.append(int(idx))
+            used += tokens
+        
+        if not selected:
+            return chunks[int(np.argmax(similarities))][:token_budget * 4]
+        
+        # Keep the picked chunks in resume order so sections still read naturally.
+        return '\n...\n'.join(chunks[idx] for idx in sorted(selected))
+    
+    def _cache_key(self, resume_text: str, job_description: Dict[str, Any]) -> str:
+        # Which chunks make it into the prompt depends on the budget and the
+        # embedding model, so both are part of the key. Packed and single
+        # requests ask for the same analysis and share entries.
+        prompt_version = f"{PROMPT_VERSION}/{self.resume_token_budget}/{self.config.EMBEDDING_MODEL}"
+        return AnalysisCache.make_key(resume_text, job_description, self.llm_model_name, prompt_version)
+    
+    def find_near_duplicates(self, resume_text: str, exclude: Optional[List[str]] = None,
+                             threshold: Optional[float] = None) -> List[Dict[str, Any]]:
+        # Earlier resumes with nearly the same text, most similar first.
+        if self.near_duplicate_index is None:
+            return []
+        return [
+            {'applicant_id': match['doc_id'], 'position_applied': match['position'],
+             'similarity': match['similarity'], 'resume_text': match['text']}
+            for match in self.near_duplicate_index.query(resume_text, threshold=threshold, exclude=exclude or ())
+        ]
+    
+    def _near_duplicate_analysis(self, resume_text: str, job_description: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        # Called on an analysis cache miss: the cached analysis, for this job,
+        # of the most similar near-duplicate resume that has one. The changed
+        # lines go along with it so a reviewer can see what was not assessed.
+        if not self.reuse_near_duplicates or self.near_duplicate_index is None or self.analysis_cache is None:
+            return None
+        try:
+            # Copies whose cache key equals this resume's have just missed;
+            # variants differing only in case or punctuation have their own.
+            tried = {self._cache_key(resume_text, job_description)}
+            for match in self.near_duplicate_index.query(resume_text):
+                cache_key = self._cache_key(match['text'], job_description)
+                if cache_key in tried:
+                    continue
+                tried.add(cache_key)
+                cached = self.analysis_cache.get(cache_key)
+                if cached is not None:
+                    cached['near_duplicate_of'] = {
+                        'applicant_id': match['doc_id'],
+                        'similarity': match['similarity'],
+                        'changes': text_diff(match['text'], resume_text),
+                    }
+                    return cached
+        except Exception as e:
+            print(f"Error looking up near-duplicate resumes: {str(e)}")
+        return None
+    
+    @staticmethod
+    def _extract_json(result: str, opener: str, closer: str):
+        result_text = result.strip()
+        
+        if '```json' in result_text:
+            start = result_text.find('```json') + 7
+            end = result_text.find('```', start)
+            result_text = result_text[start:end].strip()
+        elif '```' in result_text:
+            start = result_text.find('```') + 3
+            end = result_text.find('```', start)
+            result_text = result_text[start:end].strip()
+        
+        if result_text.startswith(opener) and result_text.endswith(closer):
+            return json.loads(result_text)
+        
+        start_idx = result_text.find(opener)
+        end_idx = result_text.rfind(closer) + 1
+        if start_idx != -1 and end_idx > start_idx:
+            return json.loads(result_text[start_idx:end_idx])
+        raise ValueError("No valid JSON found in response")
+    
+    def _generate_streaming(self, prompt_text: str, tokens: float, on_decision=None) -> str:
+        # Reads the answer chunk by chunk; as soon as both overall_score and
+        # recommendation have arrived they are passed to on_decision, while
+        # the long free-text fields are still streaming.
+        start = time.perf_counter()
+        parser = IncrementalJSONParser()
+        parts = []
+        decided = False
+        
+        for chunk in self.gemini_model.generate_content(prompt_text, stream=True, tokens=tokens):
+            parts.append(chunk.text)
+            parser.feed(chunk.text)
+            if not decided and 'overall_score' in parser.fields and 'recommendation' in parser.fields:
+                decided = True
+                self.llm_latency['time_to_first_decision'].observe(time.perf_counter() - start)
+                if on_decision is not None:
+                    try:
+                        on_decision({
+                            'overall_score': parser.fields['overall_score'],
+                            'recommendation': parser.fields['recommendation']
+                        })
+                    except Exception as e:
+                        print(f"Error in early decision callback: {str(e)}")
+        
+        return ''.join(parts)
     
-    def analyze_resume_against_job(self, resume_text: str, job_description: Dict[str, Any]) -> Dict[str, Any]:
+    def analyze_resume_against_job(self, resume_text: str, job_description: Dict[str, Any],
+                                   use_cache: bool = True, refresh_cache: bool = False,
+                                   on_decision=None) -> Dict[str, Any]:
+        # use_cache=False bypasses the cache entirely; refresh_cache=True skips
+        # the lookup but stores the fresh answer over the cached one.
+        cache_key = None
+        if use_cache and self.analysis_cache is not None:
+            cache_key = self._cache_key(resume_text, job_description)
+            if not refresh_cache:
+                cached = self.analysis_cache.get(cache_key) or self._near_duplicate_analysis(resume_text, job_description)
+                if cached is not None:
+                    return cached
 
+        resume_excerpt = self.condense_resume(resume_text, job_description)
         prompt_text = f"""You are an experienced HR manager conducting a thorough resume review. Analyze this candidate's application with empathy and provide constructive, human-like feedback.
 
 POSITION DETAILS:
@@ -60,71 +642,42 @@ Job Description: {job_description.get('job_description', '')}
 Required Skills: {job_description.get('required_skills', '')}
 Experience Level: {job_description.get('experience_required', '')}
 
-CANDIDATE'S RESUME:
-{resume_text[:4000]}
+CANDIDATE'S RESUME (sections most relevant to this position):
+{resume_excerpt}
 
 Please provide a comprehensive evaluation as if you were personally reviewing this candidate. Be encouraging yet honest, specific yet constructive.
 
 IMPORTANT: Respond with ONLY valid JSON in this exact format:
 
-{{
-    "overall_score": 7.2,
-    "skills_match": {{
-        "matched_skills": ["Python", "Machine Learning", "Data Analysis"],
-        "missing_skills": ["Docker", "Kubernetes", "MLOps"]
-    }},
-    "experience_assessment": "The candidate shows 2+ years of relevant experience in data science with hands-on Python development. While they have solid fundamentals, they would benefit from more exposure to production ML systems and DevOps practices.",
-    "strengths": [
-        "Strong foundation in Python programming and data manipulation",
-        "Demonstrated experience with machine learning algorithms and model development", 
-        "Good analytical thinking evident from project descriptions",
-        "Shows initiative in learning new technologies independently"
-    ],
-    "weaknesses": [
-        "Limited experience with containerization and deployment technologies like Docker",
-        "Could benefit from more exposure to cloud platforms and MLOps workflows",
-        "Resume could better highlight specific business impact of technical projects",
-        "Would benefit from more collaborative team project experience"
-    ],
-    "recommendation": "SELECTED",
-    "reasoning": "This candidate demonstrates strong technical fundamentals and genuine passion for AI/ML. While they may need some mentoring in production systems and DevOps practices, their solid programming skills and eagerness to learn make them a great fit for a growing team. I believe they would thrive in our collaborative environment and contribute meaningfully to our AI initiatives within 3-6 months."
-}}"""
+{ANALYSIS_EXAMPLE_JSON}"""
         
         try:
-            response = self.gemini_model.generate_content(prompt_text)
-            result = response.text
-            
-            result_text = result.strip()
-            
-            if '```json' in result_text:
-                start = result_text.find('```json') + 7
-                end = result_text.find('```', start)
-                result_text = result_text[start:end].strip()
-            elif '```' in result_text:
-                start = result_text.find('```') + 3
-                end = result_text.find('```', start)
-                result_text = result_text[start:end].strip()
-            
-            if result_text.startswith('{') and result_text.endswith('}'):
-                analysis_result = json.loads(result_text)
+            tokens = estimate_tokens(prompt_text) + ESTIMATED_RESPONSE_TOKENS
+            start = time.perf_counter()
+            if self.stream_responses:
+                result = self._generate_streaming(prompt_text, tokens, on_decision)
             else:
-                start_idx = result_text.find('{')
-                end_idx = result_text.rfind('}') + 1
-                if start_idx != -1 and end_idx > start_idx:
-                    json_text = result_text[start_idx:end_idx]
-                    analysis_result = json.loads(json_text)
-                else:
-                    raise ValueError("No valid JSON found in response")
+                response = self.gemini_model.generate_content(prompt_text, tokens=tokens)
+                result = response.text
+            self.llm_latency['total'].observe(time.perf_counter() - start)
             
-            required_fields = ['overall_score', 'skills_match', 'experience_assessment', 
-                             'strengths', 'weaknesses', 'recommendation', 'reasoning']
+            analysis_result = self._extract_json(result, '{', '}')
             
-            for field in required_fields:
+            for field in REQUIRED_FIELDS:
                 if field not in analysis_result:
                     analysis_result[field] = "Not provided"
             
-            return analysis_result
+            # Only real answers are cached; the fallback below would otherwise
+            # pin a transient API error to this resume until the TTL expires.
+            if cache_key is not None:
+                self.analysis_cache.put(cache_key, analysis_result)
             
+            return analysis_result
+        
+        except LLMUnavailableError:
+            # An outage is not a verdict on the candidate; let the caller
+            # requeue the application instead of rejecting it.
+            raise
         except Exception as e:
             print(f"Error in resume analysis: {str(e)}")
             return {
@@ -140,50 +693,311 @@ IMPORTANT: Respond with ONLY valid JSON in this exact format:
                 "reasoning": f"Analysis failed due to error: {str(e)}"
             }
     
-    def batch_analyze_resumes(self, resumes_data: List[Dict[str, Any]], job_description: Dict[str, Any]) -> List[Dict[str, Any]]:
-
-        results = []
+    def analyze_resumes_packed(self, resumes_data: List[Dict[str, Any]], job_description: Dict[str, Any],
+                               use_cache: bool = True, refresh_cache: bool = False) -> List[Dict[str, Any]]:
+        # Scores several resumes with one request. Any candidate missing from,
+        # or malformed in, the returned array is re-analysed on its own.
+        results = [None] * len(resumes_data)
+        cache_keys = {}
+        pending = []
+        for i, resume_data in enumerate(resumes_data):
+            if use_cache and self.analysis_cache is not None:
+                cache_keys[i] = self._cache_key(resume_data['resume_text'], job_description)
+                cached = None if refresh_cache else (
+                    self.analysis_cache.get(cache_keys[i])
+                    or self._near_duplicate_analysis(resume_data['resume_text'], job_description)
+                )
+                if cached is not None:
+                    results[i] = self._with_applicant(cached, resume_data)
+                    continue
+            pending.append(i)
+        
+        if len(pending) == 1:
+            results[pending[0]] = self._analyze_resume_data(resumes_data[pending[0]], job_description,
+                                                            use_cache, refresh_cache)
+            return results
         
-        for resume_data in resumes_data:
+        if pending:
+            candidates = '\n\n'.join(
+                f"CANDIDATE applicant_id={resumes_data[i]['applicant_id']}:\n{resumes_data[i]['resume_text']}"
+                for i in pending
+            )
+            prompt_text = f"""You are an experienced HR manager conducting a thorough resume review. Analyze each of the {len(pending)} candidates below independently, with empathy, and provide constructive, human-like feedback.
+
+POSITION DETAILS:
+Job Title: {job_description.get('job_title', '')}
+Job Description: {job_description.get('job_description', '')}
+Required Skills: {job_description.get('required_skills', '')}
+Experience Level: {job_description.get('experience_required', '')}
+
+{candidates}
+
+IMPORTANT: Respond with ONLY a valid JSON array containing one object per candidate, in the order given. Each object must include the candidate's "applicant_id" exactly as written above, plus every field of this format:
+
+{ANALYSIS_EXAMPLE_JSON}"""
+            
+            answers = {}
             try:
-                analysis = self.analyze_resume_against_job(
-                    resume_data['resume_text'], 
-                    job_description
+                start = time.perf_counter()
+                response = self.gemini_model.generate_content(
+                    prompt_text, tokens=estimate_tokens(prompt_text) + ESTIMATED_RESPONSE_TOKENS * len(pending)
                 )
-
-                analysis.update({
-                    'applicant_id': resume_data['applicant_id'],
-                    'full_name': resume_data['full_name'],
-                    'email': resume_data['email'],
-                    'position_applied': resume_data['position_applied']
-                })
-                
-                results.append(analysis)
+                self.llm_latency['total'].observe(time.perf_counter() - start)
+                for element in self._extract_json(response.text, '[', ']'):
+                    if isinstance(element, dict) and 'applicant_id' in element:
+                        answers[str(element['applicant_id'])] = element
+            except LLMUnavailableError:
+                raise
+            except Exception as e:
+                print(f"Error in packed resume analysis, falling back to single requests: {str(e)}")
+            
+            for i in pending:
+                resume_data = resumes_data[i]
+                analysis = answers.get(str(resume_data['applicant_id']))
+                if not self._is_valid_analysis(analysis):
+                    results[i] = self._analyze_resume_data(resume_data, job_description, use_cache, refresh_cache)
+                    continue
                 
+                analysis.pop('applicant_id')
+                for field in REQUIRED_FIELDS:
+                    if field not in analysis:
+                        analysis[field] = "Not provided"
+                if i in cache_keys:
+                    self.analysis_cache.put(cache_keys[i], analysis)
+                results[i] = self._with_applicant(analysis, resume_data)
+        
+        return results
+    
+    @staticmethod
+    def _is_valid_analysis(analysis) -> bool:
+        if not isinstance(analysis, dict):
+            return False
+        if str(analysis.get('recommendation', '')).upper() not in ('SELECTED', 'REJECTED'):
+            return False
+        try:
+            float(analysis.get('overall_score'))
+        except (TypeError, ValueError):
+            return False
+        return True
+    
+    @staticmethod
+    def _with_applicant(analysis: Dict[str, Any], resume_data: Dict[str, Any]) -> Dict[str, Any]:
+        analysis = dict(analysis)
+        analysis.update({
+            'applicant_id': resume_data['applicant_id'],
+            'full_name': resume_data['full_name'],
+            'email': resume_data['email'],
+            'position_applied': resume_data['position_applied']
+        })
+        return analysis
+    
+    def prescreen_scores(self, resume_texts: List[str], job_description: Dict[str, Any]) -> np.ndarray:
+        # Best chunk-to-job cosine similarity per resume. All chunks are
+        # scored with a single matrix-vector product against the job vector.
+        if not resume_texts:
+            return np.zeros(0, dtype=np.float32)
+        
+        chunks = []
+        offsets = []
+        for resume_text in resume_texts:
+            offsets.append(len(chunks))
+            chunks.extend(self.text_splitter.split_text(resume_text) or [''])
+        
+        query = ' '.join(str(job_description.get(field, '')) for field in JOB_QUERY_FIELDS)
+        chunk_vectors = np.asarray(self.embeddings.embed_documents(chunks), dtype=np.float32)
+        query_vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        
+        chunk_norms = np.linalg.norm(chunk_vectors, axis=1)
+        chunk_vectors /= np.where(chunk_norms == 0, 1, chunk_norms)[:, None]
+        query_vector /= np.linalg.norm(query_vector) or 1
+        
+        similarities = chunk_vectors @ query_vector
+        return np.maximum.reduceat(similarities, offsets)
+    
+    def prescreen_resumes(self, resumes_data: List[Dict[str, Any]], job_description: Dict[str, Any],
+                          similarity_floor: Optional[float] = None):
+        # Returns (similarities, passed) where passed[i] says whether resume i
+        # should go on to full analysis.
+        similarity_floor = self.prescreen_floor if similarity_floor is None else similarity_floor
+        similarities = self.prescreen_scores([r['resume_text'] for r in resumes_data], job_description)
+        return similarities, similarities >= similarity_floor
+    
+    def _prescreen_rejection(self, resume_data: Dict[str, Any], similarity: float, similarity_floor: float) -> Dict[str, Any]:
+        return {
+            'applicant_id': resume_data['applicant_id'],
+            'full_name': resume_data['full_name'],
+            'email': resume_data['email'],
+            'position_applied': resume_data['position_applied'],
+            'overall_score': round(max(similarity, 0.0) * 10, 1),
+            'skills_match': {
+                'matched_skills': [],
+                'missing_skills': []
+            },
+            'experience_assessment': "Not assessed: the resume did not pass the relevance pre-screen",
+            'strengths': [],
+            'weaknesses': ["Resume content has little overlap with the position requirements"],
+            'recommendation': 'REJECTED',
+            'reasoning': f"Pre-screen similarity {similarity:.3f} is below the floor of {similarity_floor:.3f}",
+            'prescreened': True,
+            'prescreen_similarity': float(similarity)
+        }
+    
+    def batch_analyze_resumes(self, resumes_data: List[Dict[str, Any]], job_description: Dict[str, Any],
+                              max_in_flight: Optional[int] = None, use_cache: bool = True,
+                              refresh_cache: bool = False, prescreen_floor: Optional[float] = None,
+                              pack_size: Optional[int] = None) -> List[Dict[str, Any]]:
+
+        prescreen_floor = self.prescreen_floor if prescreen_floor is None else prescreen_floor
+        results = [None] * len(resumes_data)
+        pending = list(range(len(resumes_data)))
+        similarities = None
+        
+        if prescreen_floor > 0 and resumes_data:
+            try:
+                similarities, passed = self.prescreen_resumes(resumes_data, job_description, prescreen_floor)
             except Exception as e:
-                print(f"Error analyzing resume for {resume_data.get('full_name', 'Unknown')}: {str(e)}")
-                results.append({
-                    'applicant_id': resume_data['applicant_id'],
-                    'full_name': resume_data['full_name'],
-                    'email': resume_data['email'],
-                    'position_applied': resume_data['position_applied'],
-                    'overall_score': 0.0,
-                    'recommendation': 'REJECTED',
-                    'reasoning': f'Analysis failed: {str(e)}'
-                })
+                print(f"Error in pre-screen, sending all resumes to full analysis: {str(e)}")
+            else:
+                pending = [i for i in pending if passed[i]]
+                for i in range(len(resumes_data)):
+                    if not passed[i]:
+                        results[i] = self._prescreen_rejection(resumes_data[i], float(similarities[i]), prescreen_floor)
         
+        # Each task is a list of resume indexes: short resumes are grouped
+        # pack_size at a time, everything else goes alone.
+        pack_size = pack_size or self.pack_size
+        if pack_size > 1:
+            short = [i for i in pending if estimate_tokens(resumes_data[i]['resume_text']) <= self.pack_max_resume_tokens]
+            short_set = set(short)
+            tasks = [[i] for i in pending if i not in short_set]
+            tasks += [short[j:j + pack_size] for j in range(0, len(short), pack_size)]
+        else:
+            tasks = [[i] for i in pending]
+        
+        def run(task):
+            if len(task) == 1:
+                return [self._analyze_resume_data(resumes_data[task[0]], job_description, use_cache, refresh_cache)]
+            return self.analyze_resumes_packed([resumes_data[i] for i in task], job_description,
+                                               use_cache, refresh_cache)
+        
+        max_in_flight = max_in_flight or self.max_in_flight
+        if max_in_flight <= 1 or len(tasks) <= 1:
+            task_results = [run(task) for task in tasks]
+        else:
+            # executor.map yields in input order regardless of completion order.
+            with ThreadPoolExecutor(max_workers=min(max_in_flight, len(tasks))) as executor:
+                task_results = list(executor.map(run, tasks))
+        
+        for task, analyses in zip(tasks, task_results):
+            for i, analysis in zip(task, analyses):
+                if similarities is not None:
+                    analysis['prescreen_similarity'] = float(similarities[i])
+                results[i] = analysis
         return results
     
-    def get_similar_resumes(self, query_text: str, k: int = 5) -> List[Dict[str, Any]]:
+    def _analyze_resume_data(self, resume_data: Dict[str, Any], job_description: Dict[str, Any],
+                             use_cache: bool = True, refresh_cache: bool = False) -> Dict[str, Any]:
+        try:
+            analysis = self.analyze_resume_against_job(
+                resume_data['resume_text'], 
+                job_description,
+                use_cache=use_cache,
+                refresh_cache=refresh_cache
+            )
 
-        if not self.vector_store:
-            return []
+            return self._with_applicant(analysis, resume_data)
+        
+        except LLMUnavailableError:
+            raise
+        except Exception as e:
+            print(f"Error analyzing resume for {resume_data.get('full_name', 'Unknown')}: {str(e)}")
+            return {
+                'applicant_id': resume_data['applicant_id'],
+                'full_name': resume_data['full_name'],
+                'email': resume_data['email'],
+                'position_applied': resume_data['position_applied'],
+                'overall_score': 0.0,
+                'recommendation': 'REJECTED',
+                'reasoning': f'Analysis failed: {str(e)}'
+            }
+    
+    def search_candidates(self, query_text: str, position: Optional[str] = None, status: Optional[str] = None,
+                          since: Optional[str] = None, k: int = 10, mode: Optional[str] = None) -> List[Dict[str, Any]]:
+        # Ranks applicants, not chunks: each applicant scores by their best
+        # matching chunk. With a position only that position's shard is
+        # searched; status/since are resolved to applicant ids through the
+        # database and applied inside the index scan.
+        # mode is 'vector', 'keyword' (BM25) or 'hybrid', which fuses the two
+        # rankings with reciprocal-rank fusion.
+        mode = mode or self.search_mode
+        if mode not in ('vector', 'keyword', 'hybrid'):
+            raise ValueError(f"Unsupported search mode: {mode}")
+        keywords = self._keywords()
+        if keywords is None:
+            mode = 'vector'
         
+        applicant_ids = None
+        if status is not None or since is not None:
+            if self.database is None:
+                raise ValueError("status and since filters need ResumeRAGSystem(database=...)")
+            applicant_ids = {application['id'] for application in
+                             self.database.iter_applications(status=status, position=position, since=since)}
+            if not applicant_ids:
+                return []
+        
+        # Fusion needs more than k from each side to find agreement.
+        depth = k if mode != 'hybrid' else max(2 * k, 20)
+        rankings = {}
+        if mode in ('vector', 'hybrid'):
+            rankings['vector'] = self._vector_candidates(query_text, position, applicant_ids, depth)
+        if mode in ('keyword', 'hybrid'):
+            hits = keywords.search_applicants(query_text, depth, position, applicant_ids)
+            rankings['keyword'] = [dict(hit, applicant_id=applicant_id) for applicant_id, hit in hits.items()][:depth]
+        
+        if mode != 'hybrid':
+            return rankings[mode][:k]
+        
+        fused = {}
+        for source, ranking in rankings.items():
+            for rank, hit in enumerate(ranking, 1):
+                candidate = fused.get(hit['applicant_id'])
+                if candidate is None:
+                    candidate = fused[hit['applicant_id']] = dict(
+                        hit, score=0.0, vector_score=None, vector_rank=None, keyword_score=None, keyword_rank=None
+                    )
+                candidate['score'] += 1.0 / (self.rrf_k + rank)
+                candidate[f'{source}_score'] = hit['score']
+                candidate[f'{source}_rank'] = rank
+                candidate['chunk_hits'] = max(candidate['chunk_hits'], hit['chunk_hits'])
+        
+        return sorted(fused.values(), key=lambda c: -c['score'])[:k]
+    
+    def _vector_candidates(self, query_text: str, position: Optional[str], applicant_ids, k: int) -> List[Dict[str, Any]]:
+        shards = [self._shard(position)] if position is not None else self._all_shards()
+        query_vector = np.asarray(self.embeddings.embed_query(query_text), dtype=np.float32)
+        
+        candidates = {}
+        for shard in shards:
+            for applicant_id, hit in shard.search_applicants(query_vector, k, applicant_ids).items():
+                if applicant_id not in candidates or hit['score'] > candidates[applicant_id]['score']:
+                    candidates[applicant_id] = dict(hit, applicant_id=applicant_id)
+        
+        return sorted(candidates.values(), key=lambda c: (-c['score'], -c['chunk_hits']))[:k]
+    
+    def get_similar_resumes(self, query_text: str, k: int = 5) -> List[Dict[str, Any]]:
+
         try:
-            similar_docs = self.vector_store.similarity_search_with_score(query_text, k=k)
+            query_vector = self.embeddings.embed_query(query_text)
+            
+            similar_docs = []
+            for shard in self._all_shards():
+                store = shard.store
+                if store is not None:
+                    similar_docs.extend(store.similarity_search_with_score_by_vector(query_vector, k=k))
+            similar_docs.sort(key=lambda item: item[1])
             
             results = []
-            for doc, score in similar_docs:
+            for doc, score in similar_docs[:k]:
                 results.append({
                     'content': doc.page_content,
                     'metadata': doc.metadata,
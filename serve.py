@@ -0,0 +1,117 @@
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+# Tokenizer thread pools do not survive fork; the workers embed single
+# queries, so they don't need them.
+os.environ.setdefault('TOKENIZERS_PARALLELISM', 'false')
+
+children = {}
+stopping = False
+
+
+def log(message):
+    print(f"[serve {os.getpid()}] {message}", flush=True)
+
+
+def serve_worker(app, host, port, listen_fd):
+    from werkzeug.serving import make_server
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    server = make_server(host, port, app, threaded=True, fd=listen_fd)
+    log("worker ready")
+    try:
+        server.serve_forever()
+    finally:
+        os._exit(0)
+
+
+def spawn(app, host, port, listen_fd):
+    pid = os.fork()
+    if pid == 0:
+        serve_worker(app, host, port, listen_fd)
+    children[pid] = time.monotonic()
+    return pid
+
+
+def stop(signum, frame):
+    global stopping
+    stopping = True
+    for pid in list(children):
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prefork production server: loads the models once, then forks workers")
+    parser.add_argument('--host', default=os.environ.get('HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 5000)))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() or 2)))
+    parser.add_argument('--no-warmup', action='store_true', help="skip preloading the models in the parent")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    import app as app_module
+    import_seconds = time.perf_counter() - start
+    log(f"imported app in {import_seconds:.2f}s")
+
+    from run import check_environment
+    if not check_environment():
+        sys.exit(1)
+
+    if not args.no_warmup:
+        # Loaded before fork, the model weights are shared copy-on-write by
+        # every worker instead of being loaded once per process.
+        try:
+            timings = app_module.rag_system.warmup()
+            details = ', '.join(f"{name} {seconds:.2f}s" for name, seconds in timings.items())
+            log(f"warmup {sum(timings.values()):.2f}s ({details})")
+        except Exception as e:
+            log(f"warmup failed, workers will load models on first use: {e}")
+    log(f"cold start {time.perf_counter() - start:.2f}s")
+
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((args.host, args.port))
+    listener.listen(128)
+    listener.set_inheritable(True)
+
+    # Objects created so far never change; freezing them keeps the garbage
+    # collector from touching (and so copying) their pages in the workers.
+    gc.freeze()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(args.workers):
+        spawn(app_module.app, args.host, args.port, listener.fileno())
+    log(f"listening on {args.host}:{args.port} with {args.workers} workers")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+
+        started = children.pop(pid, None)
+        if stopping or started is None:
+            continue
+        log(f"worker {pid} exited with status {status}, restarting")
+        if time.monotonic() - started < 1:
+            time.sleep(1)
+        spawn(app_module.app, args.host, args.port, listener.fileno())
+
+    listener.close()
+
+
+if __name__ == '__main__':
+    main()
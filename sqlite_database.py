@@ -0,0 +1,459 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+import uuid
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Iterator
+from database import SimpleDatabase
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS applications (
+    id TEXT PRIMARY KEY,
+    status TEXT,
+    position_applied TEXT,
+    created_at TEXT,
+    claimed_by TEXT,
+    lease_expires_at TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_applications_status ON applications (status);
+CREATE INDEX IF NOT EXISTS idx_applications_position ON applications (position_applied);
+CREATE INDEX IF NOT EXISTS idx_applications_created_at ON applications (created_at);
+
+CREATE TABLE IF NOT EXISTS job_descriptions (
+    id TEXT PRIMARY KEY,
+    job_title_lower TEXT,
+    is_active INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_job_descriptions_title ON job_descriptions (job_title_lower, is_active);
+
+CREATE TABLE IF NOT EXISTS analysis_batches (
+    id TEXT PRIMARY KEY,
+    created_at TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_analysis_batches_created_at ON analysis_batches (created_at);
+
+CREATE TABLE IF NOT EXISTS latest_results (
+    applicant_id TEXT PRIMARY KEY,
+    batch_id TEXT,
+    created_at TEXT,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS applicant_batches (
+    applicant_id TEXT NOT NULL,
+    batch_id TEXT NOT NULL,
+    PRIMARY KEY (applicant_id, batch_id)
+);
+"""
+
+
+class SQLiteDatabase:
+
+    def __init__(self, db_folder: str = "data", db_name: str = "recruiter.db"):
+        self.db_folder = db_folder
+        os.makedirs(db_folder, exist_ok=True)
+
+        self.db_path = os.path.join(db_folder, db_name)
+        self._local = threading.local()
+
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        self._add_missing_columns(conn)
+        if conn.execute("SELECT 1 FROM applicant_batches LIMIT 1").fetchone() is None:
+            with conn:
+                self._rebuild_latest_results(conn)
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared between threads, and the app
+        # processes applications from timer threads as well as request threads.
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _add_missing_columns(self, conn: sqlite3.Connection):
+        # Databases created before work claiming and result segments existed
+        # lack the lease and segment columns.
+        for table, column in (('applications', 'claimed_by'), ('applications', 'lease_expires_at'),
+                              ('analysis_batches', 'segment')):
+            columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            if column not in columns:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} TEXT")
+
+        with conn:
+            conn.execute("UPDATE analysis_batches SET segment = substr(created_at, 1, 7) WHERE segment IS NULL")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_analysis_batches_segment ON analysis_batches (segment)")
+
+    def _dumps(self, record: Dict[str, Any]) -> str:
+        return json.dumps(record, default=str)
+
+    def _loads(self, data) -> Dict[str, Any]:
+        # Archived analysis batches are stored as zlib-compressed blobs.
+        if isinstance(data, bytes):
+            data = zlib.decompress(data)
+        return json.loads(data)
+
+    def _rows_to_records(self, rows) -> List[Dict[str, Any]]:
+        return [self._loads(row[0]) for row in rows]
+
+    def _upsert_application(self, conn: sqlite3.Connection, app: Dict[str, Any]):
+        conn.execute(
+            "INSERT INTO applications (id, status, position_applied, created_at, claimed_by, lease_expires_at, data) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (id) DO UPDATE SET status = excluded.status, position_applied = excluded.position_applied, "
+            "created_at = excluded.created_at, claimed_by = excluded.claimed_by, "
+            "lease_expires_at = excluded.lease_expires_at, data = excluded.data",
+            (app['id'], app.get('status'), app.get('position_applied'), app.get('created_at'),
+             app.get('claimed_by'), app.get('lease_expires_at'), self._dumps(app))
+        )
+
+    def _upsert_job_description(self, conn: sqlite3.Connection, job: Dict[str, Any]):
+        conn.execute(
+            "INSERT INTO job_descriptions (id, job_title_lower, is_active, created_at, data) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (id) DO UPDATE SET job_title_lower = excluded.job_title_lower, is_active = excluded.is_active, "
+            "created_at = excluded.created_at, data = excluded.data",
+            (job['id'], job.get('job_title', '').lower(), 1 if job.get('is_active', False) else 0,
+             job.get('created_at'), self._dumps(job))
+        )
+
+    def _upsert_batch(self, conn: sqlite3.Connection, batch: Dict[str, Any]):
+        conn.execute(
+            "INSERT INTO analysis_batches (id, created_at, segment, data) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (id) DO UPDATE SET created_at = excluded.created_at, segment = excluded.segment, "
+            "data = excluded.data",
+            (batch['id'], batch.get('created_at'), (batch.get('created_at') or '')[:7], self._dumps(batch))
+        )
+
+    def _index_batch(self, conn: sqlite3.Connection, batch: Dict[str, Any]):
+        for result in batch.get('results', []):
+            applicant_id = result.get('applicant_id')
+            if applicant_id is None:
+                continue
+            conn.execute(
+                "INSERT OR IGNORE INTO applicant_batches (applicant_id, batch_id) VALUES (?, ?)",
+                (applicant_id, batch['id'])
+            )
+            conn.execute(
+                "INSERT INTO latest_results (applicant_id, batch_id, created_at, data) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (applicant_id) DO UPDATE SET batch_id = excluded.batch_id, "
+                "created_at = excluded.created_at, data = excluded.data "
+                "WHERE excluded.created_at >= latest_results.created_at",
+                (applicant_id, batch['id'], batch.get('created_at') or '',
+                 self._dumps(dict(result, batch_id=batch['id'])))
+            )
+
+    def _rebuild_latest_results(self, conn: sqlite3.Connection):
+        conn.execute("DELETE FROM latest_results")
+        conn.execute("DELETE FROM applicant_batches")
+        for row in conn.execute("SELECT data FROM analysis_batches ORDER BY rowid").fetchall():
+            self._index_batch(conn, self._loads(row[0]))
+
+    def save_application(self, application_data: Dict[str, Any]) -> str:
+        return self.save_applications([application_data])[0]
+
+    def save_applications(self, applications_data: List[Dict[str, Any]]) -> List[str]:
+        application_ids = []
+        conn = self._connect()
+        with conn:
+            for application_data in applications_data:
+                application_id = str(uuid.uuid4())
+                application_data['id'] = application_id
+                application_data['created_at'] = datetime.now().isoformat()
+                application_data['status'] = 'pending'
+                self._upsert_application(conn, application_data)
+                application_ids.append(application_id)
+
+        return application_ids
+
+    def get_application(self, application_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute(
+            "SELECT data FROM applications WHERE id = ?", (application_id,)
+        ).fetchone()
+        return self._loads(row[0]) if row else None
+
+    def get_all_applications(self) -> List[Dict[str, Any]]:
+        rows = self._connect().execute("SELECT data FROM applications ORDER BY rowid")
+        return self._rows_to_records(rows)
+
+    def _iter_query(self, table: str, clauses: List[str], params: List[Any],
+                    limit: Optional[int], cursor: Optional[str]) -> Iterator[Dict[str, Any]]:
+        conn = self._connect()
+        # Keyset pagination on rowid keeps insertion order, like the JSON store;
+        # the cursor is the id of the last record the caller has already seen.
+        if cursor is not None:
+            row = conn.execute(f"SELECT rowid FROM {table} WHERE id = ?", (cursor,)).fetchone()
+            if not row:
+                return
+            clauses = clauses + ["rowid > ?"]
+            params = params + [row[0]]
+
+        query = f"SELECT data FROM {table}"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY rowid"
+        if limit is not None:
+            query += " LIMIT ?"
+            params = params + [limit]
+
+        for row in conn.execute(query, params):
+            yield self._loads(row[0])
+
+    def iter_applications(self, status: Optional[str] = None, position: Optional[str] = None,
+                          since: Optional[str] = None, limit: Optional[int] = None,
+                          cursor: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        if isinstance(since, datetime):
+            since = since.isoformat()
+
+        clauses, params = [], []
+        if status is not None:
+            clauses.append("status = ?")
+            params.append(status)
+        if position is not None:
+            clauses.append("position_applied = ?")
+            params.append(position)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+
+        return self._iter_query("applications", clauses, params, limit, cursor)
+
+    def update_application_status(self, application_id: str, status: str):
+        self.update_application_statuses({application_id: status})
+
+    def update_application_statuses(self, statuses: Dict[str, str]) -> int:
+        updated = 0
+        conn = self._connect()
+        with conn:
+            # Like claim_pending_applications: the blobs are read and written
+            # back in one transaction, so a claim cannot land in between.
+            conn.execute("BEGIN IMMEDIATE")
+            for application_id, status in statuses.items():
+                row = conn.execute("SELECT data FROM applications WHERE id = ?", (application_id,)).fetchone()
+                if not row:
+                    continue
+                app = self._loads(row[0])
+                app['status'] = status
+                app['updated_at'] = datetime.now().isoformat()
+                app.pop('claimed_by', None)
+                app.pop('lease_expires_at', None)
+                self._upsert_application(conn, app)
+                updated += 1
+
+        return updated
+
+    def claim_pending_applications(self, worker_id: str, n: int, ttl: float,
+                                   application_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        now = datetime.now()
+        lease_expires_at = (now + timedelta(seconds=ttl)).isoformat()
+
+        query = (
+            "SELECT data FROM applications WHERE status = 'pending' "
+            "AND (claimed_by IS NULL OR claimed_by = ? OR lease_expires_at <= ?)"
+        )
+        params = [worker_id, now.isoformat()]
+        if application_ids is not None:
+            query += f" AND id IN ({', '.join('?' for _ in application_ids)})"
+            params.extend(application_ids)
+        query += " ORDER BY rowid LIMIT ?"
+        params.append(n)
+
+        claimed = []
+        conn = self._connect()
+        with conn:
+            # BEGIN IMMEDIATE takes the write lock up front, so two workers
+            # cannot select the same pending rows before either has updated them.
+            conn.execute("BEGIN IMMEDIATE")
+            for app in self._rows_to_records(conn.execute(query, params).fetchall()):
+                app['claimed_by'] = worker_id
+                app['lease_expires_at'] = lease_expires_at
+                self._upsert_application(conn, app)
+                claimed.append(app)
+
+        return claimed
+
+    def save_job_description(self, job_data: Dict[str, Any]) -> str:
+        job_id = str(uuid.uuid4())
+        job_data['id'] = job_id
+        job_data['created_at'] = datetime.now().isoformat()
+        job_data['is_active'] = True
+
+        conn = self._connect()
+        with conn:
+            rows = conn.execute("SELECT data FROM job_descriptions WHERE is_active = 1").fetchall()
+            for job in self._rows_to_records(rows):
+                job['is_active'] = False
+                self._upsert_job_description(conn, job)
+            self._upsert_job_description(conn, job_data)
+
+        return job_id
+
+    def get_active_job_description(self) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute(
+            "SELECT data FROM job_descriptions WHERE is_active = 1 ORDER BY rowid LIMIT 1"
+        ).fetchone()
+        return self._loads(row[0]) if row else None
+
+    def get_job_description_by_title(self, job_title: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute(
+            "SELECT data FROM job_descriptions WHERE job_title_lower = ? AND is_active = 1 ORDER BY rowid LIMIT 1",
+            (job_title.lower(),)
+        ).fetchone()
+        return self._loads(row[0]) if row else None
+
+    def get_all_job_descriptions(self) -> List[Dict[str, Any]]:
+        rows = self._connect().execute("SELECT data FROM job_descriptions ORDER BY rowid")
+        return self._rows_to_records(rows)
+
+    def save_analysis_results(self, results_data: List[Dict[str, Any]]) -> str:
+        batch_id = str(uuid.uuid4())
+        batch_data = {
+            'id': batch_id,
+            'created_at': datetime.now().isoformat(),
+            'results': results_data,
+        }
+
+        conn = self._connect()
+        with conn:
+            self._upsert_batch(conn, batch_data)
+            self._index_batch(conn, batch_data)
+
+        return batch_id
+
+    def get_latest_result_for(self, applicant_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute(
+            "SELECT data FROM latest_results WHERE applicant_id = ?", (applicant_id,)
+        ).fetchone()
+        return self._loads(row[0]) if row else None
+
+    def iter_latest_results(self) -> Iterator[Dict[str, Any]]:
+        for row in self._connect().execute("SELECT data FROM latest_results ORDER BY rowid"):
+            yield self._loads(row[0])
+
+    def iter_analysis_results(self, since: Optional[str] = None, limit: Optional[int] = None,
+                              cursor: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        if isinstance(since, datetime):
+            since = since.isoformat()
+
+        clauses, params = [], []
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+
+        return self._iter_query("analysis_batches", clauses, params, limit, cursor)
+
+    def iter_results_for(self, applicant_id: str) -> Iterator[Dict[str, Any]]:
+        rows = self._connect().execute(
+            "SELECT b.data FROM applicant_batches a JOIN analysis_batches b ON b.id = a.batch_id "
+            "WHERE a.applicant_id = ? ORDER BY b.rowid",
+            (applicant_id,)
+        )
+        for row in rows:
+            batch = self._loads(row[0])
+            for result in batch.get('results', []):
+                if result.get('applicant_id') == applicant_id:
+                    yield dict(result, batch_id=batch['id'])
+
+    def archive_results(self, hot_months: int = 1) -> int:
+        conn = self._connect()
+        segments = [row[0] for row in conn.execute(
+            "SELECT DISTINCT segment FROM analysis_batches ORDER BY segment"
+        )]
+        cold = segments[:-hot_months] if hot_months > 0 else segments
+        if not cold:
+            return 0
+
+        archived = 0
+        with conn:
+            rows = conn.execute(
+                f"SELECT id, data FROM analysis_batches WHERE typeof(data) = 'text' "
+                f"AND segment IN ({', '.join('?' for _ in cold)})",
+                cold
+            ).fetchall()
+            for batch_id, data in rows:
+                conn.execute(
+                    "UPDATE analysis_batches SET data = ? WHERE id = ?",
+                    (sqlite3.Binary(zlib.compress(data.encode('utf-8'))), batch_id)
+                )
+                archived += 1
+
+        return archived
+
+    def get_analysis_results(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute(
+            "SELECT data FROM analysis_batches WHERE id = ?", (batch_id,)
+        ).fetchone()
+        return self._loads(row[0]) if row else None
+
+    def get_latest_analysis_results(self) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute(
+            "SELECT data FROM analysis_batches ORDER BY created_at DESC LIMIT 1"
+        ).fetchone()
+        return self._loads(row[0]) if row else None
+
+    def get_all_analysis_results(self) -> List[Dict[str, Any]]:
+        rows = self._connect().execute("SELECT data FROM analysis_batches ORDER BY rowid")
+        return self._rows_to_records(rows)
+
+    def get_pending_applications(self) -> List[Dict[str, Any]]:
+        rows = self._connect().execute(
+            "SELECT data FROM applications WHERE status = 'pending' ORDER BY rowid"
+        )
+        return self._rows_to_records(rows)
+
+    def get_processed_applications(self) -> List[Dict[str, Any]]:
+        rows = self._connect().execute(
+            "SELECT data FROM applications WHERE status IN ('selected', 'rejected') ORDER BY rowid"
+        )
+        return self._rows_to_records(rows)
+
+    def clear_all_data(self):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM applications")
+            conn.execute("DELETE FROM job_descriptions")
+            conn.execute("DELETE FROM analysis_batches")
+            conn.execute("DELETE FROM latest_results")
+            conn.execute("DELETE FROM applicant_batches")
+
+
+def migrate_json_to_sqlite(json_folder: str = "data", target: Optional[SQLiteDatabase] = None) -> Dict[str, int]:
+    source = SimpleDatabase(json_folder)
+    target = target or SQLiteDatabase(json_folder)
+
+    counts = {'applications': 0, 'job_descriptions': 0, 'analysis_results': 0}
+    conn = target._connect()
+    with conn:
+        for app in source.get_all_applications():
+            app.setdefault('id', str(uuid.uuid4()))
+            target._upsert_application(conn, app)
+            counts['applications'] += 1
+
+        for job in source.get_all_job_descriptions():
+            job.setdefault('id', str(uuid.uuid4()))
+            target._upsert_job_description(conn, job)
+            counts['job_descriptions'] += 1
+
+        for batch in source.get_all_analysis_results():
+            batch.setdefault('id', str(uuid.uuid4()))
+            target._upsert_batch(conn, batch)
+            counts['analysis_results'] += 1
+
+        target._rebuild_latest_results(conn)
+
+    return counts
+
+
+if __name__ == '__main__':
+    folder = sys.argv[1] if len(sys.argv) > 1 else "data"
+    migrated = migrate_json_to_sqlite(folder)
+    print(f"Migrated {folder}/*.json into {os.path.join(folder, 'recruiter.db')}: {migrated}")
@@ -0,0 +1,172 @@
+import json
+import multiprocessing
+import os
+
+import pytest
+
+from database import JournaledDatabase, PartitionedDatabase, SimpleDatabase
+
+
+def test_writes_do_not_mutate_lists_already_returned(tmp_path):
+    db = SimpleDatabase(str(tmp_path))
+    first_id = db.save_application({'full_name': 'A', 'position_applied': 'Engineer'})
+
+    applications = db.get_all_applications()
+    db.save_application({'full_name': 'B', 'position_applied': 'Engineer'})
+    db.update_application_status(first_id, 'selected')
+
+    assert len(applications) == 1
+    assert applications[0]['status'] == 'pending'
+    assert len(db.get_all_applications()) == 2
+    assert db.get_application(first_id)['status'] == 'selected'
+
+
+def test_latest_results_iterator_survives_concurrent_save(tmp_path):
+    db = SimpleDatabase(str(tmp_path))
+    db.save_analysis_results([{'applicant_id': 'a', 'overall_score': 7}])
+
+    results = db.iter_latest_results()
+    next(results)
+    db.save_analysis_results([{'applicant_id': 'b', 'overall_score': 8}])
+
+    assert list(results) == []
+    assert {r['applicant_id'] for r in db.iter_latest_results()} == {'a', 'b'}
+
+
+def test_reads_are_still_cached(tmp_path):
+    db = SimpleDatabase(str(tmp_path))
+    db.save_application({'full_name': 'A', 'position_applied': 'Engineer'})
+
+    db.get_all_applications()
+    hits = db.cache_stats()['hits']
+    db.get_all_applications()
+    assert db.cache_stats()['hits'] == hits + 1
+
+
+@pytest.mark.parametrize('backend', [SimpleDatabase, PartitionedDatabase, JournaledDatabase])
+def test_editing_a_returned_record_does_not_change_the_store(tmp_path, backend):
+    db = backend(str(tmp_path))
+    application_id = db.save_application({'full_name': 'A', 'position_applied': 'Engineer'})
+    db.save_job_description({'job_title': 'Engineer', 'description': 'Builds things'})
+    batch_id = db.save_analysis_results([{'applicant_id': application_id, 'overall_score': 7}])
+
+    db.get_application(application_id)['status'] = 'selected'
+    db.get_all_applications()[0]['full_name'] = 'Z'
+    db.get_job_description_by_title('Engineer')['description'] = 'Changed'
+    db.get_latest_result_for(application_id)['overall_score'] = 0
+    db.get_analysis_results(batch_id)['results'][0]['overall_score'] = 0
+
+    assert db.get_application(application_id)['status'] == 'pending'
+    assert db.get_all_applications()[0]['full_name'] == 'A'
+    assert db.get_job_description_by_title('Engineer')['description'] == 'Builds things'
+    assert db.get_latest_result_for(application_id)['overall_score'] == 7
+    assert db.get_analysis_results(batch_id)['results'][0]['overall_score'] == 7
+    if hasattr(db, 'close'):
+        db.close()
+
+
+def test_journaled_stores_share_writes_and_claims(tmp_path):
+    first = JournaledDatabase(str(tmp_path), compact_interval=0)
+    second = JournaledDatabase(str(tmp_path), compact_interval=0)
+    ids = first.save_applications([{'full_name': f'A{i}', 'position_applied': 'Engineer'} for i in range(4)])
+
+    assert len(second.get_all_applications()) == 4
+    claimed_first = first.claim_pending_applications('w1', 2, ttl=60)
+    claimed_second = second.claim_pending_applications('w2', 4, ttl=60)
+    assert {a['id'] for a in claimed_first}.isdisjoint(a['id'] for a in claimed_second)
+    assert len(claimed_first) + len(claimed_second) == 4
+
+    second.update_application_status(ids[0], 'selected')
+    first.compact()
+    second.update_application_status(ids[1], 'rejected')
+    assert first.get_application(ids[0])['status'] == 'selected'
+    assert first.get_application(ids[1])['status'] == 'rejected'
+
+    first.close()
+    second.close()
+    reopened = JournaledDatabase(str(tmp_path), compact_interval=0)
+    assert [reopened.get_application(i)['status'] for i in ids[:2]] == ['selected', 'rejected']
+    reopened.close()
+
+
+def _claim_all(folder, worker_id, queue):
+    db = JournaledDatabase(folder, compact_interval=0)
+    claimed = []
+    while True:
+        batch = db.claim_pending_applications(worker_id, 1, ttl=60)
+        if not batch:
+            break
+        claimed.append(batch[0]['id'])
+        db.update_application_status(batch[0]['id'], 'selected')
+        if len(claimed) % 5 == 0:
+            db.compact()
+    queue.put(claimed)
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="needs fork")
+def test_journaled_store_claims_are_exclusive_across_processes(tmp_path):
+    db = JournaledDatabase(str(tmp_path), compact_interval=0)
+    ids = db.save_applications([{'full_name': f'A{i}', 'position_applied': 'Engineer'} for i in range(60)])
+    db.compact()
+
+    context = multiprocessing.get_context('fork')
+    queue = context.Queue()
+    workers = [context.Process(target=_claim_all, args=(str(tmp_path), f'w{i}', queue)) for i in range(4)]
+    for worker in workers:
+        worker.start()
+    claimed = [application_id for _ in workers for application_id in queue.get(timeout=60)]
+    for worker in workers:
+        worker.join()
+
+    assert sorted(claimed) == sorted(ids)
+    assert {a['status'] for a in db.get_all_applications()} == {'selected'}
+    db.close()
+
+
+def test_torn_journal_line_is_dropped_before_next_write(tmp_path):
+    db = JournaledDatabase(str(tmp_path), compact_interval=0)
+    db.save_application({'full_name': 'A', 'position_applied': 'Engineer'})
+    with open(db.journal_file, 'a') as f:
+        f.write('{"op": "insert", "collec')
+
+    db.save_application({'full_name': 'B', 'position_applied': 'Engineer'})
+    reopened = JournaledDatabase(str(tmp_path), compact_interval=0)
+    assert sorted(a['full_name'] for a in reopened.get_all_applications()) == ['A', 'B']
+    db.close()
+    reopened.close()
+
+
+def test_corrupt_journal_line_does_not_drop_later_entries(tmp_path):
+    db = JournaledDatabase(str(tmp_path), compact_interval=0)
+    db.save_application({'full_name': 'A', 'position_applied': 'Engineer'})
+    with open(db.journal_file) as f:
+        entry = json.loads(f.readline())
+    entry['records'][0].update(id='b', full_name='B')
+    with open(db.journal_file, 'a') as f:
+        f.write('{"op": "insert", "collec\n' + json.dumps(entry) + '\n')
+
+    db.save_application({'full_name': 'C', 'position_applied': 'Engineer'})
+    reopened = JournaledDatabase(str(tmp_path), compact_interval=0)
+    assert sorted(a['full_name'] for a in reopened.get_all_applications()) == ['A', 'B', 'C']
+    db.close()
+    reopened.close()
+
+
+@pytest.mark.parametrize('backend', [SimpleDatabase, PartitionedDatabase])
+def test_saving_results_appends_to_the_latest_index_instead_of_rewriting_it(tmp_path, monkeypatch, backend):
+    db = backend(str(tmp_path))
+    db.save_analysis_results([{'applicant_id': 'a', 'overall_score': 7}])
+    snapshot = os.stat(db.latest_results_file)
+
+    db.save_analysis_results([{'applicant_id': 'b', 'overall_score': 8}])
+    db.save_analysis_results([{'applicant_id': 'a', 'overall_score': 9}])
+
+    assert os.stat(db.latest_results_file).st_ino == snapshot.st_ino
+    reopened = backend(str(tmp_path))
+    assert {r['applicant_id']: r['overall_score'] for r in reopened.iter_latest_results()} == {'a': 9, 'b': 8}
+    assert db.get_latest_result_for('a')['overall_score'] == 9
+
+    monkeypatch.setattr('database.LATEST_LOG_MIN_BYTES', 0)
+    db.save_analysis_results([{'applicant_id': 'c', 'overall_score': 5}])
+    assert os.path.getsize(db.latest_log_file) == 0
+    assert {r['applicant_id'] for r in backend(str(tmp_path)).iter_latest_results()} == {'a', 'b', 'c'}
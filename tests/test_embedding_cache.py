@@ -0,0 +1,37 @@
+import numpy as np
+
+from embedding_cache import EmbeddingCache
+
+
+def test_rows_stay_aligned_after_crash_between_appends(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), 'model')
+    cache.put_many(['a'], [[1.0, 1.0, 1.0]])
+
+    # A writer died after appending its vector but before its key line.
+    with open(cache.vectors_file, 'ab') as f:
+        f.write(np.asarray([[9.0, 9.0, 9.0]], dtype=np.float32).tobytes())
+
+    cache = EmbeddingCache(str(tmp_path), 'model')
+    cache.put_many(['b'], [[2.0, 2.0, 2.0]])
+
+    reopened = EmbeddingCache(str(tmp_path), 'model')
+    a, b = reopened.get_many(['a', 'b'])
+    assert a.tolist() == [1.0, 1.0, 1.0]
+    assert b.tolist() == [2.0, 2.0, 2.0]
+
+
+def test_partial_key_line_is_discarded(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), 'model')
+    cache.put_many(['a'], [[1.0, 1.0]])
+
+    with open(cache.vectors_file, 'ab') as f:
+        f.write(np.asarray([[9.0, 9.0]], dtype=np.float32).tobytes())
+    with open(cache.keys_file, 'a') as f:
+        f.write('half-a-ke')
+
+    cache = EmbeddingCache(str(tmp_path), 'model')
+    cache.put_many(['b'], [[2.0, 2.0]])
+
+    reopened = EmbeddingCache(str(tmp_path), 'model')
+    assert reopened.stats()['entries'] == 2
+    assert reopened.get_many(['b'])[0].tolist() == [2.0, 2.0]
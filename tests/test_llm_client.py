@@ -0,0 +1,203 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from analysis_cache import AnalysisCache
+from llm_backends import StubBackend, StubError
+from llm_client import CircuitBreaker, CircuitOpenError, LLMUnavailableError, RateLimiter, ResilientLLMClient
+from rag_system import ResumeRAGSystem
+
+JOB = {
+    'job_title': 'AI Engineer',
+    'job_description': 'Build and deploy machine learning systems.',
+    'required_skills': 'Python, Machine Learning, Docker',
+    'experience_required': 'mid'
+}
+RESUME = "Python developer with machine learning and Docker experience. " * 5
+
+
+class ScriptedModel:
+    # Local fake: each call pops the next outcome, an exception to raise or a
+    # number of seconds to hang before answering. Streams yield `chunks` and
+    # then fail with `stream_error`, if set.
+
+    def __init__(self, outcomes=(), text='{"ok": true}', chunks=None, stream_error=None, chunk_delay=0.0):
+        self.outcomes = list(outcomes)
+        self.text = text
+        self.chunks = chunks
+        self.stream_error = stream_error
+        self.chunk_delay = chunk_delay
+        self.calls = 0
+
+    def generate_content(self, prompt, stream=False):
+        self.calls += 1
+        outcome = self.outcomes.pop(0) if self.outcomes else None
+        if isinstance(outcome, Exception):
+            raise outcome
+        if outcome:
+            time.sleep(outcome)
+        if stream:
+            return self._stream()
+        return SimpleNamespace(text=self.text)
+
+    def _stream(self):
+        for chunk in self.chunks or [self.text]:
+            time.sleep(self.chunk_delay)
+            yield SimpleNamespace(text=chunk)
+        if self.stream_error is not None:
+            raise self.stream_error
+
+
+def make_client(model, **kwargs):
+    kwargs.setdefault('sleep', lambda seconds: None)
+    kwargs.setdefault('breaker', CircuitBreaker(failure_threshold=3, reset_timeout=60))
+    return ResilientLLMClient(model, **kwargs)
+
+
+def test_transient_errors_are_retried():
+    model = ScriptedModel([StubError("503"), StubError("503")])
+    client = make_client(model, max_attempts=4)
+
+    assert client.generate_content("prompt").text == '{"ok": true}'
+    assert model.calls == 3
+    assert client.retries == 2
+    assert client.breaker.state == 'closed' and client.breaker.failures == 0
+
+
+def test_outage_raises_and_opens_breaker():
+    model = StubBackend()
+    model.outage = True
+    client = make_client(model, max_attempts=4)
+
+    with pytest.raises(LLMUnavailableError):
+        client.generate_content("prompt")
+    assert model.requests == 3
+    assert client.breaker.state == 'open'
+
+    with pytest.raises(CircuitOpenError):
+        client.generate_content("prompt")
+    assert model.requests == 3
+
+
+def test_hanging_attempt_is_cut_off():
+    model = ScriptedModel([1.0, 1.0])
+    client = make_client(model, max_attempts=2, attempt_timeout=0.05)
+
+    with pytest.raises(LLMUnavailableError):
+        client.generate_content("prompt")
+    assert client.timeouts == 2
+
+
+def test_bad_request_is_not_retried():
+    model = ScriptedModel([ValueError("bad prompt")])
+    client = make_client(model)
+
+    with pytest.raises(ValueError):
+        client.generate_content("prompt")
+    assert model.calls == 1
+    assert client.breaker.failures == 0
+
+
+def test_stream_failure_after_first_chunk_raises_unavailable():
+    model = ScriptedModel(chunks=['{"overall', '_score": 8.1'], stream_error=StubError("503"))
+    client = make_client(model)
+
+    received = []
+    with pytest.raises(LLMUnavailableError):
+        for chunk in client.generate_content("prompt", stream=True):
+            received.append(chunk.text)
+    assert received == ['{"overall', '_score": 8.1']
+    assert client.failures == 1
+    assert client.breaker.failures == 1
+
+
+def test_stream_respects_deadline():
+    model = ScriptedModel(chunks=['a'] * 20, chunk_delay=0.05)
+    client = make_client(model, deadline=0.2, attempt_timeout=1.0)
+
+    with pytest.raises(LLMUnavailableError):
+        list(client.generate_content("prompt", stream=True))
+    assert client.timeouts == 1
+
+
+def test_stream_hang_after_first_chunk_is_cut_off():
+    hang = threading.Event()
+    model = ScriptedModel()
+
+    def chunks():
+        yield SimpleNamespace(text='a')
+        hang.wait(5)
+        yield SimpleNamespace(text='b')
+
+    model._stream = chunks
+    client = make_client(model, attempt_timeout=0.1)
+    try:
+        with pytest.raises(LLMUnavailableError):
+            list(client.generate_content("prompt", stream=True))
+    finally:
+        hang.set()
+
+
+def test_streamed_analysis_is_requeued_not_rejected_on_mid_stream_failure(tmp_path):
+    answer = StubBackend().respond(f"Required Skills: {JOB['required_skills']}\n"
+                                   f"CANDIDATE'S RESUME\n{RESUME}\n\nPlease provide")
+    split = answer.index('"recommendation"') + 40
+    model = ScriptedModel(chunks=[answer[:split]], stream_error=StubError("503 after first chunk"))
+    client = make_client(model)
+    rag_system = ResumeRAGSystem(
+        index_folder=str(tmp_path / 'index'), embedding_cache_folder=str(tmp_path / 'embeddings'),
+        gemini_model=client, embeddings=DeterministicFakeEmbedding(size=32),
+        analysis_cache=AnalysisCache(str(tmp_path / 'analysis.db')), stream_responses=True
+    )
+
+    decisions = []
+    with pytest.raises(LLMUnavailableError):
+        rag_system.analyze_resume_against_job(RESUME, JOB, on_decision=decisions.append)
+    assert decisions
+    assert client.breaker.failures == 1
+    assert rag_system.analysis_cache.stats()['entries'] == 0
+
+
+class ProviderError(Exception):
+
+    def __init__(self, code):
+        super().__init__(f"{code} from provider")
+        self.code = code
+
+
+@pytest.mark.parametrize('code', [400, 401, 403, 404])
+def test_provider_refusal_is_unavailable_not_a_bad_request(code):
+    model = ScriptedModel([ProviderError(code)])
+    client = make_client(model)
+
+    with pytest.raises(LLMUnavailableError):
+        client.generate_content("prompt")
+    assert model.calls == 1
+    assert client.breaker.failures == 1
+
+
+def test_revoked_key_requeues_instead_of_rejecting(tmp_path):
+    client = make_client(ScriptedModel([ProviderError(403)]))
+    rag_system = ResumeRAGSystem(
+        index_folder=str(tmp_path / 'index'), embedding_cache_folder=str(tmp_path / 'embeddings'),
+        gemini_model=client, embeddings=DeterministicFakeEmbedding(size=32),
+        analysis_cache=AnalysisCache(str(tmp_path / 'analysis.db'))
+    )
+
+    with pytest.raises(LLMUnavailableError):
+        rag_system.analyze_resume_against_job(RESUME, JOB)
+
+
+def test_retries_go_through_the_rate_limiter():
+    waits = []
+    limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=1000, clock=lambda: 0.0, sleep=waits.append)
+    model = ScriptedModel([StubError("503"), StubError("503")])
+    client = make_client(model, max_attempts=4, rate_limiter=limiter)
+
+    client.generate_content("prompt", tokens=400)
+    assert model.calls == 3
+    assert limiter.token_bucket.tokens == 1000 - 3 * 400
+    assert waits == [pytest.approx(200 * 60 / 1000)]
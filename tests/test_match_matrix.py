@@ -0,0 +1,75 @@
+import threading
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from match_matrix import MatchMatrix
+from rag_system import ResumeRAGSystem
+
+
+def brute_force(chunks_by_candidate, jobs):
+    jobs = jobs / np.linalg.norm(jobs, axis=1, keepdims=True)
+    return np.stack([
+        (chunks / np.linalg.norm(chunks, axis=1, keepdims=True) @ jobs.T).max(axis=0)
+        for chunks in chunks_by_candidate
+    ])
+
+
+def test_incremental_updates_match_recompute():
+    rng = np.random.default_rng(0)
+    matrix = MatchMatrix(8)
+    chunks = {f"c{i}": rng.standard_normal((int(rng.integers(1, 4)), 8)) for i in range(6)}
+    jobs = {f"j{i}": rng.standard_normal(8) for i in range(3)}
+
+    matrix.set_candidates({c: (v, None) for c, v in list(chunks.items())[:3]})
+    for job_id, vector in jobs.items():
+        matrix.set_job(job_id, vector, job_id)
+    matrix.set_candidates({c: (v, None) for c, v in list(chunks.items())[3:]})
+    chunks['c1'] = rng.standard_normal((2, 8))
+    matrix.set_candidate('c1', chunks['c1'])
+    matrix.remove_candidate('c0')
+    del chunks['c0']
+    matrix.remove_job('j0')
+    del jobs['j0']
+
+    expected = brute_force([chunks[c] for c in matrix.candidate_ids], np.stack([jobs[j] for j in matrix.job_ids]))
+    assert np.allclose(matrix.scores, expected, atol=1e-5)
+    assert matrix.top_candidates('j1', 2)[0]['score'] == pytest.approx(expected[:, matrix.job_ids.index('j1')].max())
+
+
+def test_match_matrix_does_not_deadlock_with_add_resumes(tmp_path, monkeypatch):
+    monkeypatch.setenv('VECTOR_INDEX_REFRESH_SECONDS', '0')
+    monkeypatch.setenv('ANALYSIS_CACHE', 'off')
+    rag_system = ResumeRAGSystem(index_folder=str(tmp_path / 'index'), embedding_cache_folder=str(tmp_path / 'cache'),
+                                 embeddings=DeterministicFakeEmbedding(size=16))
+    rag_system.add_resumes([f"python resume {i}" for i in range(5)], [f"a{i}" for i in range(5)], ['Eng'] * 5)
+    jobs = [{'id': 'j', 'job_title': 'Eng', 'job_description': 'python'}]
+    rag_system.match_matrix(jobs)
+
+    def add():
+        for i in range(50):
+            rag_system.add_resumes([f"new resume {i}"], [f"n{i}"], ['Eng'])
+
+    def rebuild():
+        for _ in range(50):
+            rag_system.match_matrix(jobs, refresh=True)
+
+    threads = [threading.Thread(target=add, daemon=True), threading.Thread(target=rebuild, daemon=True)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+    assert not any(thread.is_alive() for thread in threads)
+    assert rag_system.match_matrix(jobs).stats()['candidates'] == 55
+
+
+def test_match_matrix_includes_resumes_added_before_it_is_built(tmp_path, monkeypatch):
+    monkeypatch.setenv('ANALYSIS_CACHE', 'off')
+    rag_system = ResumeRAGSystem(index_folder=str(tmp_path / 'index'), embedding_cache_folder=str(tmp_path / 'cache'),
+                                 embeddings=DeterministicFakeEmbedding(size=16))
+    rag_system.add_resumes([f"python resume {i}" for i in range(5)], [f"a{i}" for i in range(5)], ['Eng'] * 5)
+    rag_system.add_resumes(["late python resume"], ["late"], ['Eng'])
+
+    matrix = rag_system.match_matrix([{'id': 'j', 'job_title': 'Eng', 'job_description': 'python'}])
+    assert sorted(matrix.candidate_ids) == ['a0', 'a1', 'a2', 'a3', 'a4', 'late']
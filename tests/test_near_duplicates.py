@@ -0,0 +1,58 @@
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from analysis_cache import AnalysisCache
+from llm_backends import StubBackend
+from near_duplicates import NearDuplicateIndex, jaccard
+from rag_system import ResumeRAGSystem
+
+JOB = {
+    'job_title': 'Data Engineer',
+    'job_description': 'Build data pipelines.',
+    'required_skills': 'Python, Spark, Kafka',
+    'experience_required': 'mid'
+}
+RESUME = '\n'.join(f"Line {i}: built data pipelines with Python, Spark and Kafka for team {i}." for i in range(30))
+
+
+def make_system(tmp_path, model):
+    return ResumeRAGSystem(index_folder=str(tmp_path / 'index'), embedding_cache_folder=str(tmp_path / 'cache'),
+                           gemini_model=model, embeddings=DeterministicFakeEmbedding(size=16),
+                           analysis_cache=AnalysisCache(str(tmp_path / 'analysis.db')))
+
+
+def test_query_finds_edited_copy_and_skips_unrelated(tmp_path):
+    index = NearDuplicateIndex(str(tmp_path / 'nd.sqlite'), threshold=0.8)
+    index.add('original', RESUME)
+    index.add('other', '\n'.join(f"Chef {i} cooked pasta and risotto" for i in range(30)))
+
+    edited = RESUME.replace('Line 3: built', 'Line 3: designed') + '\nPhone: 555-1234'
+    matches = index.query(edited)
+    assert [m['doc_id'] for m in matches] == ['original']
+    assert matches[0]['similarity'] == jaccard(RESUME, edited)
+
+    assert index.remove('original')
+    assert index.query(edited) == []
+
+
+def test_case_only_variant_reuses_analysis(tmp_path):
+    model = StubBackend()
+    rag_system = make_system(tmp_path, model)
+    rag_system.add_resumes([RESUME], ['first'], ['Data Engineer'])
+    rag_system.analyze_resume_against_job(RESUME, JOB)
+
+    variant = RESUME.upper()
+    rag_system.add_resumes([variant], ['second'], ['Data Engineer'])
+    analysis = rag_system.analyze_resume_against_job(variant, JOB)
+
+    assert model.requests == 1
+    assert analysis['near_duplicate_of']['applicant_id'] == 'first'
+
+
+def test_exact_copy_with_cache_miss_is_analysed(tmp_path):
+    model = StubBackend()
+    rag_system = make_system(tmp_path, model)
+    rag_system.add_resumes([RESUME, RESUME], ['first', 'second'], ['Data Engineer'] * 2)
+
+    analysis = rag_system.analyze_resume_against_job(RESUME, JOB)
+    assert model.requests == 1
+    assert 'near_duplicate_of' not in analysis
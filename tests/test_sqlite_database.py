@@ -0,0 +1,31 @@
+import threading
+
+from sqlite_database import SQLiteDatabase
+
+
+def test_status_update_does_not_interleave_with_a_claim(tmp_path):
+    updater, claimer = SQLiteDatabase(str(tmp_path)), SQLiteDatabase(str(tmp_path))
+    application_id = updater.save_application({'full_name': 'A', 'status': 'pending'})
+
+    claimed = []
+    loads = updater._loads
+
+    def claim_while_reading(data):
+        # Another worker claims the application between the update's read
+        # and its write.
+        record = loads(data)
+        thread = threading.Thread(target=lambda: claimed.extend(claimer.claim_pending_applications('w2', 10, 60)))
+        thread.start()
+        thread.join(0.5)
+        claim_while_reading.thread = thread
+        return record
+
+    updater._loads = claim_while_reading
+    updater.update_application_statuses({application_id: 'rejected'})
+    claim_while_reading.thread.join()
+
+    application = claimer.get_application(application_id)
+    if claimed:
+        assert application.get('claimed_by') == 'w2'
+    else:
+        assert application['status'] == 'rejected'
@@ -0,0 +1,134 @@
+import os
+import time
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import vector_shards
+from vector_index import current_version, index_settings_from_env, load_store, publish_store
+from vector_shards import VectorShard
+
+
+def make_shard(tmp_path, **settings):
+    return VectorShard(str(tmp_path / 'shard'), DeterministicFakeEmbedding(size=16),
+                       dict(index_settings_from_env(), **settings))
+
+
+def add_applicants(shard, start, count, chunks_per_applicant=2):
+    chunks, metadatas, ids = [], [], []
+    for i in range(start, start + count):
+        for c in range(chunks_per_applicant):
+            chunks.append(f"applicant {i} chunk {c}")
+            metadatas.append({'applicant_id': f"a{i}", 'chunk_index': c})
+            ids.append(f"a{i}:{c}")
+    with shard.write_lock():
+        shard.add(chunks, metadatas, ids)
+        shard.publish()
+
+
+def test_auto_sized_ivf_is_retrained_as_it_grows(tmp_path):
+    shard = make_shard(tmp_path, index_type='ivf_flat', nlist=None)
+    add_applicants(shard, 0, 40)
+    assert shard.stats()['type'] == 'ivf_flat'
+    assert shard.stats()['nlist'] == 2
+
+    for start in range(40, 3000, 40):
+        add_applicants(shard, start, 40)
+    stats = shard.stats()
+    assert stats['vectors'] == 6000
+    assert stats['nlist'] >= 32
+
+
+def test_fixed_nlist_is_not_retrained(tmp_path):
+    shard = make_shard(tmp_path, index_type='ivf_flat', nlist=4)
+    for start in range(0, 1000, 100):
+        add_applicants(shard, start, 100)
+    assert shard.stats()['nlist'] == 4
+
+
+def test_readers_keep_the_published_store_while_a_writer_adds(tmp_path):
+    shard = make_shard(tmp_path, index_type='flat')
+    add_applicants(shard, 0, 5)
+    published = shard.store
+
+    with shard.write_lock():
+        shard.add(["applicant 9 chunk 0"], [{'applicant_id': 'a9', 'chunk_index': 0}], ["a9:0"],
+                  stale_ids=shard.pop_chunk_ids('a0'))
+        assert shard.store is published
+        assert published.index.ntotal == 10
+        assert 'a9' not in shard.search_applicants(np.asarray(shard.embeddings.embed_query("x")), 10)
+        shard.publish()
+
+    assert published.index.ntotal == 10
+    assert shard.store is not published
+    assert shard.store.index.ntotal == 9
+
+
+def test_unpublished_changes_are_discarded(tmp_path):
+    shard = make_shard(tmp_path, index_type='flat')
+    add_applicants(shard, 0, 5)
+    with shard.write_lock():
+        shard.remove_applicant('a0')
+    with shard.write_lock():
+        assert shard.is_indexed('a0', ["applicant 0 chunk 0", "applicant 0 chunk 1"], ["a0:0", "a0:1"])
+    assert shard.store.index.ntotal == 10
+
+
+def commit_applicants(shard, start, count):
+    with shard.write_lock():
+        shard.add([f"applicant {i} chunk 0" for i in range(start, start + count)],
+                  [{'applicant_id': f"a{i}", 'chunk_index': 0} for i in range(start, start + count)],
+                  [f"a{i}:0" for i in range(start, start + count)])
+        shard.commit()
+
+
+def test_commits_append_deltas_until_the_next_publish(tmp_path, monkeypatch):
+    shard = make_shard(tmp_path, index_type='flat')
+    shard.publish_every, shard.publish_seconds = 4, 60
+    commit_applicants(shard, 0, 5)
+    version = current_version(shard.folder)
+
+    loads = []
+    monkeypatch.setattr(vector_shards, 'load_store', lambda *args, **kwargs: loads.append(args) or load_store(*args, **kwargs))
+    monkeypatch.setattr(vector_shards, 'publish_store', lambda *args: pytest.fail("published a full version"))
+    for start in (5, 6, 7):
+        commit_applicants(shard, start, 1)
+    assert current_version(shard.folder) == version
+    assert len(os.listdir(os.path.join(shard.folder, version, 'deltas'))) == 3
+    assert len(loads) == 1
+    assert shard.store.index.ntotal == 5
+    assert shard.contains_any(['a7'])
+
+    monkeypatch.setattr(vector_shards, 'publish_store', publish_store)
+    commit_applicants(shard, 8, 1)
+    assert current_version(shard.folder) != version
+    assert shard.store.index.ntotal == 9
+
+
+def test_writers_replay_deltas_from_other_processes(tmp_path):
+    first, second = make_shard(tmp_path, index_type='flat'), make_shard(tmp_path, index_type='flat')
+    for shard in (first, second):
+        shard.publish_every, shard.publish_seconds = 10, 60
+    commit_applicants(first, 0, 3)
+    commit_applicants(second, 3, 1)
+    commit_applicants(first, 4, 1)
+
+    with second.write_lock():
+        assert second.remove_applicant('a4')
+        assert second.is_indexed('a3', ["applicant 3 chunk 0"], ["a3:0"])
+        second.commit()
+        second.publish()
+    first.load()
+    applicants, _ = first._applicant_table(first.store)
+    assert sorted(applicants) == ['a0', 'a1', 'a2', 'a3']
+
+
+def test_deltas_are_published_after_publish_seconds(tmp_path):
+    shard = make_shard(tmp_path, index_type='flat')
+    shard.publish_every, shard.publish_seconds = 100, 0.2
+    commit_applicants(shard, 0, 2)
+    commit_applicants(shard, 2, 1)
+    assert shard.store.index.ntotal == 2
+    time.sleep(0.6)
+    assert shard.store.index.ntotal == 3
@@ -0,0 +1,378 @@
+import json
+import math
+import mmap
+import os
+import pickle
+import shutil
+import time
+from collections.abc import Mapping
+from typing import Dict, Any, Optional
+import numpy as np
+import faiss
+
+INDEX_TYPES = ('flat', 'ivf_flat', 'ivf_pq', 'hnsw')
+
+# k-means wants ~39 training points per centroid; below that faiss warns and
+# the clusters get noisy.
+POINTS_PER_CENTROID = 39
+PQ_BITS = 8
+RETRAIN_NLIST_GROWTH = 4
+
+
+def default_nlist(count: int) -> int:
+    # sqrt(n) * 4 is the usual starting point, capped so every list gets
+    # enough training points. A single list would just be a flat index.
+    return max(2, min(int(4 * math.sqrt(count)), count // POINTS_PER_CENTROID))
+
+
+def default_pq_m(dimension: int) -> int:
+    # Largest sub-quantizer count <= dimension / 4 that divides the
+    # dimension, i.e. at least four dimensions per code byte.
+    for m in range(max(1, dimension // 4), 0, -1):
+        if dimension % m == 0:
+            return m
+    return 1
+
+
+def min_training_points(index_type: str, nlist: Optional[int] = None) -> int:
+    ivf_points = max(2, nlist or 0) * POINTS_PER_CENTROID
+    if index_type == 'ivf_flat':
+        return ivf_points
+    if index_type == 'ivf_pq':
+        return max(ivf_points, 2 ** PQ_BITS)
+    return 0
+
+
+def needs_retraining(index, nlist: Optional[int] = None) -> bool:
+    # An IVF index sized automatically (nlist unset) is trained on whatever
+    # the collection held when it switched from flat, often only a couple of
+    # lists. Retrain once the data supports RETRAIN_NLIST_GROWTH times as many;
+    # the geometric steps keep total retraining cost linear in vectors added.
+    if nlist or not isinstance(index, faiss.IndexIVF) or index_type_of(index) == 'flat':
+        return False
+    return default_nlist(index.ntotal) >= RETRAIN_NLIST_GROWTH * index.nlist
+
+
+def supports_removal(index) -> bool:
+    # LangChain's FAISS.delete assumes ids shift down after remove_ids, which
+    # only holds for flat indexes; IVF keeps explicit ids and HNSW cannot
+    # remove at all.
+    return isinstance(index, faiss.IndexFlat)
+
+
+def index_type_of(index) -> str:
+    if isinstance(index, faiss.IndexHNSW):
+        return 'hnsw'
+    if isinstance(index, faiss.IndexIVFPQ):
+        return 'ivf_pq'
+    if isinstance(index, faiss.IndexIVF) and index.nlist > 1:
+        return 'ivf_flat'
+    # A single-list IVF-Flat is a flat index written by to_shareable.
+    return 'flat'
+
+
+def is_memory_mapped(index) -> bool:
+    return isinstance(index, faiss.IndexIVF) and isinstance(
+        faiss.downcast_InvertedLists(index.invlists), faiss.OnDiskInvertedLists)
+
+
+def build_index(vectors: np.ndarray, index_type: str = 'flat', nlist: Optional[int] = None,
+                pq_m: Optional[int] = None, hnsw_m: int = 32, trained=None):
+    # Builds an L2 index over vectors (n x d float32). IVF types are trained on
+    # the vectors themselves unless `trained` supplies an already-trained
+    # index of the same type, whose centroids/codebooks are then reused.
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    count, dimension = vectors.shape
+
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unsupported vector index type: {index_type}")
+
+    if trained is not None and index_type_of(trained) == index_type and index_type.startswith('ivf'):
+        index = faiss.clone_index(trained)
+        index.reset()
+    elif index_type == 'flat':
+        index = faiss.IndexFlatL2(dimension)
+    elif index_type == 'hnsw':
+        index = faiss.IndexHNSWFlat(dimension, hnsw_m)
+    else:
+        nlist = nlist or default_nlist(count)
+        if count < min_training_points(index_type, nlist):
+            raise ValueError(f"{index_type} needs at least {min_training_points(index_type, nlist)} "
+                             f"vectors to train, got {count}")
+        quantizer = faiss.IndexFlatL2(dimension)
+        if index_type == 'ivf_flat':
+            index = faiss.IndexIVFFlat(quantizer, dimension, nlist)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dimension, nlist, pq_m or default_pq_m(dimension), PQ_BITS)
+        index.train(vectors)
+
+    if count:
+        index.add(vectors)
+    return index
+
+
+def set_search_params(index, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+    if isinstance(index, faiss.IndexIVF) and nprobe:
+        index.nprobe = min(nprobe, index.nlist)
+    if isinstance(index, faiss.IndexHNSW) and ef_search:
+        index.hnsw.efSearch = ef_search
+
+
+def index_memory_bytes(index) -> int:
+    # Size of the serialized index, which is what the index holds in RAM up
+    # to small per-object overheads.
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def recall_at_k(exact_index, index, queries: np.ndarray, k: int = 10) -> float:
+    # Fraction of the exact top-k neighbours that the approximate index also
+    # returns in its top-k.
+    _, truth = exact_index.search(queries, k)
+    _, found = index.search(queries, k)
+    hits = sum(len(set(t[t >= 0]) & set(f[f >= 0])) for t, f in zip(truth, found))
+    return hits / max(1, int((truth >= 0).sum()))
+
+
+def describe_index(index) -> Dict[str, Any]:
+    stats = {
+        'type': index_type_of(index),
+        'vectors': int(index.ntotal),
+        'dimension': int(index.d),
+        'memory_bytes': index_memory_bytes(index),
+    }
+    if isinstance(index, faiss.IndexIVF) and index_type_of(index) != 'flat':
+        stats['nlist'] = int(index.nlist)
+        stats['nprobe'] = int(index.nprobe)
+    if is_memory_mapped(index):
+        # The vectors live in the shared page cache, not in this process.
+        stats['memory_mapped'] = True
+        stats['memory_bytes'] += int(index.ntotal * index.code_size)
+    if isinstance(index, faiss.IndexHNSW):
+        stats['ef_search'] = int(index.hnsw.efSearch)
+    return stats
+
+
+def evaluate_index_types(vectors: np.ndarray, queries: np.ndarray, k: int = 10, index_types=INDEX_TYPES,
+                         nprobe: int = 8, ef_search: int = 64, **build_kwargs) -> Dict[str, Dict[str, Any]]:
+    # Builds each index type over the same vectors and reports build time,
+    # memory, query latency and recall@k against the exact flat index.
+    exact = build_index(vectors, 'flat')
+    report = {}
+    for index_type in index_types:
+        start = time.perf_counter()
+        index = exact if index_type == 'flat' else build_index(vectors, index_type, **build_kwargs)
+        build_seconds = time.perf_counter() - start
+        set_search_params(index, nprobe=nprobe, ef_search=ef_search)
+
+        start = time.perf_counter()
+        index.search(queries, k)
+        query_seconds = (time.perf_counter() - start) / len(queries)
+
+        report[index_type] = dict(
+            describe_index(index),
+            build_seconds=build_seconds,
+            query_ms=query_seconds * 1e3,
+            recall=recall_at_k(exact, index, queries, k),
+        )
+    return report
+
+
+def index_settings_from_env() -> Dict[str, Any]:
+    return {
+        'index_type': os.environ.get('VECTOR_INDEX_TYPE', 'flat').lower(),
+        'nlist': int(os.environ.get('VECTOR_INDEX_NLIST', 0)) or None,
+        'nprobe': int(os.environ.get('VECTOR_INDEX_NPROBE', 8)),
+        'pq_m': int(os.environ.get('VECTOR_INDEX_PQ_M', 0)) or None,
+        'hnsw_m': int(os.environ.get('VECTOR_INDEX_HNSW_M', 32)),
+        'ef_search': int(os.environ.get('VECTOR_INDEX_EF_SEARCH', 64)),
+    }
+
+
+# Published indexes live in <index folder>/<version>/ and CURRENT names the
+# live version. Writers build a new version next to the old one and swap
+# CURRENT with a rename, so readers see either the old or the new index.
+CURRENT_FILE = 'CURRENT'
+
+
+def to_shareable(index):
+    # faiss can only memory-map IVF inverted lists; a flat index is read into
+    # private memory. An IVF-Flat index with a single list scans every vector
+    # exactly like IndexFlatL2 and returns the same distances, so flat indexes
+    # are written in that form.
+    if not isinstance(index, faiss.IndexFlatL2) or not index.ntotal:
+        return index
+    quantizer = faiss.IndexFlatL2(index.d)
+    quantizer.add(np.zeros((1, index.d), dtype=np.float32))
+    shareable = faiss.IndexIVFFlat(quantizer, index.d, 1)
+    shareable.is_trained = True
+    shareable.add(index.reconstruct_n(0, index.ntotal))
+    return shareable
+
+
+def from_shareable(index):
+    # Inverse of to_shareable, for writers that need removable ids again.
+    if not isinstance(index, faiss.IndexIVFFlat) or index.nlist != 1:
+        return index
+    flat = faiss.IndexFlatL2(index.d)
+    if index.ntotal:
+        codes = faiss.rev_swig_ptr(index.invlists.get_codes(0), index.ntotal * index.code_size)
+        flat.add(np.frombuffer(codes, dtype=np.float32).reshape(index.ntotal, index.d))
+    return flat
+
+
+def current_version(folder: str) -> Optional[str]:
+    # None when nothing has been published, '' for the pre-versioning layout
+    # with index.faiss directly in the folder.
+    try:
+        with open(os.path.join(folder, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return '' if os.path.exists(os.path.join(folder, 'index.faiss')) else None
+
+
+class PositionIds(Mapping):
+    # index_to_docstore_id for a MappedDocstore: faiss id i maps to document i.
+
+    def __init__(self, count: int):
+        self._count = count
+
+    def __getitem__(self, position):
+        if not 0 <= position < self._count:
+            raise KeyError(position)
+        return int(position)
+
+    def __iter__(self):
+        return iter(range(self._count))
+
+    def __len__(self):
+        return self._count
+
+
+class MappedDocstore:
+    # Read-only docstore over docs.jsonl, one document per faiss id. The file
+    # is memory-mapped and a line is only parsed when a search returns it, so
+    # workers share the documents through the page cache as well.
+
+    def __init__(self, folder: str):
+        from langchain_core.documents import Document
+
+        self._document = Document
+        with open(os.path.join(folder, 'docs.jsonl'), 'rb') as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b''
+        self._offsets = np.load(os.path.join(folder, 'docs_offsets.npy'), mmap_mode='r')
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def search(self, position):
+        if not 0 <= position < len(self):
+            return f"ID {position} not found."
+        record = json.loads(self._data[self._offsets[position]:self._offsets[position + 1]])
+        return self._document(id=record['id'], page_content=record['page_content'], metadata=record['metadata'])
+
+
+def save_store(store, folder: str):
+    # Same files as FAISS.save_local, with flat indexes in shareable form, plus
+    # the documents in faiss id order for MappedDocstore.
+    os.makedirs(folder, exist_ok=True)
+    faiss.write_index(to_shareable(store.index), os.path.join(folder, 'index.faiss'))
+    with open(os.path.join(folder, 'index.pkl'), 'wb') as f:
+        pickle.dump((store.docstore, store.index_to_docstore_id), f)
+
+    offsets = [0]
+    applicants = {}
+    chunk_applicants = []
+    with open(os.path.join(folder, 'docs.jsonl'), 'wb') as f:
+        for position in range(store.index.ntotal):
+            docstore_id = store.index_to_docstore_id[position]
+            document = store.docstore.search(docstore_id)
+            line = json.dumps({'id': docstore_id, 'page_content': document.page_content,
+                               'metadata': document.metadata}, default=str).encode('utf-8') + b'\n'
+            f.write(line)
+            offsets.append(offsets[-1] + len(line))
+            chunk_applicants.append(applicants.setdefault(document.metadata.get('applicant_id'), len(applicants)))
+    np.save(os.path.join(folder, 'docs_offsets.npy'), np.asarray(offsets, dtype=np.int64))
+
+    # Applicant of every faiss id, as an ordinal into applicants.json, for
+    # pre-filtering searches and grouping hits without parsing documents.
+    np.save(os.path.join(folder, 'chunk_applicants.npy'), np.asarray(chunk_applicants, dtype=np.int32))
+    with open(os.path.join(folder, 'applicants.json'), 'w') as f:
+        json.dump(list(applicants), f)
+
+
+def chunk_applicants(store, folder: Optional[str] = None):
+    # Returns (applicant ids, per-faiss-id applicant ordinals) for a store,
+    # from the files save_store wrote when available.
+    if folder and os.path.exists(os.path.join(folder, 'chunk_applicants.npy')):
+        with open(os.path.join(folder, 'applicants.json')) as f:
+            applicants = json.load(f)
+        return applicants, np.load(os.path.join(folder, 'chunk_applicants.npy'), mmap_mode='r')
+
+    applicants = {}
+    ordinals = [applicants.setdefault(store.docstore.search(store.index_to_docstore_id[position]).metadata.get('applicant_id'),
+                                      len(applicants))
+                for position in range(store.index.ntotal)]
+    return list(applicants), np.asarray(ordinals, dtype=np.int32)
+
+
+def filtered_search(index, queries: np.ndarray, k: int, allowed_ids: Optional[np.ndarray] = None):
+    # Searches only the faiss ids in allowed_ids. The filter is applied
+    # inside the index scan, so a narrow filter still fills k results; IVF
+    # and HNSW widen their search in proportion to how much is filtered out.
+    if allowed_ids is None:
+        return index.search(queries, k)
+    if not len(allowed_ids):
+        return np.full((len(queries), k), np.inf, dtype=np.float32), np.full((len(queries), k), -1, dtype=np.int64)
+
+    allowed_ids = np.ascontiguousarray(allowed_ids, dtype=np.int64)
+    selector = faiss.IDSelectorBatch(len(allowed_ids), faiss.swig_ptr(allowed_ids))
+    widen = max(1.0, index.ntotal / len(allowed_ids))
+    if isinstance(index, faiss.IndexIVF):
+        params = faiss.SearchParametersIVF(sel=selector, nprobe=min(index.nlist, int(math.ceil(index.nprobe * widen))))
+    elif isinstance(index, faiss.IndexHNSW):
+        params = faiss.SearchParametersHNSW(sel=selector, efSearch=int(min(index.ntotal, index.hnsw.efSearch * widen)))
+    else:
+        params = faiss.SearchParameters(sel=selector)
+    return index.search(queries, k, params=params)
+
+
+def load_store(folder: str, embeddings, memory_map: bool = False):
+    from langchain_community.vectorstores import FAISS
+
+    path = os.path.join(folder, 'index.faiss')
+    if memory_map and os.path.exists(os.path.join(folder, 'docs.jsonl')):
+        # Pages come from the shared page cache; the store is then read-only.
+        index = faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        return FAISS(embeddings, index, MappedDocstore(folder), PositionIds(index.ntotal))
+
+    index = from_shareable(faiss.read_index(path))
+    # index.pkl is written by save_store, never taken from uploads.
+    with open(os.path.join(folder, 'index.pkl'), 'rb') as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    return FAISS(embeddings, index, docstore, index_to_docstore_id)
+
+
+def publish_store(store, folder: str, keep_versions: int = 3) -> Optional[str]:
+    # Writes store (or "no index" for None) as a new version, points CURRENT
+    # at it and prunes old versions. Readers that memory-mapped a pruned
+    # version keep working: the pages stay valid until they unmap it.
+    os.makedirs(folder, exist_ok=True)
+    version = None
+    if store is not None:
+        version = f"v{time.time_ns()}"
+        tmp_folder = os.path.join(folder, f"{version}.tmp")
+        save_store(store, tmp_folder)
+        os.replace(tmp_folder, os.path.join(folder, version))
+
+    tmp_current = os.path.join(folder, f"{CURRENT_FILE}.tmp")
+    with open(tmp_current, 'w') as f:
+        f.write(version or '')
+    os.replace(tmp_current, os.path.join(folder, CURRENT_FILE))
+
+    for name in ('index.faiss', 'index.pkl'):
+        if os.path.exists(os.path.join(folder, name)):
+            os.remove(os.path.join(folder, name))
+    versions = sorted(name for name in os.listdir(folder) if name.startswith('v') and name != version)
+    for name in versions[:max(0, len(versions) - keep_versions + 1)]:
+        shutil.rmtree(os.path.join(folder, name), ignore_errors=True)
+    return version
@@ -0,0 +1,459 @@
+import contextlib
+import hashlib
+import os
+import pickle
+import re
+import threading
+import time
+from typing import Dict, Any, List, Optional
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from vector_index import (build_index, chunk_applicants, current_version, describe_index,
+                          filtered_search, index_type_of, load_store, min_training_points, needs_retraining,
+                          publish_store, set_search_params, supports_removal)
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+POSITION_FILE = 'POSITION'
+DELTAS_FOLDER = 'deltas'
+
+
+def shard_folder_name(position: str) -> str:
+    # Readable and filesystem-safe; the hash keeps "C++ Dev" and "C Dev" apart.
+    slug = re.sub(r'[^a-z0-9]+', '_', position.lower()).strip('_')[:48]
+    return f"{slug}-{hashlib.sha1(position.encode('utf-8')).hexdigest()[:8]}"
+
+
+class VectorShard:
+    # One FAISS store published as versions under `folder` (see
+    # vector_index.publish_store). Readers refresh to the latest version every
+    # refresh_seconds, memory-mapped when mmap is on; writers take an flock on
+    # the folder and work on a private copy of the latest version, so a search
+    # never sees a store that is being changed. Committed changes are appended
+    # to the published version as deltas and only written out as a new version
+    # every publish_every commits or publish_seconds.
+
+    def __init__(self, folder: str, embeddings, settings: Dict[str, Any], mmap: bool = False,
+                 refresh_seconds: float = 2.0, keep_versions: int = 3, position: Optional[str] = None,
+                 publish_every: int = 1, publish_seconds: float = 0.0):
+        self.folder = folder
+        self.embeddings = embeddings
+        self.settings = settings
+        self.mmap = mmap
+        self.refresh_seconds = refresh_seconds
+        self.keep_versions = keep_versions
+        self.position = position
+        self.publish_every = publish_every
+        self.publish_seconds = publish_seconds
+
+        # What readers search: the published version, replaced but never
+        # modified. Guarded by _lock.
+        self._store = None
+        self._loaded = False
+        self._version = None
+        self._checked = 0.0
+        self._applicants = None
+        self._lock = threading.RLock()
+
+        # The writer's private copy: the published version plus its deltas.
+        # It is kept between writes until the next publish and brought up to
+        # date once per write lock. Guarded by _write_mutex.
+        self._writer_store = None
+        self._writer_loaded = False
+        self._writer_version = None
+        self._writer_deltas = 0
+        self._writer_checked = False
+        self._pending = []
+        self._publish_timer = None
+        self._chunk_ids_by_applicant = {}
+        self._write_mutex = threading.RLock()
+        self._lock_depth = 0
+        self._lock_handle = None
+
+    @property
+    def store(self):
+        if not self._loaded or time.monotonic() - self._checked >= self.refresh_seconds:
+            self.load()
+        return self._store
+
+    def _collect_chunk_ids(self, store) -> Dict[str, List[str]]:
+        chunk_ids = {}
+        if store is not None:
+            for docstore_id in store.index_to_docstore_id.values():
+                doc = store.docstore.search(docstore_id)
+                applicant_id = getattr(doc, 'metadata', {}).get('applicant_id')
+                chunk_ids.setdefault(applicant_id, []).append(docstore_id)
+        return chunk_ids
+
+    def _load_version(self, version: Optional[str], memory_map: bool):
+        if version is None:
+            return None
+        store = load_store(os.path.join(self.folder, version), self.embeddings, memory_map=memory_map)
+        set_search_params(store.index, self.settings['nprobe'], self.settings['ef_search'])
+        return store
+
+    def load(self):
+        with self._lock:
+            self._checked = time.monotonic()
+            version = current_version(self.folder)
+            if self._loaded and version == self._version:
+                return
+
+            try:
+                store = self._load_version(version, self.mmap)
+            except Exception as e:
+                print(f"Error loading vector index version {version!r} from {self.folder}: {str(e)}")
+                if self._loaded:
+                    return
+                store = None
+
+            self._store = store
+            self._version = version
+            self._loaded = True
+            self._applicants = None
+
+    @contextlib.contextmanager
+    def write_lock(self):
+        # Like SimpleDatabase._write_lock: the thread lock serialises writers in
+        # this process and an flock on the shard folder serialises them across
+        # workers. Readers do not wait for it.
+        with self._write_mutex:
+            if self._lock_depth == 0:
+                if fcntl is not None:
+                    os.makedirs(self.folder, exist_ok=True)
+                    self._lock_handle = open(os.path.join(self.folder, '.lock'), 'a')
+                    fcntl.flock(self._lock_handle, fcntl.LOCK_EX)
+                self._writer_checked = False
+            self._lock_depth += 1
+            try:
+                yield
+            except BaseException:
+                # The private copy may be half changed.
+                self._set_writer_store(None, loaded=False)
+                self._pending = []
+                raise
+            finally:
+                self._release_write_lock()
+
+    def _release_write_lock(self):
+        self._lock_depth -= 1
+        if self._lock_depth:
+            return
+        if self._pending:
+            # Changes that were never committed are thrown away; the next
+            # writer starts again from what is on disk.
+            self._set_writer_store(None, loaded=False)
+            self._pending = []
+        if self._lock_handle is not None:
+            fcntl.flock(self._lock_handle, fcntl.LOCK_UN)
+            self._lock_handle.close()
+            self._lock_handle = None
+
+    def _set_writer_store(self, store, loaded: bool = True):
+        self._writer_store = store
+        self._writer_loaded = loaded
+        self._chunk_ids_by_applicant = self._collect_chunk_ids(store)
+
+    def _delta_folder(self, version: str) -> str:
+        return os.path.join(self.folder, version, DELTAS_FOLDER)
+
+    def _delta_files(self, version: Optional[str]) -> List[str]:
+        # Deltas belong to the version they were appended to, so a new version
+        # (which already contains them) starts with none.
+        if not version:
+            return []
+        try:
+            return sorted(name for name in os.listdir(self._delta_folder(version)) if name.endswith('.pkl'))
+        except FileNotFoundError:
+            return []
+
+    def _writable(self):
+        # Called with the write lock held. A memory-mapped index is read-only,
+        # so the private copy is always read into memory; after that only
+        # deltas other processes appended since are replayed onto it.
+        if self._writer_checked and self._writer_loaded:
+            return self._writer_store
+
+        version = current_version(self.folder)
+        deltas = self._delta_files(version)
+        stale = not self._writer_loaded or version != self._writer_version or len(deltas) < self._writer_deltas
+        if stale:
+            self._writer_store = self._load_version(version, memory_map=False)
+            self._writer_loaded = True
+            self._writer_version = version
+            self._writer_deltas = 0
+        for name in deltas[self._writer_deltas:]:
+            # Written by commit, never taken from uploads.
+            with open(os.path.join(self._delta_folder(version), name), 'rb') as f:
+                for change in pickle.load(f):
+                    self._apply(change)
+        if stale or len(deltas) > self._writer_deltas:
+            self._chunk_ids_by_applicant = self._collect_chunk_ids(self._writer_store)
+        self._writer_deltas = len(deltas)
+        self._writer_checked = True
+        return self._writer_store
+
+    def commit(self):
+        # Called with the write lock held once a change is complete. It is
+        # appended to the published version as a delta, so a submission costs
+        # I/O in its own size rather than the shard's; the whole store is only
+        # written again every publish_every commits or publish_seconds.
+        if not self._pending:
+            return
+        version = self._writer_version
+        if (not version or self._writer_deltas + 1 >= self.publish_every
+                or (self._writer_deltas and time.time() - os.path.getmtime(
+                    os.path.join(self._delta_folder(version), self._delta_files(version)[0])) >= self.publish_seconds)):
+            self.publish()
+            return
+
+        folder = self._delta_folder(version)
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"{self._writer_deltas + 1:08d}.pkl")
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump(self._pending, f)
+        os.replace(path + '.tmp', path)
+        self._writer_deltas += 1
+        self._pending = []
+        self._schedule_publish()
+
+    def _schedule_publish(self):
+        # Readers only see published versions, so deltas are published within
+        # publish_seconds even when no further write comes along.
+        with self._lock:
+            if self._publish_timer is None:
+                self._publish_timer = threading.Timer(self.publish_seconds, self._publish_deltas)
+                self._publish_timer.daemon = True
+                self._publish_timer.start()
+
+    def _publish_deltas(self):
+        with self._lock:
+            self._publish_timer = None
+        try:
+            self.publish_deltas()
+        except Exception as e:
+            print(f"Error publishing vector index deltas in {self.folder}: {str(e)}")
+
+    def publish_deltas(self):
+        # Publishes committed deltas right away, for callers that read the
+        # whole shard and must not miss recent writes.
+        with self.write_lock():
+            if self._delta_files(current_version(self.folder)):
+                self.publish()
+
+    def publish(self):
+        # Called with the write lock held: writes the private copy, deltas
+        # included, as a new version that readers swap to atomically.
+        store = self._writable()
+        if self.position is not None:
+            os.makedirs(self.folder, exist_ok=True)
+            with open(os.path.join(self.folder, POSITION_FILE), 'w') as f:
+                f.write(self.position)
+        version = publish_store(store, self.folder, self.keep_versions)
+
+        # The private copy now is the published version. Without mmap readers
+        # take it over as is, so the next write starts from a fresh copy.
+        self._pending = []
+        self._set_writer_store(None, loaded=False)
+        if self.mmap:
+            self.load()
+        else:
+            with self._lock:
+                self._store = store
+                self._version = version
+                self._loaded = True
+                self._checked = time.monotonic()
+                self._applicants = None
+
+    def clear(self):
+        with self.write_lock():
+            self._writable()
+            self._set_writer_store(None)
+            self.publish()
+
+    def contains_any(self, applicant_ids: List[str]) -> bool:
+        # Checked against the latest published version, without taking the
+        # write lock.
+        self.load()
+        store = self._store
+        if self._delta_files(self._version):
+            # Unpublished deltas may hold any applicant.
+            return True
+        if store is None:
+            return False
+        applicants, _ = self._applicant_table(store)
+        return not set(applicants).isdisjoint(applicant_ids)
+
+    def is_indexed(self, applicant_id: str, chunks: List[str], chunk_ids: List[str]) -> bool:
+        # Called with the write lock held, like the methods below.
+        store = self._writable()
+        if store is None or self._chunk_ids_by_applicant.get(applicant_id) != chunk_ids:
+            return False
+        return all(
+            store.docstore.search(chunk_id).page_content == chunk
+            for chunk_id, chunk in zip(chunk_ids, chunks)
+        )
+
+    def add(self, chunks: List[str], metadatas: List[Dict[str, Any]], ids: List[str],
+            stale_ids: Optional[List[str]] = None) -> int:
+        # stale_ids are removed first, so a changed resume replaces the
+        # applicant's previous chunks.
+        self.delete(stale_ids or [])
+
+        self._writable()
+        vectors = np.asarray(self.embeddings.embed_documents(chunks), dtype=np.float32)
+        self._change(('add', chunks, metadatas, ids, vectors))
+        for metadata, chunk_id in zip(metadatas, ids):
+            self._chunk_ids_by_applicant.setdefault(metadata['applicant_id'], []).append(chunk_id)
+        return len(chunks)
+
+    def delete(self, chunk_ids: List[str]):
+        if not chunk_ids or self._writable() is None:
+            return
+        self._change(('delete', list(chunk_ids)))
+        if self._writer_store is None:
+            self._chunk_ids_by_applicant = {}
+
+    def _change(self, change: tuple):
+        # Applies a change to the private copy and queues it for commit.
+        self._apply(change)
+        self._pending.append(change)
+
+    def _apply(self, change: tuple):
+        # Also replays deltas, so it only depends on the change and the store.
+        store = self._writer_store
+        if change[0] == 'delete':
+            chunk_ids = change[1]
+            if store is None:
+                return
+            if len(chunk_ids) == len(store.index_to_docstore_id):
+                store = None
+            elif supports_removal(store.index):
+                store.delete(ids=chunk_ids)
+            else:
+                # IVF and HNSW indexes are re-filled without the removed
+                # chunks, reusing the existing IVF training.
+                store = self.build(store, index_type_of(store.index), exclude=set(chunk_ids), retrain=False)
+        else:
+            _, chunks, metadatas, ids, vectors = change
+            text_embeddings = list(zip(chunks, vectors))
+            if store is None:
+                store = FAISS.from_embeddings(text_embeddings, self.embeddings, metadatas=metadatas, ids=ids)
+            else:
+                store.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+
+            # FAISS.from_embeddings always starts flat; switch to the
+            # configured ANN type once there are enough vectors to train it,
+            # and retrain an auto-sized IVF index as the collection outgrows
+            # its lists.
+            index_type = self.settings['index_type']
+            index = store.index
+            if ((index_type_of(index) != index_type
+                 and index.ntotal >= min_training_points(index_type, self.settings['nlist']))
+                    or (index_type_of(index) == index_type and needs_retraining(index, self.settings['nlist']))):
+                store = self.build(store, index_type)
+        self._writer_store = store
+
+    def build(self, store, index_type: str, exclude=frozenset(), retrain: bool = True):
+        # Rebuilds store from its own documents. Vectors come back through the
+        # embedding cache, so this does not call the embedding model.
+        docstore_ids = [i for _, i in sorted(store.index_to_docstore_id.items()) if i not in exclude]
+        if not docstore_ids:
+            return None
+
+        documents = [store.docstore.search(i) for i in docstore_ids]
+        vectors = np.asarray(self.embeddings.embed_documents([d.page_content for d in documents]), dtype=np.float32)
+
+        settings = self.settings
+        trained = None if retrain else store.index
+        if trained is None and len(documents) < min_training_points(index_type, settings['nlist']):
+            index_type = 'flat'
+        index = build_index(vectors, index_type, nlist=settings['nlist'], pq_m=settings['pq_m'],
+                            hnsw_m=settings['hnsw_m'], trained=trained)
+        set_search_params(index, settings['nprobe'], settings['ef_search'])
+
+        return FAISS(self.embeddings, index, InMemoryDocstore(dict(zip(docstore_ids, documents))),
+                     dict(enumerate(docstore_ids)))
+
+    def remove_applicant(self, applicant_id: str) -> bool:
+        self._writable()
+        chunk_ids = self._chunk_ids_by_applicant.pop(applicant_id, None)
+        if not chunk_ids or self._writer_store is None:
+            return False
+        self.delete(chunk_ids)
+        return True
+
+    def pop_chunk_ids(self, applicant_id: str) -> List[str]:
+        self._writable()
+        return self._chunk_ids_by_applicant.pop(applicant_id, [])
+
+    def rebuild(self, index_type: str) -> Dict[str, Any]:
+        with self.write_lock():
+            store = self._writable()
+            if store is None:
+                return {}
+            self._set_writer_store(self.build(store, index_type))
+            self.publish()
+            return self.stats()
+
+    def stats(self) -> Dict[str, Any]:
+        store = self.store
+        if store is None:
+            return {}
+        return describe_index(store.index)
+
+    def _applicant_table(self, store):
+        # (applicant ids, applicant ordinal per faiss id) for the loaded version.
+        with self._lock:
+            if self._applicants is None or self._applicants[0] is not store:
+                folder = os.path.join(self.folder, self._version) if self._version is not None else None
+                self._applicants = (store,) + chunk_applicants(store, folder)
+            return self._applicants[1:]
+
+    def search_applicants(self, query_vector: np.ndarray, k: int, applicant_ids=None) -> Dict[str, Dict[str, Any]]:
+        # Best chunk per applicant among the nearest chunks, searching only the
+        # chunks of applicant_ids when given. Fetches more chunks until k
+        # distinct applicants are found or the shard is exhausted.
+        store = self.store
+        if store is None or not store.index.ntotal:
+            return {}
+
+        applicants, ordinals = self._applicant_table(store)
+        allowed_ids = None
+        available = store.index.ntotal
+        if applicant_ids is not None:
+            wanted = [ordinal for ordinal, applicant_id in enumerate(applicants) if applicant_id in applicant_ids]
+            allowed_ids = np.flatnonzero(np.isin(ordinals, wanted))
+            available = len(allowed_ids)
+            if not available:
+                return {}
+
+        queries = np.asarray([query_vector], dtype=np.float32)
+        fetch = min(available, k * 4)
+        while True:
+            distances, ids = filtered_search(store.index, queries, fetch, allowed_ids)
+            hits = {}
+            for distance, faiss_id in zip(distances[0], ids[0]):
+                if faiss_id < 0:
+                    continue
+                applicant_id = applicants[ordinals[faiss_id]]
+                # For unit-length embeddings this is the cosine similarity.
+                score = 1.0 - float(distance) / 2
+                hit = hits.get(applicant_id)
+                if hit is None:
+                    hits[applicant_id] = {'score': score, 'chunk_hits': 1, 'best_chunk_id': int(faiss_id)}
+                else:
+                    hit['chunk_hits'] += 1
+            if len(hits) >= k or fetch >= available:
+                break
+            fetch = min(available, fetch * 2)
+
+        for hit in hits.values():
+            document = store.docstore.search(store.index_to_docstore_id[hit.pop('best_chunk_id')])
+            hit['best_chunk'] = document.page_content
+            hit['position_applied'] = self.position or document.metadata.get('position_applied')
+        return hits